@@ -0,0 +1,103 @@
+"""
+Ingest throughput and NIP-20 OK latency of the sql relay, committing every
+event on its own against batching them with BatchWriter. Concurrent publishers
+each send their events one after the other, waiting for the OK.
+
+Usage: python -m benchmarks.bench_batched_ingest [publishers] [events each]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+from pyrelay.nostr.event import NostrDataType, NostrEvent
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.relay.bootstrap import set_up_session_maker
+from pyrelay.relay.client_session import BaseClientSession
+from pyrelay.relay.db.batch_writer import BatchWriter
+from pyrelay.relay.db.tables import mapper_registry
+from pyrelay.relay.dispatcher import RelayDispatcher
+from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.unit_of_work import SqlAlchemyUOW
+
+PUBLISHERS = 50
+EVENTS = 40
+
+
+class Publisher(BaseClientSession):
+    def __init__(self) -> None:
+        super().__init__()
+        self.uid = uuid.uuid4()
+        self.oks = 0
+
+    async def send(self, message: NostrDataType) -> None:
+        self.oks += 1
+
+
+async def publish(
+    dispatcher: RelayDispatcher, events: list[NostrEvent], latencies: list[float]
+) -> None:
+    publisher = Publisher()
+    for event in events:
+        start = time.perf_counter()
+        await dispatcher.handle(publisher, event)
+        latencies.append(time.perf_counter() - start)
+
+    assert publisher.oks == len(events)
+
+
+async def run(
+    session_maker, events: list[list[NostrEvent]], writer: Optional[BatchWriter]
+) -> None:
+    subscriptions = Subscriptions()
+    dispatcher = RelayDispatcher(
+        lambda: SqlAlchemyUOW(session_maker, subscriptions, writer=writer)
+    )
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(publish(dispatcher, each, latencies) for each in events))
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        writer.close()
+
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    name = "per event commit" if writer is None else "batched"
+    print(
+        f"  {name:<17} {len(latencies) / elapsed:>8,.0f} events/s"
+        f" OK latency p50={statistics.median(latencies) * 1e3:.1f}ms"
+        f" p99={p99 * 1e3:.1f}ms"
+    )
+
+    async with session_maker() as session:
+        for table in reversed(mapper_registry.metadata.sorted_tables):
+            await session.execute(table.delete())
+        await session.commit()
+
+
+def main() -> None:
+    publishers = int(sys.argv[1]) if len(sys.argv) > 1 else PUBLISHERS
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else EVENTS
+    builders = [EventBuilder.from_generated() for _ in range(publishers)]
+
+    def generate() -> list[list[NostrEvent]]:
+        return [
+            [builder.create_event(f"{i}") for i in range(count)] for builder in builders
+        ]
+
+    with tempfile.TemporaryDirectory(dir=".") as directory:
+        path = os.path.join(directory, "bench.db")
+        # maps the event classes, events are created after it
+        session_maker = set_up_session_maker(
+            f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+        )
+        print(f"{publishers} publishers x {count} events")
+        asyncio.run(run(session_maker, generate(), None))
+        asyncio.run(run(session_maker, generate(), BatchWriter(session_maker)))
+
+
+if __name__ == "__main__":
+    main()
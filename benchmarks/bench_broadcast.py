@@ -0,0 +1,74 @@
+"""
+Per-event broadcast cost against a growing number of open subscriptions.
+
+Usage: python -m benchmarks.bench_broadcast
+"""
+import asyncio
+import secrets
+import time
+
+from pyrelay.nostr.event import EventKind
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.nostr.msgs import NostrRequest
+from pyrelay.relay.client_session import BaseClientSession
+from pyrelay.relay.relay_service import Subscriptions
+
+SUBSCRIPTIONS = (1_000, 10_000, 100_000)
+EVENTS = 200
+
+
+class NullClientSession(BaseClientSession):
+    async def send(self, msg) -> None:
+        return
+
+
+def build_subscriptions(amount: int) -> Subscriptions:
+    subscriptions = Subscriptions()
+    client = NullClientSession()
+    for i in range(amount):
+        if i % 10 == 0:
+            _filter = NostrFilter(kinds=[EventKind.Reaction])  # type: ignore
+        else:
+            follows = [secrets.token_hex(32) for _ in range(5)]
+            _filter = NostrFilter(authors=follows)
+
+        request = NostrRequest(subscription_id=f"{i}", filters=(_filter,))
+        subscriptions.subscribe(request, client)  # type: ignore
+
+    return subscriptions
+
+
+async def full_scan(subscriptions: Subscriptions, event) -> None:
+    for subscription in subscriptions.values():
+        await subscription.update(event)
+
+
+async def bench(amount: int) -> None:
+    subscriptions = build_subscriptions(amount)
+    events = [EventBuilder.from_generated().create_event("hi") for _ in range(EVENTS)]
+
+    start = time.perf_counter()
+    for event in events:
+        await full_scan(subscriptions, event)
+    scan = (time.perf_counter() - start) / EVENTS
+
+    start = time.perf_counter()
+    for event in events:
+        await subscriptions.broadcast(event)
+    indexed = (time.perf_counter() - start) / EVENTS
+
+    print(
+        f"subscriptions={amount:>7} "
+        f"full-scan={scan * 1e6:>10.1f}us/event "
+        f"indexed={indexed * 1e6:>8.1f}us/event"
+    )
+
+
+async def main() -> None:
+    for amount in SUBSCRIPTIONS:
+        await bench(amount)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
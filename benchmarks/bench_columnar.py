@@ -0,0 +1,114 @@
+"""
+Analytics style queries of the columnar repository against the indexed one.
+Requires numpy.
+
+Usage: python -m benchmarks.bench_columnar [events ...], default 1000000 10000000
+"""
+import asyncio
+import gc
+import random
+import secrets
+import sys
+import time
+from typing import Awaitable, Callable, Iterator
+
+from pyrelay.nostr.event import EventKind, NostrEvent
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.repos.columnar_event_repo import ColumnarEventsRepository
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+
+SIZES = [1_000_000, 10_000_000]
+ROUNDS = 5
+START = 1_600_000_000
+KINDS = list(EventKind)[:12]
+
+
+def generate(count: int) -> Iterator[NostrEvent]:
+    # signatures are never checked by the repository, so skip signing
+    rand = random.Random(0)
+    pubkeys = [secrets.token_hex(32) for _ in range(10_000)]
+    for i in range(count):
+        yield NostrEvent(
+            id=secrets.token_hex(32),
+            pubkey=rand.choice(pubkeys),
+            created_at=START + i,
+            kind=rand.choice(KINDS),
+            tags=[],
+            content="",
+            sig=secrets.token_hex(64),
+        )
+
+
+def filters(count: int) -> dict[str, NostrFilter]:
+    end = START + count
+    return {
+        "last 10%, 2 kinds": NostrFilter(
+            kinds=KINDS[:2], since=end - count // 10  # type: ignore
+        ),
+        "middle 20%, 8 kinds": NostrFilter(
+            kinds=KINDS[:8],  # type: ignore
+            since=START + count * 2 // 5,
+            until=START + count * 3 // 5,
+        ),
+        "everything, 6 kinds, 500": NostrFilter(kinds=KINDS[::2], limit=500),
+        "half, rare kind, 500": NostrFilter(
+            kinds=KINDS[-1:], until=START + count // 2, limit=500  # type: ignore
+        ),
+    }
+
+
+async def timed(query: Callable[[], Awaitable]) -> float:
+    # like timeit, keep collections of the millions of stored objects out
+    gc.disable()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await query()
+
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    return elapsed / ROUNDS
+
+
+async def run(count: int) -> None:
+    indexed, columnar = InMemoryEventsRepository(), ColumnarEventsRepository()
+    for event in generate(count):
+        await indexed.add(event)
+        await columnar.add(event)
+
+    print(f"{count:,} events, filtering only / whole query with building events")
+    for name, _filter in filters(count).items():
+        assert await indexed.query(_filter) == await columnar.query(_filter)
+
+        async def index_filter() -> None:
+            for _ in indexed._stream(_filter):
+                pass
+
+        async def columnar_filter() -> None:
+            columnar._match(_filter)
+
+        results = [
+            await timed(index_filter),
+            await timed(columnar_filter),
+            await timed(lambda: indexed.query(_filter)),
+            await timed(lambda: columnar.query(_filter)),
+        ]
+        loop_filter, vectorized_filter, loop_query, vectorized_query = results
+        print(
+            f"  {name:<26}"
+            f" filter: indexed={loop_filter * 1e3:>8.2f}ms"
+            f" columnar={vectorized_filter * 1e3:>8.2f}ms"
+            f" x{loop_filter / vectorized_filter:<5.1f}"
+            f" query: indexed={loop_query * 1e3:>8.2f}ms"
+            f" columnar={vectorized_query * 1e3:>8.2f}ms"
+            f" x{loop_query / vectorized_query:.1f}"
+        )
+
+
+def main() -> None:
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    for count in sizes:
+        asyncio.run(run(count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compiled filter matchers against applying the raw NostrFilter.
+
+Usage: python -m benchmarks.bench_filters
+"""
+import secrets
+import timeit
+
+from pyrelay.nostr.event import EventKind, NostrTag
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.nostr.filters import NostrFilter, apply
+
+ROUNDS = 10_000
+
+
+def filters(event) -> dict[str, NostrFilter]:
+    follows = [secrets.token_hex(32) for _ in range(1000)] + [event.pubkey]
+    return {
+        "kinds": NostrFilter(kinds=list(EventKind)[:30]),  # type: ignore
+        "1k authors": NostrFilter(authors=follows),
+        "1k prefixes": NostrFilter(authors=[author[:8] for author in follows]),
+        "tags": NostrFilter(generic_tags={"e": follows[:100], "p": follows[:100]}),
+        "mixed": NostrFilter(
+            authors=follows,
+            kinds=[EventKind.TextNote],  # type: ignore
+            since=event.created_at - 10,
+            generic_tags={"p": follows[:100]},
+        ),
+    }
+
+
+def main() -> None:
+    builder = EventBuilder.from_generated()
+    event = builder.create_event(
+        "content",
+        tags=[
+            NostrTag("e", secrets.token_hex(32), []),
+            NostrTag("p", builder.pub_key, []),
+        ],
+    )
+
+    for name, _filter in filters(event).items():
+        matcher = _filter.compile()
+        assert matcher.match(event) == apply(_filter, event)
+
+        raw = timeit.timeit(lambda: apply(_filter, event), number=ROUNDS)
+        compiled = timeit.timeit(lambda: matcher.match(event), number=ROUNDS)
+        print(
+            f"{name:<12} apply={raw / ROUNDS * 1e6:>8.2f}us "
+            f"compiled={compiled / ROUNDS * 1e6:>6.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
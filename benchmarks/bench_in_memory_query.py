@@ -0,0 +1,85 @@
+"""
+Indexed queries of the in-memory repository against scanning every event.
+
+Usage: python -m benchmarks.bench_in_memory_query
+"""
+import asyncio
+import random
+import secrets
+import timeit
+
+from pyrelay.nostr.event import EventKind, NostrEvent, NostrTag
+from pyrelay.nostr.filters import NostrFilter, apply
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+
+EVENTS = 200_000
+ROUNDS = 20
+
+
+def generate(count: int) -> list[NostrEvent]:
+    # signatures are never checked by the repository, so skip signing
+    rand = random.Random(0)
+    pubkeys = [secrets.token_hex(32) for _ in range(5_000)]
+    kinds = [EventKind.TextNote, EventKind.Metadata, EventKind.Reaction]  # type: ignore
+    return [
+        NostrEvent(
+            id=secrets.token_hex(32),
+            pubkey=rand.choice(pubkeys),
+            created_at=1_600_000_000 + i,
+            kind=rand.choice(kinds),
+            tags=[NostrTag("p", rand.choice(pubkeys), [])],
+            content=str(i),
+            sig="",
+        )
+        for i in range(count)
+    ]
+
+
+def filters(events: list[NostrEvent]) -> dict[str, NostrFilter]:
+    follows = list({event.pubkey for event in events[:100]})
+    notes = [EventKind.TextNote]  # type: ignore
+    return {
+        "author": NostrFilter(authors=[events[0].pubkey]),
+        "100 authors": NostrFilter(authors=follows),
+        "mentions": NostrFilter(generic_tags={"p": [events[0].pubkey]}),
+        "last hour": NostrFilter(since=events[-1].created_at - 3600),
+        "kind": NostrFilter(kinds=[EventKind.Metadata]),  # type: ignore
+        "global feed": NostrFilter(kinds=notes, limit=50),
+        "100 follows": NostrFilter(authors=follows, limit=50),
+    }
+
+
+def scan(events: list[NostrEvent], _filter: NostrFilter) -> list[NostrEvent]:
+    matched = sorted(
+        (event for event in events if apply(_filter, event)),
+        key=lambda event: event.created_at,
+    )
+    if _filter.limit:
+        del matched[: -_filter.limit]
+
+    return matched
+
+
+async def main() -> None:
+    events = generate(EVENTS)
+    repo = InMemoryEventsRepository()
+    for event in events:
+        await repo.add(event)
+
+    for name, _filter in filters(events).items():
+        assert list(await repo.query(_filter)) == scan(events, _filter)
+
+        raw = timeit.timeit(lambda: scan(events, _filter), number=ROUNDS)
+        start = asyncio.get_running_loop().time()
+        for _ in range(ROUNDS):
+            await repo.query(_filter)
+        indexed = asyncio.get_running_loop().time() - start
+
+        print(
+            f"{name:<12} scan={raw / ROUNDS * 1e3:>8.2f}ms "
+            f"indexed={indexed / ROUNDS * 1e3:>8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Memory of stored events as NostrEvent against CompactEvent.
+
+Usage: python -m benchmarks.bench_memory [events, default 1000000]
+"""
+import asyncio
+import gc
+import random
+import string
+import sys
+import tracemalloc
+from typing import Callable, Iterator
+
+from pyrelay.nostr.event import EventKind, NostrEvent, NostrTag
+from pyrelay.relay.repos.compact_event import CompactEvent
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+
+EVENTS = 1_000_000
+
+
+def generate(count: int) -> Iterator[NostrEvent]:
+    # signatures are never checked by the repository, so skip signing
+    rand = random.Random(0)
+    pubkeys = [rand.randbytes(32).hex() for _ in range(10_000)]
+    for i in range(count):
+        event = NostrEvent(
+            id=rand.randbytes(32).hex(),
+            pubkey=rand.choice(pubkeys),
+            created_at=1_600_000_000 + i,
+            kind=EventKind.TextNote,  # type: ignore
+            tags=[
+                NostrTag("e", rand.randbytes(32).hex(), []),
+                NostrTag("p", rand.choice(pubkeys), []),
+            ],
+            content="".join(rand.choices(string.ascii_letters, k=100)),
+            sig=rand.randbytes(64).hex(),
+        )
+        # what the relay caches on an event it verified and broadcast
+        event.canonical, event.json
+        yield event
+
+
+def measure(
+    name: str, count: int, store: Callable[[Iterator[NostrEvent]], object]
+) -> None:
+    gc.collect()
+    tracemalloc.start()
+    stored = store(generate(count))
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<28} {used / 2**20:>8.1f}MiB {used / count:>6.0f}B/event")
+    del stored
+
+
+def nostr_events(events: Iterator[NostrEvent]) -> dict:
+    return {event.id: event for event in events}
+
+
+def compact_events(events: Iterator[NostrEvent]) -> dict:
+    records = (CompactEvent.of(event) for event in events)
+    return {record.raw_id: record for record in records}
+
+
+def repository(events: Iterator[NostrEvent]) -> InMemoryEventsRepository:
+    repo = InMemoryEventsRepository()
+    loop = asyncio.new_event_loop()
+    for event in events:
+        loop.run_until_complete(repo.add(event))
+
+    loop.close()
+    return repo
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else EVENTS
+    measure("NostrEvent", count, nostr_events)
+    measure("CompactEvent", count, compact_events)
+    measure("repository (with indexes)", count, repository)
+
+
+if __name__ == "__main__":
+    main()
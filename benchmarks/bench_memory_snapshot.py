@@ -0,0 +1,80 @@
+"""
+Save and load times of in-memory repository snapshots, and how long the event
+loop is blocked while a snapshot is saved in the background.
+
+Usage: python -m benchmarks.bench_memory_snapshot [events ...], default 1000000
+"""
+import asyncio
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+from pyrelay.nostr.event import EventKind, NostrEvent, NostrTag
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+
+SIZES = [1_000_000]
+START = 1_600_000_000
+
+
+async def fill(repo: InMemoryEventsRepository, count: int) -> None:
+    # signatures are never checked by the repository, so skip signing
+    rand = random.Random(0)
+    pubkeys = [secrets.token_hex(32) for _ in range(10_000)]
+    for i in range(count):
+        await repo.add(
+            NostrEvent(
+                id=secrets.token_hex(32),
+                pubkey=rand.choice(pubkeys),
+                created_at=START + i,
+                kind=rand.choice([EventKind.TextNote, EventKind.Reaction]),
+                tags=[NostrTag("p", rand.choice(pubkeys), [])],
+                content=secrets.token_hex(rand.randint(10, 100)),
+                sig=secrets.token_hex(64),
+            )
+        )
+
+
+async def longest_pause(task: asyncio.Task) -> float:
+    # ticks of the event loop while the task runs
+    longest, last = 0.0, time.perf_counter()
+    while not task.done():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        longest, last = max(longest, now - last), now
+
+    return longest
+
+
+async def run(count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.snapshot")
+        repo = InMemoryEventsRepository(snapshot_path=path)
+        await fill(repo, count)
+
+        start = time.perf_counter()
+        pause = await longest_pause(asyncio.create_task(repo.save_snapshot()))
+        save = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = InMemoryEventsRepository(snapshot_path=path)
+        load = time.perf_counter() - start
+        assert len(loaded.data) == count
+
+        print(
+            f"{count:>10,} events {os.path.getsize(path) / 2**20:,.0f}MiB"
+            f" save={save:.2f}s longest loop pause={pause * 1e3:.0f}ms"
+            f" load={load:.2f}s"
+        )
+
+
+def main() -> None:
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    for count in sizes:
+        asyncio.run(run(count))
+
+
+if __name__ == "__main__":
+    main()
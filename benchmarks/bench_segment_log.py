@@ -0,0 +1,77 @@
+"""
+Restart time of the segment log repository from its index snapshot against
+parsing every segment, and replay of a whole timeline.
+
+Usage: python -m benchmarks.bench_segment_log [events ...], default 100000 1000000
+"""
+import asyncio
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+from pyrelay.nostr.event import EventKind, NostrEvent, NostrTag
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.repos.segment_log_repo import SNAPSHOT, SegmentLogEventsRepository
+
+SIZES = [100_000, 1_000_000]
+START = 1_600_000_000
+
+
+async def fill(repo: SegmentLogEventsRepository, count: int) -> None:
+    # signatures are never checked by the repository, so skip signing
+    rand = random.Random(0)
+    pubkeys = [secrets.token_hex(32) for _ in range(1_000)]
+    for i in range(count):
+        await repo.add(
+            NostrEvent(
+                id=secrets.token_hex(32),
+                pubkey=rand.choice(pubkeys),
+                created_at=START + i,
+                kind=EventKind.TextNote,
+                tags=[NostrTag("p", rand.choice(pubkeys), [])],
+                content=secrets.token_hex(rand.randint(10, 100)),
+                sig=secrets.token_hex(64),
+            )
+        )
+
+
+def restart(path: str) -> float:
+    start = time.perf_counter()
+    repo = SegmentLogEventsRepository(path, compact_interval=0)
+    elapsed = time.perf_counter() - start
+    repo.close()
+    return elapsed
+
+
+async def run(count: int) -> None:
+    with tempfile.TemporaryDirectory() as path:
+        repo = SegmentLogEventsRepository(path, compact_interval=0)
+        await fill(repo, count)
+        start = time.perf_counter()
+        events = await repo.query(NostrFilter(limit=count))
+        replay = time.perf_counter() - start
+        assert len(events) == count
+        repo.close()
+
+        from_snapshot = restart(path)
+        os.remove(os.path.join(path, SNAPSHOT))
+        from_segments = restart(path)
+
+    print(
+        f"{count:>10,} events restart: snapshot={from_snapshot:.2f}s"
+        f" parsing segments={from_segments:.2f}s"
+        f" replay all={replay:.2f}s"
+    )
+
+
+def main() -> None:
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    for count in sizes:
+        asyncio.run(run(count))
+
+
+if __name__ == "__main__":
+    main()
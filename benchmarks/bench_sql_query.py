@@ -0,0 +1,147 @@
+"""
+Latency of SqlAlchemyEventRepository queries on a seeded SQLite database.
+The database is created on first use and kept, seeding a million events
+takes a few minutes.
+
+Usage: python -m benchmarks.bench_sql_query [path] [events], default
+bench_events.db 1000000
+"""
+import asyncio
+import json
+import os
+import pickle
+import random
+import secrets
+import sqlite3
+import sys
+import time
+
+from pyrelay.nostr.event import EventKind
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.bootstrap import set_up_session_maker
+from pyrelay.relay.repos.sqlalchemy_event_repo import SqlAlchemyEventRepository
+
+PATH = "bench_events.db"
+COUNT = 1_000_000
+START = 1_600_000_000
+ROUNDS = 20
+CHUNK = 50_000
+
+
+def seed(path: str, count: int) -> tuple[list[str], list[str]]:
+    """
+    Fills the database, returns pubkeys and event ids to query
+    """
+    rand = random.Random(0)
+    pubkeys = [secrets.token_hex(32) for _ in range(10_000)]
+    ids: list[str] = []
+    no_extra = pickle.dumps([])
+    with sqlite3.connect(path) as connection:
+        for start in range(0, count, CHUNK):
+            events, tags = [], []
+            for i in range(start, min(start + CHUNK, count)):
+                event_id = secrets.token_hex(32)
+                kind = rand.choice([EventKind.TextNote, EventKind.Reaction])
+                pubkey = rand.choice(pubkeys)
+                content = secrets.token_hex(rand.randint(10, 100))
+                sig = secrets.token_hex(64)
+                event_tags = [("p", rand.choice(pubkeys))]
+                if ids:
+                    event_tags.append(("e", rand.choice(ids)))
+                ids.append(event_id)
+
+                # NostrEvent.json of the event
+                raw = json.dumps(
+                    dict(
+                        pubkey=pubkey,
+                        created_at=START + i,
+                        kind=kind.value,
+                        tags=event_tags,
+                        content=content,
+                        id=event_id,
+                        sig=sig,
+                    ),
+                    separators=(",", ":"),
+                )
+                events.append(
+                    (event_id, pubkey, kind.name, START + i, content, sig, raw)
+                )
+                tags.extend((event_id, *tag, no_extra) for tag in event_tags)
+
+            connection.executemany(
+                "INSERT INTO event (id, pubkey, kind, created_at, content, sig, raw)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                events,
+            )
+            connection.executemany(
+                "INSERT INTO tag (event_id, type, key, extra) VALUES (?, ?, ?, ?)",
+                tags,
+            )
+
+    return pubkeys, ids
+
+
+def load(path: str) -> tuple[list[str], list[str]]:
+    with sqlite3.connect(path) as connection:
+        pubkeys = [row[0] for row in connection.execute("SELECT pubkey FROM event")]
+        query = "SELECT id FROM event ORDER BY db_id"
+        ids = [row[0] for row in connection.execute(query)]
+
+    return sorted(set(pubkeys)), ids
+
+
+def filters(pubkeys: list[str], ids: list[str]) -> dict[str, list[NostrFilter]]:
+    rand = random.Random(1)
+    middle = START + len(ids) // 2
+    return {
+        "#p, 50": [NostrFilter(generic_tags={"p": pubkeys[:1]}, limit=50)],
+        "#e of 20 events": [NostrFilter(generic_tags={"e": rand.sample(ids, 20)})],
+        "#p and #e, 50": [
+            NostrFilter(generic_tags={"p": pubkeys[:100], "e": ids[:10_000]}, limit=50)
+        ],
+        "10 authors, 50": [NostrFilter(authors=pubkeys[:10], limit=50)],
+        "kind, 100": [
+            NostrFilter(kinds=[EventKind.Reaction], limit=100)  # type: ignore
+        ],
+        "1000s window": [NostrFilter(since=middle, until=middle + 1000)],
+        "ids": [NostrFilter(ids=rand.sample(ids, 20))],
+        "author, 10 + kind, 500": [
+            NostrFilter(authors=pubkeys[:1], limit=10),
+            NostrFilter(kinds=[EventKind.TextNote], limit=500),  # type: ignore
+        ],
+    }
+
+
+async def run(path: str, count: int) -> None:
+    fresh = not os.path.exists(path)
+    session_maker = set_up_session_maker(
+        f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+    )
+    if fresh:
+        start = time.perf_counter()
+        pubkeys, ids = seed(path, count)
+        print(f"seeded {count:,} events in {time.perf_counter() - start:.0f}s")
+    else:
+        pubkeys, ids = load(path)
+
+    for name, query in filters(pubkeys, ids).items():
+        async with session_maker() as session:
+            repo = SqlAlchemyEventRepository(session)
+            events = await repo.query(*query)
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                await repo.query(*query)
+                session.expunge_all()
+
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print(f"  {name:<24} {elapsed * 1e3:>9.2f}ms {len(events):>5} events")
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else COUNT
+    asyncio.run(run(path, count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Concurrent REQs and published events on sqlite, with the engine the relay used
+before (no pragmas, a connection per session) against the tuned profile (WAL, a
+single writer connection and a pool of readers).
+Each mode runs on its own copy of a seeded database for a fixed duration.
+
+Usage: python -m benchmarks.bench_sqlite_profile [seconds] [readers] [writers]
+"""
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_sql_query import seed
+from pyrelay.nostr.event import NostrEvent
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.db.session import (
+    start_engine,
+    start_reader_engine,
+    start_session,
+    upgrade,
+)
+from pyrelay.relay.db.tables import init_mapper
+from pyrelay.relay.unit_of_work import SqlAlchemyUOW
+
+SECONDS = 10
+READERS = 20
+WRITERS = 5
+STORED = 200_000
+
+
+async def read(session_maker, filters: list[NostrFilter], latencies, deadline) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with SqlAlchemyUOW(session_maker, None) as uow:
+            async for _ in uow.events.stream_json(random.choice(filters)):
+                pass
+        latencies.append(time.perf_counter() - start)
+
+
+async def write(session_maker, events: list[NostrEvent], latencies, deadline) -> None:
+    for event in events:
+        if time.perf_counter() >= deadline:
+            return
+
+        start = time.perf_counter()
+        async with SqlAlchemyUOW(session_maker, None) as uow:
+            await uow.events.add(event)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(
+    name: str,
+    session_maker: sessionmaker,
+    filters: list[NostrFilter],
+    events: list[list[NostrEvent]],
+    readers: int,
+    seconds: float,
+) -> None:
+    reads: list[float] = []
+    writes: list[float] = []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(read(session_maker, filters, reads, deadline) for _ in range(readers)),
+        *(write(session_maker, each, writes, deadline) for each in events),
+    )
+
+    def p99(latencies: list[float]) -> float:
+        return statistics.quantiles(latencies, n=100)[98] * 1e3
+
+    print(
+        f"  {name:<8} reads {len(reads) / seconds:>7,.0f}/s p99={p99(reads):>7.1f}ms"
+        f"  writes {len(writes) / seconds:>6,.0f}/s p99={p99(writes):>7.1f}ms"
+    )
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else SECONDS
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else READERS
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else WRITERS
+
+    with tempfile.TemporaryDirectory(dir=".") as directory:
+        base = os.path.join(directory, "base.db")
+        upgrade(f"sqlite:///{base}")
+        init_mapper()
+        pubkeys, _ = seed(base, STORED)
+        filters = [
+            NostrFilter(generic_tags={"p": [pubkey]}, limit=50)
+            for pubkey in pubkeys[:100]
+        ] + [NostrFilter(authors=[pubkey], limit=50) for pubkey in pubkeys[:100]]
+        builders = [EventBuilder.from_generated() for _ in range(writers)]
+
+        def copy(name: str) -> str:
+            path = os.path.join(directory, f"{name}.db")
+            shutil.copy(base, path)
+            return f"sqlite+aiosqlite:///{path}"
+
+        def generate() -> list[list[NostrEvent]]:
+            return [
+                [builder.create_event(f"{i}") for i in range(5_000)]
+                for builder in builders
+            ]
+
+        print(f"{readers} readers, {writers} writers, {STORED:,} stored events")
+        uri = copy("default")
+        default = start_session(create_async_engine(uri, pool_pre_ping=True))
+        asyncio.run(run("default", default, filters, generate(), readers, seconds))
+
+        uri = copy("tuned")
+        tuned = start_session(start_engine(uri), start_reader_engine(uri))
+        asyncio.run(run("tuned", tuned, filters, generate(), readers, seconds))
+
+
+if __name__ == "__main__":
+    main()
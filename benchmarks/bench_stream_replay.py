@@ -0,0 +1,88 @@
+"""
+Replay of a REQ without a limit from the sql relay: all events queried before
+the first frame is sent, events streamed as they are read, and the stored json
+streamed without loading the events.
+Reports the time to the first frame and the frames per second, then the peak
+memory of the python objects in a second run under tracemalloc, using the
+database of benchmarks.bench_sql_query.
+
+Usage: python -m benchmarks.bench_stream_replay [path] [events replayed]
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from typing import AsyncIterator
+
+from benchmarks.bench_sql_query import COUNT, PATH, START, seed
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.nostr.msgs import NostrEventUpdate, NostrRawEventUpdate
+from pyrelay.nostr.serialize import dumps
+from pyrelay.relay.bootstrap import set_up_session_maker
+from pyrelay.relay.repos.sqlalchemy_event_repo import SqlAlchemyEventRepository
+
+REPLAYED = 10_000
+MODES = ["query", "stream", "json"]
+
+
+async def frames(
+    repo: SqlAlchemyEventRepository, mode: str, _filter: NostrFilter
+) -> AsyncIterator[str]:
+    if mode == "query":
+        for event in await repo.query(_filter):
+            yield dumps(NostrEventUpdate("sub", event))
+    elif mode == "stream":
+        async for event in repo.stream(_filter):
+            yield dumps(NostrEventUpdate("sub", event))
+    else:
+        async for raw in repo.stream_json(_filter):
+            yield dumps(NostrRawEventUpdate("sub", raw))
+
+
+async def replay(session_maker, mode: str, _filter: NostrFilter) -> None:
+    async with session_maker() as session:
+        repo = SqlAlchemyEventRepository(session)
+        start = time.perf_counter()
+        first = None
+        count = 0
+        async for _ in frames(repo, mode, _filter):
+            # sent and dropped, like a frame written to a client
+            if first is None:
+                first = time.perf_counter() - start
+            count += 1
+
+        elapsed = time.perf_counter() - start
+
+    async with session_maker() as session:
+        repo = SqlAlchemyEventRepository(session)
+        tracemalloc.start()
+        async for _ in frames(repo, mode, _filter):
+            pass
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(
+        f"  {mode:<7} {count:>7,} events first={first * 1e3:.1f}ms"
+        f" {count / elapsed:>8,.0f} frames/s peak={peak / 2**20:,.1f}MiB"
+    )
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH
+    replayed = int(sys.argv[2]) if len(sys.argv) > 2 else REPLAYED
+    fresh = not os.path.exists(path)
+    session_maker = set_up_session_maker(
+        f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+    )
+    if fresh:
+        seed(path, COUNT)
+
+    _filter = NostrFilter(since=START, until=START + replayed)
+    for mode in MODES:
+        asyncio.run(replay(session_maker, mode, _filter))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Per-event memory overhead of the tags index and the cost of tag lookups.
+
+Usage: python -m benchmarks.bench_tags_index
+"""
+import secrets
+import timeit
+import tracemalloc
+
+from pyrelay.nostr.event import NostrEvent, NostrTag
+
+EVENTS = 10_000
+TAGS = (0, 2, 10, 100)
+
+
+def make_event(tags: int) -> NostrEvent:
+    return NostrEvent(
+        id=secrets.token_hex(32),
+        pubkey=secrets.token_hex(32),
+        created_at=0,
+        kind=1,  # type: ignore
+        tags=[
+            NostrTag("ep"[i % 2], secrets.token_hex(32), ["wss://relay"])
+            for i in range(tags)
+        ],
+        content="",
+        sig=secrets.token_hex(64),
+    )
+
+
+def main() -> None:
+    for tags in TAGS:
+        events = [make_event(tags) for _ in range(EVENTS)]
+
+        tracemalloc.start()
+        for event in events:
+            event.tags_index
+        overhead, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        event = events[0]
+        scan = timeit.timeit(
+            lambda: set(tag.key for tag in event.tags if tag.type == "p"),
+            number=10_000,
+        )
+        lookup = timeit.timeit(lambda: event.get_tags_keys("p"), number=10_000)
+        print(
+            f"tags={tags:>3} index={overhead / EVENTS:>8.0f}B/event "
+            f"scan={scan / 10_000 * 1e6:>6.2f}us lookup={lookup / 10_000 * 1e6:.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Ingest verification throughput inline and with thread / process pools.
+
+Usage: python -m benchmarks.bench_verify
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.relay.event_verifier import EventVerifier
+
+EVENTS = 5_000
+
+
+async def bench(name: str, executor: Optional[Executor], events: list) -> None:
+    verifier = EventVerifier(executor)
+    # warm up the workers
+    await asyncio.gather(*(verifier.verify(event) for event in events[:100]))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(verifier.verify(event) for event in events))
+    took = time.perf_counter() - start
+    verifier.shutdown()
+
+    assert all(results)
+    print(f"{name:<12} {len(events) / took:>10.0f} events/s")
+
+
+async def main() -> None:
+    builders = [EventBuilder.from_generated() for _ in range(100)]
+    events = [
+        builders[i % len(builders)].create_event(f"event number {i}")
+        for i in range(EVENTS)
+    ]
+
+    await bench("inline", None, events)
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        await bench(f"thread x{workers}", ThreadPoolExecutor(workers), events)
+        await bench(f"process x{workers}", ProcessPoolExecutor(workers), events)
+        workers *= 2
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
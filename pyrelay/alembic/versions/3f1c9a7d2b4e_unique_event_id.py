@@ -0,0 +1,39 @@
+"""Unique event id
+
+Revision ID: 3f1c9a7d2b4e
+Revises: 5c571f8007b7
+Create Date: 2026-10-18 10:12:31.402119
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f1c9a7d2b4e"
+down_revision = "5c571f8007b7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # tags reference the event id, not the copy, so the tags of the removed
+    # copies would attach to the kept one. The copies have the same tags and
+    # each copy's tags were inserted after the previous copy's, the tags of
+    # the first copy are the first tags of the event id
+    op.execute(
+        "DELETE FROM tag WHERE id IN ("
+        "SELECT t.id FROM tag t "
+        "WHERE t.event_id IN (SELECT id FROM event GROUP BY id HAVING COUNT(*) > 1) "
+        "AND (SELECT COUNT(*) FROM tag p WHERE p.event_id = t.event_id AND p.id < t.id)"
+        " >= (SELECT COUNT(*) FROM tag a WHERE a.event_id = t.event_id)"
+        " / (SELECT COUNT(*) FROM event e WHERE e.id = t.event_id))"
+    )
+    # keep only the first copy of events that were saved more than once
+    op.execute(
+        "DELETE FROM event WHERE db_id NOT IN "
+        "(SELECT MIN(db_id) FROM event GROUP BY id)"
+    )
+    op.create_index(op.f("ix_event_id"), "event", ["id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_event_id"), table_name="event")
@@ -0,0 +1,51 @@
+"""Indexes for tag and time ordered filters
+
+Revision ID: 7d4e2b9c1a5f
+Revises: 3f1c9a7d2b4e
+Create Date: 2026-10-18 12:40:05.118230
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7d4e2b9c1a5f"
+down_revision = "3f1c9a7d2b4e"
+branch_labels = None
+depends_on = None
+
+NOT_DELETED = sa.text("deleted_at IS NULL")
+
+
+def upgrade() -> None:
+    # tag filters look up (type, key), loading an event's tags looks up event_id
+    op.create_index("ix_tag_type_key_event_id", "tag", ["type", "key", "event_id"])
+    op.create_index(op.f("ix_tag_event_id"), "tag", ["event_id"])
+
+    # authors and kinds filters come ordered by created_at, the composite indexes
+    # also serve lookups by pubkey or kind alone
+    op.create_index("ix_event_pubkey_created_at", "event", ["pubkey", "created_at"])
+    op.create_index("ix_event_kind_created_at", "event", ["kind", "created_at"])
+    op.drop_index(op.f("ix_event_pubkey"), table_name="event")
+    op.drop_index(op.f("ix_event_kind"), table_name="event")
+
+    # the timeline of events that weren't deleted, every query filters them
+    op.drop_index(op.f("ix_event_created_at"), table_name="event")
+    op.create_index(
+        "ix_event_created_at_not_deleted",
+        "event",
+        ["created_at"],
+        sqlite_where=NOT_DELETED,
+        postgresql_where=NOT_DELETED,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_event_created_at_not_deleted", table_name="event")
+    op.create_index(op.f("ix_event_created_at"), "event", ["created_at"])
+    op.create_index(op.f("ix_event_kind"), "event", ["kind"])
+    op.create_index(op.f("ix_event_pubkey"), "event", ["pubkey"])
+    op.drop_index("ix_event_kind_created_at", table_name="event")
+    op.drop_index("ix_event_pubkey_created_at", table_name="event")
+    op.drop_index(op.f("ix_tag_event_id"), table_name="tag")
+    op.drop_index("ix_tag_type_key_event_id", table_name="tag")
@@ -0,0 +1,87 @@
+"""Raw event json
+
+Revision ID: b6f3d8e1c27a
+Revises: 7d4e2b9c1a5f
+Create Date: 2026-10-18 16:02:41.503518
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from pyrelay.nostr.event import EventKind, NostrEvent, NostrTag
+
+# revision identifiers, used by Alembic.
+revision = "b6f3d8e1c27a"
+down_revision = "7d4e2b9c1a5f"
+branch_labels = None
+depends_on = None
+
+CHUNK = 10_000
+
+event = sa.table(
+    "event",
+    sa.column("db_id", sa.Integer),
+    sa.column("id", sa.String),
+    sa.column("pubkey", sa.String),
+    sa.column("kind", sa.Enum(EventKind)),
+    sa.column("created_at", sa.Integer),
+    sa.column("content", sa.String),
+    sa.column("sig", sa.String),
+    sa.column("raw", sa.String),
+)
+
+tag = sa.table(
+    "tag",
+    sa.column("id", sa.Integer),
+    sa.column("event_id", sa.String),
+    sa.column("type", sa.String),
+    sa.column("key", sa.String),
+    sa.column("extra", sa.PickleType),
+)
+
+
+def upgrade() -> None:
+    op.add_column("event", sa.Column("raw", sa.String(), nullable=True))
+
+    # the stored events are serialized once here, chunk by chunk
+    connection = op.get_bind()
+    last = 0
+    while True:
+        query = (
+            sa.select(event)
+            .where(event.c.db_id > last)
+            .order_by(event.c.db_id)
+            .limit(CHUNK)
+        )
+        rows = connection.execute(query).all()
+        if not rows:
+            break
+
+        tags: dict[str, list[NostrTag]] = {row.id: [] for row in rows}
+        query = sa.select(tag).where(tag.c.event_id.in_(tags.keys())).order_by(tag.c.id)
+        for row in connection.execute(query):
+            tags[row.event_id].append(NostrTag(row.type, row.key, row.extra))
+
+        values = [
+            dict(
+                b_db_id=row.db_id,
+                raw=NostrEvent(
+                    pubkey=row.pubkey,
+                    created_at=row.created_at,
+                    kind=row.kind,
+                    tags=tags[row.id],
+                    content=row.content,
+                    id=row.id,
+                    sig=row.sig,
+                ).json,
+            )
+            for row in rows
+        ]
+        connection.execute(
+            event.update().where(event.c.db_id == sa.bindparam("b_db_id")), values
+        )
+        last = rows[-1].db_id
+
+
+def downgrade() -> None:
+    op.drop_column("event", "raw")
@@ -1,6 +1,9 @@
 import enum
 import json
+from collections import defaultdict
+from functools import cached_property, lru_cache
 from hashlib import sha256
+from types import MappingProxyType
 from typing import Any, Collection, Mapping, Self, TypeAlias
 
 import attr
@@ -20,6 +23,8 @@ EventId: TypeAlias = str  # <32-bytes sha256 of the the serialized event data>
 PubKey: TypeAlias = str  # <32-bytes hex-encoded public key of the event creator>,
 URL: TypeAlias = str
 
+NO_TAGS: frozenset[str] = frozenset()
+
 KINDS: dict[str, range | int] = {
     "Metadata": 0,  # nip  1,5
     "TextNote": 1,  # nip  1
@@ -96,23 +101,61 @@ def sign_event_id(event_id: EventId, private_key_hex: str) -> str:
     return sig.hex()
 
 
-def calc_event_id(
+def serialize_event_data(
     public_key: PubKey, created_at: int, kind_number: int, tags: list, content: str
-) -> str:
+) -> bytes:
+    """
+    The NIP-01 serialization of the event, the event id is its sha256
+    """
     data = [0, public_key, created_at, kind_number, tags, content]
     data_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-    return sha256(data_str.encode("UTF-8")).hexdigest()
+    return data_str.encode("UTF-8")
+
+
+def calc_event_id(
+    public_key: PubKey, created_at: int, kind_number: int, tags: list, content: str
+) -> str:
+    data = serialize_event_data(public_key, created_at, kind_number, tags, content)
+    return sha256(data).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _public_key(pubkey: PubKey) -> secp256k1.PublicKey:
+    # add 02 for schnorr (bip340)
+    return secp256k1.PublicKey(bytes.fromhex("02" + pubkey), True)
 
 
 def verify(event_id: str, pubkey: str, sig: str) -> bool:
-    pub_key = secp256k1.PublicKey(
-        bytes.fromhex("02" + pubkey), True
-    )  # add 02 for schnorr (bip340)
+    pub_key = _public_key(pubkey)
     return pub_key.schnorr_verify(
         bytes.fromhex(event_id), bytes.fromhex(sig), None, raw=True
     )
 
 
+class Validity(enum.Enum):
+    VALID = ""
+    ID_MISMATCH = "event id does not match the event content"
+    BAD_SIGNATURE = "signature is wrong"
+
+
+def validate(canonical: bytes, event_id: EventId, pubkey: PubKey, sig: str) -> Validity:
+    """
+    Checks the claimed id against the canonical serialization before doing any
+    signature work, then verifies the signature
+    """
+    if sha256(canonical).hexdigest() != event_id:
+        return Validity.ID_MISMATCH
+
+    try:
+        valid = verify(event_id=event_id, pubkey=pubkey, sig=sig)
+    except Exception:
+        # malformed pubkey or signature, secp256k1 raises a bare Exception for
+        # a public key that isn't on the curve
+        valid = False
+
+    return Validity.VALID if valid else Validity.BAD_SIGNATURE
+
+
 @attr.s(auto_attribs=True)
 class BaseNostrEvent(NostrDataType):
     pubkey: PubKey  # <32-bytes hex-encoded public key of the event creator>,
@@ -130,15 +173,15 @@ class BaseNostrEvent(NostrDataType):
             content=self.content,
         )
 
-    def get_tags_keys(self, tag_type: str) -> set[str]:
-        return set(tag.key for tag in self.tags if tag.type == tag_type)
+    def get_tags_keys(self, tag_type: str) -> frozenset[str]:
+        return frozenset(tag.key for tag in self.tags if tag.type == tag_type)
 
     @property
-    def e_tags(self) -> set[str]:
+    def e_tags(self) -> frozenset[str]:
         return self.get_tags_keys("e")
 
     @property
-    def p_tags(self) -> set[str]:
+    def p_tags(self) -> frozenset[str]:
         return self.get_tags_keys("p")
 
 
@@ -151,8 +194,45 @@ class NostrEvent(BaseNostrEvent):
     # the same as the "id" field>
     sig: str
 
+    @cached_property
+    def canonical(self) -> bytes:
+        """
+        The NIP-01 serialization, computed once and reused by every stage that
+        needs it (see `validate`)
+        """
+        return serialize_event_data(
+            public_key=self.pubkey,
+            created_at=self.created_at,
+            kind_number=self.kind,
+            tags=[tag.serialize() for tag in self.tags],
+            content=self.content,
+        )
+
+    def calc_id(self) -> str:
+        return sha256(self.canonical).hexdigest()
+
+    @cached_property
+    def tags_index(self) -> Mapping[str, frozenset[str]]:
+        """
+        Read-only mapping of tag type to the keys of the tags of that type,
+        built once on first use
+        """
+        index: defaultdict[str, set[str]] = defaultdict(set)
+        for tag in self.tags:
+            index[tag.type].add(tag.key)
+
+        return MappingProxyType(
+            {tag_type: frozenset(keys) for tag_type, keys in index.items()}
+        )
+
+    def get_tags_keys(self, tag_type: str) -> frozenset[str]:
+        return self.tags_index.get(tag_type, NO_TAGS)
+
+    def validate(self) -> Validity:
+        return validate(self.canonical, self.id, self.pubkey, self.sig)
+
     def verify(self) -> bool:
-        return verify(event_id=self.calc_id(), pubkey=self.pubkey, sig=self.sig)
+        return self.validate() is Validity.VALID
 
     def serialize(self) -> JSONValues:
         msg = self.dict()
@@ -173,6 +253,14 @@ class NostrEvent(BaseNostrEvent):
         msg["kind"] = self.kind
         return msg
 
+    @cached_property
+    def json(self) -> str:
+        """
+        The event object as json, computed once since events are immutable
+        after signing
+        """
+        return json.dumps(self.dict(), separators=(",", ":"))
+
 
 @attr.s(auto_attribs=True)
 class UnsignedNostrEvent(BaseNostrEvent):
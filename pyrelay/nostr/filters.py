@@ -1,4 +1,5 @@
-from typing import Optional, Self
+from bisect import bisect_right
+from typing import Iterable, Optional, Self
 
 import attr
 
@@ -11,6 +12,9 @@ from pyrelay.nostr.event import (
     PubKey,
 )
 
+# Length of a full hex encoded id / pubkey, anything shorter is a prefix
+HEX32_LENGTH = 64
+
 
 @attr.s(auto_attribs=True)
 class NostrFilter(NostrDataType):
@@ -78,6 +82,93 @@ class NostrFilter(NostrDataType):
 
         return data
 
+    def compile(self) -> "FilterMatcher":
+        """
+        Immutable matcher of the filter, to be used when the same filter is
+        applied on many events
+        """
+        return FilterMatcher(
+            ids=PrefixSet.of(self.ids) if self.ids else None,
+            authors=PrefixSet.of(self.authors) if self.authors else None,
+            kinds=frozenset(self.kinds) if self.kinds else None,
+            since=self.since or None,
+            until=self.until or None,
+            generic_tags=tuple(
+                (tag_type, frozenset(values))
+                for tag_type, values in (self.generic_tags or {}).items()
+            ),
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class PrefixSet:
+    """
+    Ids or pubkeys given as full values or prefixes.
+    Full values are looked up by hash, prefixes are kept sorted with none of them
+    being a prefix of another, so the only candidate prefix of a value is the
+    closest one before it (found with bisect)
+    """
+
+    exact: frozenset[str]
+    prefixes: tuple[str, ...]
+
+    @classmethod
+    def of(cls, values: Iterable[str], length: int = HEX32_LENGTH) -> "PrefixSet":
+        exact: set[str] = set()
+        prefixes: list[str] = []
+        for value in sorted(set(values)):
+            if prefixes and value.startswith(prefixes[-1]):
+                # already covered by a shorter prefix
+                continue
+
+            if len(value) == length:
+                exact.add(value)
+            else:
+                prefixes.append(value)
+
+        return cls(frozenset(exact), tuple(prefixes))
+
+    def match(self, value: str) -> bool:
+        if value in self.exact:
+            return True
+
+        i = bisect_right(self.prefixes, value)
+        return i > 0 and value.startswith(self.prefixes[i - 1])
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class FilterMatcher:
+    """
+    Compiled form of NostrFilter, see `NostrFilter.compile`
+    """
+
+    ids: Optional[PrefixSet]
+    authors: Optional[PrefixSet]
+    kinds: Optional[frozenset[EventKind]]
+    since: Optional[int]
+    until: Optional[int]
+    generic_tags: tuple[tuple[str, frozenset[str]], ...]
+
+    def match(self, event: NostrEvent) -> bool:
+        return (
+            (self.ids is None or self.ids.match(event.id))
+            and (self.authors is None or self.authors.match(event.pubkey))
+            and (self.kinds is None or event.kind in self.kinds)
+            and (self.since is None or event.created_at >= self.since)
+            and (self.until is None or event.created_at < self.until)
+            and all(
+                not values.isdisjoint(event.get_tags_keys(tag_type))
+                for tag_type, values in self.generic_tags
+            )
+        )
+
+
+def match_many(event: NostrEvent, *matchers: FilterMatcher) -> bool:
+    if not matchers:
+        return True
+
+    return any(matcher.match(event) for matcher in matchers)
+
 
 def _match_any_prefix(prefixes: list[str], value: str) -> bool:
     return any(map(lambda pref: value.startswith(pref), prefixes))
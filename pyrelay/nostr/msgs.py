@@ -1,3 +1,5 @@
+import json
+
 import attr
 
 from pyrelay.nostr.event import EventId, JSONValues, NostrDataType, NostrEvent
@@ -47,6 +49,19 @@ class NostrEventUpdate(NostrDataType):
         )
 
 
+@attr.s(auto_attribs=True)
+class NostrRawEventUpdate(NostrDataType):
+    """
+    Update of an event already serialized, as stored, sent without parsing it
+    """
+
+    subscription_id: str
+    event_json: str
+
+    def serialize(self) -> JSONValues:
+        return ["EVENT", self.subscription_id, json.loads(self.event_json)]
+
+
 @attr.s(auto_attribs=True)
 class NostrNoticeUpdate(NostrDataType):
     message: str
@@ -78,6 +93,14 @@ class NostrCommandResults(NostrDataType):
     def serialize(self) -> JSONValues:
         return ["OK", self.event_id, self.saved, self.message or ""]
 
+    @property
+    def reason(self) -> str:
+        """
+        The machine-readable prefix of the message, e.g. duplicate or invalid
+        """
+        reason, _, _ = (self.message or "").partition(":")
+        return reason
+
     @classmethod
     def deserialize(cls, *, event_id, saved, message) -> "NostrCommandResults":
         return NostrCommandResults(event_id, saved, message)
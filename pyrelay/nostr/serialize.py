@@ -7,6 +7,7 @@ from pyrelay.nostr.msgs import (
     NostrEOSE,
     NostrEventUpdate,
     NostrNoticeUpdate,
+    NostrRawEventUpdate,
     NostrRequest,
 )
 
@@ -47,5 +48,16 @@ def loads(message: str) -> NostrDataType:
 
 
 def dumps(data: NostrDataType) -> str:
+    match data:
+        # Splice the cached event json instead of serializing it per message
+        case NostrEventUpdate(subscription_id=subscription_id, event=event):
+            return f'["EVENT",{json.dumps(subscription_id)},{event.json}]'
+
+        case NostrRawEventUpdate(subscription_id=subscription_id, event_json=raw):
+            return f'["EVENT",{json.dumps(subscription_id)},{raw}]'
+
+        case NostrEvent() as event:
+            return f'["EVENT",{event.json}]'
+
     msg = data.serialize()
     return json.dumps(msg)
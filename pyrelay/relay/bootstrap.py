@@ -2,12 +2,36 @@ from typing import Callable, Optional
 
 from sqlalchemy.orm import sessionmaker
 
-from pyrelay.relay.config import settings
-from pyrelay.relay.db.session import start_engine, start_session, upgrade
+from pyrelay.relay.config import MemoryStore, settings
+from pyrelay.relay.db.batch_writer import BatchWriter
+from pyrelay.relay.db.session import (
+    iter_event_ids,
+    start_engine,
+    start_reader_engine,
+    start_session,
+    upgrade,
+)
 from pyrelay.relay.db.tables import init_mapper
-from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.event_verifier import EventVerifier
+from pyrelay.relay.relay_service import EventsRepository, Subscriptions
 from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
-from pyrelay.relay.unit_of_work import InMemoryUOW, SqlAlchemyUOW, UnitOfWork
+from pyrelay.relay.repos.segment_log_repo import SegmentLogEventsRepository
+from pyrelay.relay.repos.tiered_event_repo import HotTier
+from pyrelay.relay.unit_of_work import (
+    InMemoryUOW,
+    SqlAlchemyUOW,
+    TieredUOW,
+    UnitOfWork,
+    new_event_ids_filter,
+)
+
+# resources to release when the relay stops, see `shutdown`
+shutdown_hooks: list[Callable[[], None]] = []
+
+
+def shutdown() -> None:
+    while shutdown_hooks:
+        shutdown_hooks.pop()()
 
 
 def set_up_session_maker(
@@ -20,14 +44,48 @@ def set_up_session_maker(
 
     async_uri = async_uri or settings.ASYNC_SQLALCHEMY_DATABASE_URI
     engine = start_engine(async_uri)
-    return start_session(engine)
+    return start_session(engine, start_reader_engine(async_uri))
+
+
+def in_memory_repository() -> EventsRepository:
+    if settings.MEMORY_STORE is MemoryStore.COLUMNAR:
+        # numpy is an optional dependency, imported only when it is used
+        from pyrelay.relay.repos.columnar_event_repo import ColumnarEventsRepository
+
+        return ColumnarEventsRepository()
+
+    return InMemoryEventsRepository.from_settings()
 
 
 def get_uow_factory(in_memory: bool = False) -> Callable[[], UnitOfWork]:
     subscriptions = Subscriptions()
+    verifier = EventVerifier.from_settings()
+    event_ids = new_event_ids_filter()
     if in_memory:
-        repo = InMemoryEventsRepository()
-        return lambda: InMemoryUOW(subscriptions, repo)
+        repo = in_memory_repository()
+        if isinstance(repo, InMemoryEventsRepository):
+            # saves a last snapshot
+            shutdown_hooks.append(repo.close)
+            # events loaded from a snapshot
+            event_ids.update(record.id for record in repo.data.values())
+        return lambda: InMemoryUOW(subscriptions, repo, verifier, event_ids)
+    elif settings.SEGMENT_LOG_PATH:
+        log_repo = SegmentLogEventsRepository.from_settings()
+        # flushes the active segment and snapshots the index
+        shutdown_hooks.append(log_repo.close)
+        event_ids.update(record.id for record in log_repo.records.values())
+        return lambda: InMemoryUOW(subscriptions, log_repo, verifier, event_ids)
     else:
         session_maker = set_up_session_maker()
-        return lambda: SqlAlchemyUOW(session_maker, subscriptions)
+        event_ids.update(iter_event_ids(settings.SQLALCHEMY_DATABASE_URI))
+        writer = None
+        if settings.SQL_BATCH_SIZE > 0:
+            writer = BatchWriter.from_settings(session_maker)
+        if settings.TIERED_HOT_WINDOW > 0:
+            hot = HotTier(settings.TIERED_HOT_WINDOW)
+            return lambda: TieredUOW(
+                session_maker, subscriptions, hot, verifier, event_ids, writer
+            )
+        return lambda: SqlAlchemyUOW(
+            session_maker, subscriptions, verifier, event_ids, writer
+        )
@@ -1,8 +1,13 @@
+import asyncio
+import logging
 import uuid
 from typing import Any, Callable, Optional
 
 from pyrelay.nostr.event import NostrDataType
 from pyrelay.nostr.serialize import dumps
+from pyrelay.relay.config import OverflowPolicy, settings
+
+logger = logging.getLogger(__name__)
 
 
 class BaseClientSession:
@@ -21,6 +26,12 @@ class BaseClientSession:
     def on_close(self, func: Callable[[], None]) -> None:
         self._on_close = func
 
+    async def send(self, msg: NostrDataType) -> None:
+        raise NotImplementedError
+
+    async def send_broadcast(self, msg: NostrDataType) -> None:
+        await self.send(msg)
+
     def close(self) -> None:
         if not self._closed:
             self._closed = True
@@ -28,13 +39,94 @@ class BaseClientSession:
 
 
 class ClientSession(BaseClientSession):
-    def __init__(self, websocket) -> None:
+    """
+    Messages are queued and written to the websocket by a writer task per
+    connection, so a slow client never stalls the broadcast.
+    Replies to the client's own requests wait for room in the queue, broadcast
+    events are handled by the overflow policy when it is full
+    """
+
+    def __init__(
+        self,
+        websocket,
+        queue_size: int = settings.OUTBOUND_QUEUE_SIZE,
+        overflow_policy: OverflowPolicy = settings.OUTBOUND_OVERFLOW_POLICY,
+        block_timeout: float = settings.OUTBOUND_BLOCK_TIMEOUT,
+    ) -> None:
         super(ClientSession, self).__init__()
         self.websocket = websocket
         self.uid = uuid.uuid4()
 
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def _start_writer(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write())
+
     async def send(self, msg: NostrDataType) -> None:
+        """
+        Stored events, EOSE, OK and NOTICE, never dropped
+        """
         if self._closed:
             return
 
-        await self.websocket.send(dumps(msg))
+        self._start_writer()
+        await self.queue.put(dumps(msg))
+
+    async def send_broadcast(self, msg: NostrDataType) -> None:
+        """
+        A new event for a subscription, subject to the overflow policy
+        """
+        if self._closed:
+            return
+
+        self._start_writer()
+        data = dumps(msg)
+        if not self.queue.full():
+            self.queue.put_nowait(data)
+            return
+
+        match self.overflow_policy:
+            case OverflowPolicy.DROP_OLDEST:
+                self.queue.get_nowait()
+                self.queue.put_nowait(data)
+                self.dropped += 1
+
+            case OverflowPolicy.DISCONNECT:
+                self.dropped += 1
+                logger.warning("Outbound queue is full conn_uid=%s", self.uid)
+                self.close()
+                asyncio.create_task(self.websocket.close())
+
+            case OverflowPolicy.BLOCK:
+                try:
+                    await asyncio.wait_for(self.queue.put(data), self.block_timeout)
+                except asyncio.TimeoutError:
+                    self.dropped += 1
+
+    async def _write(self) -> None:
+        while True:
+            data = await self.queue.get()
+            try:
+                await self.websocket.send(data)
+            except Exception:
+                logger.info("Failed to send conn_uid=%s", self.uid, exc_info=True)
+                self.close()
+                return
+
+    def close(self) -> None:
+        super(ClientSession, self).close()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+        # wakes up the senders waiting for room, nothing is written anymore
+        while not self.queue.empty():
+            self.queue.get_nowait()
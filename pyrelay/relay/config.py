@@ -1,11 +1,102 @@
+import enum
+import json
 from os import environ
+from typing import Any, Optional
 
-from pydantic import AnyUrl, BaseModel
+from pydantic import AnyUrl, BaseModel, validator
+
+
+class OverflowPolicy(str, enum.Enum):
+    """
+    What to do when a client's outbound queue is full
+    """
+
+    DROP_OLDEST = "drop_oldest"
+    DISCONNECT = "disconnect"
+    BLOCK = "block"
+
+
+class VerifierExecutor(str, enum.Enum):
+    """
+    Where event signatures are verified
+    """
+
+    INLINE = "inline"
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class EvictionPolicy(str, enum.Enum):
+    """
+    Which events a full in-memory repository drops first
+    """
+
+    OLDEST = "oldest"  # smallest created_at
+    LRU = "lru"  # least recently returned by a query
+
+
+class MemoryStore(str, enum.Enum):
+    """
+    Events repository of an in-memory relay
+    """
+
+    INDEXED = "indexed"
+    COLUMNAR = "columnar"  # requires numpy
 
 
 class RelaySettings(BaseModel):
     ASYNC_SQLALCHEMY_DATABASE_URI: AnyUrl = "sqlite+aiosqlite:///data.db"  # type: ignore
     SQLALCHEMY_DATABASE_URI: AnyUrl = "sqlite:///data.db"  # type: ignore
 
+    # Outbound messages per connection
+    OUTBOUND_QUEUE_SIZE: int = 1000
+    OUTBOUND_OVERFLOW_POLICY: OverflowPolicy = OverflowPolicy.DROP_OLDEST
+    OUTBOUND_BLOCK_TIMEOUT: float = 1.0  # seconds, only for the block policy
+
+    # Signature verification
+    VERIFY_EXECUTOR: VerifierExecutor = VerifierExecutor.THREAD
+    VERIFY_WORKERS: Optional[int] = None  # defaults to the executor's default
+    VERIFY_BATCH_SIZE: int = 64
+    VERIFIED_CACHE_SIZE: int = 100_000  # (id, sig) pairs, 0 disables the cache
+
+    # Duplicate events filter, hits are confirmed with a lookup in the repository
+    DUPLICATE_FILTER_CAPACITY: int = 1_000_000
+    DUPLICATE_FILTER_ERROR_RATE: float = 0.01
+
+    # In-memory events repository, 0 means unbounded
+    MEMORY_STORE: MemoryStore = MemoryStore.INDEXED  # bounds apply to indexed only
+    MEMORY_MAX_EVENTS: int = 0
+    MEMORY_MAX_BYTES: int = 0  # approximate, see InMemoryEventsRepository
+    MEMORY_EVICTION_POLICY: EvictionPolicy = EvictionPolicy.OLDEST
+    MEMORY_KIND_QUOTAS: dict[int, int] = {}  # max events per kind, json in environ
+    MEMORY_SNAPSHOT_PATH: Optional[str] = None  # loaded on start, indexed only
+    MEMORY_SNAPSHOT_INTERVAL: float = 300.0  # seconds, 0 disables periodic saves
+
+    # Sql write batching, each event is committed on its own when the size is 0
+    SQL_BATCH_SIZE: int = 0  # max events per transaction
+    SQL_BATCH_DELAY: float = 0.005  # seconds from a batch's first event to writing
+    SQL_BATCH_QUEUE_SIZE: int = 10_000  # events waiting to be written
+
+    # Sqlite connections, in WAL mode a single connection writes while the readers
+    # serve queries
+    SQLITE_READERS: int = 4  # read-only connections, 0 reads on the writer too
+    SQLITE_MMAP_SIZE: int = 256 * 2**20  # bytes of the database file memory mapped
+    SQLITE_CACHE_SIZE: int = -64_000  # pages per connection, negative is in KiB
+    SQLITE_BUSY_TIMEOUT: float = 5.0  # seconds to wait for a lock of another process
+
+    # Seconds of recent events also kept in memory with sql, 0 disables
+    TIERED_HOT_WINDOW: float = 0
+
+    # Segment log events repository, used instead of sql when a path is set
+    SEGMENT_LOG_PATH: Optional[str] = None
+    SEGMENT_LOG_SEGMENT_SIZE: int = 64 * 2**20  # bytes
+    SEGMENT_LOG_FSYNC: bool = False  # fsync every saved event, else only flush
+    SEGMENT_LOG_COMPACT_INTERVAL: float = 60.0  # seconds, 0 disables compaction
+    SEGMENT_LOG_COMPACT_RATIO: float = 0.5  # deleted fraction to compact a segment
+
+    @validator("MEMORY_KIND_QUOTAS", pre=True)
+    def parse_json(cls, value: Any) -> Any:
+        return json.loads(value) if isinstance(value, str) else value
+
 
 settings = RelaySettings.parse_obj(environ)
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Collection, Optional, TypeAlias
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from pyrelay.nostr.event import EventId, NostrEvent
+from pyrelay.relay.config import settings
+from pyrelay.relay.db.session import use_writer
+from pyrelay.relay.db.tables import event as event_table
+from pyrelay.relay.db.tables import tag as tag_table
+from pyrelay.relay.relay_service import DuplicateEventError
+
+logger = logging.getLogger(__name__)
+
+# an event to save, or the ids of the events to mark deleted
+Change: TypeAlias = NostrEvent | frozenset[EventId]
+Pending = tuple[Change, asyncio.Future]
+
+
+class BatchWriter:
+    """
+    Saves events in batches, each in a single transaction, instead of a commit
+    per event.
+    A batch is written once it has `max_batch` events or `max_delay` seconds
+    after its first event, `write` returns only after the batch commits.
+    At most `max_pending` events wait, further writers wait for room.
+    Deletes go through the batches too, in order with the saved events, so
+    only the writer's connection ever writes
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        max_batch: int = 500,
+        max_delay: float = 0.005,
+        max_pending: int = 10_000,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue[Pending] = asyncio.Queue(max_pending)
+        self._flusher: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.written = 0
+
+    @classmethod
+    def from_settings(cls, session_factory: sessionmaker) -> "BatchWriter":
+        return cls(
+            session_factory,
+            settings.SQL_BATCH_SIZE,
+            settings.SQL_BATCH_DELAY,
+            settings.SQL_BATCH_QUEUE_SIZE,
+        )
+
+    async def write(self, event: NostrEvent) -> None:
+        """
+        Saves the event with the next batch, raises if the batch failed or
+        `DuplicateEventError` if the event was already saved
+        """
+        await self._submit(event)
+
+    async def delete(self, event_ids: Collection[EventId]) -> None:
+        """
+        Marks the events deleted with the next batch, raises if the batch failed
+        """
+        await self._submit(frozenset(event_ids))
+
+    async def _submit(self, change: Change) -> None:
+        if self._flusher is None:
+            # started lazily, there is no running loop on creation
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((change, future))
+        await future
+
+    def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+    async def _flush_forever(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                existing = await self._apply([change for change, _ in batch])
+            except Exception as e:
+                logger.exception("Failed writing batch of events size=%s", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self._resolve(batch, existing)
+
+    @staticmethod
+    def _resolve(batch: list[Pending], existing: set[EventId]) -> None:
+        """
+        Completes the writes of a committed batch, the events saved before it,
+        or earlier in it, are rejected as duplicates
+        """
+        seen = set(existing)
+        for change, future in batch:
+            if future.done():
+                continue
+
+            if isinstance(change, NostrEvent):
+                if change.id in seen:
+                    future.set_exception(DuplicateEventError(change.id))
+                    continue
+                seen.add(change.id)
+
+            future.set_result(None)
+
+    async def _next_batch(self) -> list[Pending]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _apply(self, changes: list[Change]) -> set[EventId]:
+        """
+        Writes the changes in one transaction, returns the ids of the events
+        which were saved before their insert
+        """
+        existing: set[EventId] = set()
+        written = deleted = 0
+        async with self.session_factory() as session:
+            use_writer(session)
+            async with session.begin():
+                events: list[NostrEvent] = []
+                for change in changes:
+                    if isinstance(change, NostrEvent):
+                        events.append(change)
+                        continue
+
+                    # the events before the delete are saved first
+                    written += await self._insert(session, events, existing)
+                    events = []
+                    await session.execute(
+                        update(event_table)
+                        .where(event_table.c.id.in_(change))
+                        .values(deleted_at=datetime.now(timezone.utc))
+                    )
+                    deleted += 1
+
+                written += await self._insert(session, events, existing)
+
+        if not written and not deleted:
+            return existing
+
+        self.batches += 1
+        self.written += written
+        logger.debug("Wrote batch of events size=%s deletes=%s", written, deleted)
+        return existing
+
+    @staticmethod
+    async def _insert(
+        session: AsyncSession, events: list[NostrEvent], existing: set[EventId]
+    ) -> int:
+        # the same event may be published twice before the first one is saved
+        unique = {event.id: event for event in events}
+        if not unique:
+            return 0
+
+        query = select(event_table.c.id).where(event_table.c.id.in_(unique.keys()))
+        for event_id in (await session.execute(query)).scalars():
+            del unique[event_id]
+            existing.add(event_id)
+
+        if not unique:
+            return 0
+
+        await session.execute(
+            insert(event_table),
+            [
+                dict(
+                    id=event.id,
+                    pubkey=event.pubkey,
+                    kind=event.kind,
+                    created_at=event.created_at,
+                    content=event.content,
+                    sig=event.sig,
+                    raw=event.json,
+                )
+                for event in unique.values()
+            ],
+        )
+        tags = [
+            dict(event_id=event.id, type=tag.type, key=tag.key, extra=tag.extra)
+            for event in unique.values()
+            for tag in event.tags
+        ]
+        if tags:
+            await session.execute(insert(tag_table), tags)
+
+        return len(unique)
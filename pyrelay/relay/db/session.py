@@ -1,9 +1,18 @@
 import os
+from typing import Any, Iterator, Optional
 
 from alembic import command
 from alembic.config import Config
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+from pyrelay.nostr.event import EventId
+from pyrelay.relay.config import settings
+from pyrelay.relay.db.tables import event as event_table
 
 CURRENT_FILE = os.path.dirname(os.path.realpath(__file__))
 
@@ -15,15 +24,107 @@ def upgrade(uri: str) -> None:
     command.upgrade(alembic_cfg, "head")
 
 
+def is_sqlite(uri: str) -> bool:
+    return make_url(uri).get_backend_name() == "sqlite"
+
+
 def start_engine(uri: str) -> AsyncEngine:
-    return create_async_engine(uri, pool_pre_ping=True)
+    if not is_sqlite(uri):
+        return create_async_engine(uri, pool_pre_ping=True)
+
+    # sqlite allows a single writer at a time, writes queue for this connection
+    # instead of for the database lock
+    engine = create_async_engine(
+        uri, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+    )
+    _set_pragmas(engine, journal_mode="WAL", synchronous="NORMAL")
+    return engine
+
+
+def start_reader_engine(uri: str) -> Optional[AsyncEngine]:
+    """
+    Pool of read-only connections for queries, reading alongside the writer in
+    WAL mode. None when the database isn't sqlite or readers are disabled
+    """
+    if not is_sqlite(uri) or settings.SQLITE_READERS <= 0:
+        return None
+
+    engine = create_async_engine(
+        uri,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.SQLITE_READERS,
+        max_overflow=0,
+    )
+    _set_pragmas(engine, query_only="ON")
+    return engine
+
+
+def _set_pragmas(engine: AsyncEngine, **pragmas: str) -> None:
+    pragmas = dict(
+        pragmas,
+        mmap_size=str(settings.SQLITE_MMAP_SIZE),
+        cache_size=str(settings.SQLITE_CACHE_SIZE),
+        temp_store="MEMORY",
+        busy_timeout=str(int(settings.SQLITE_BUSY_TIMEOUT * 1000)),
+    )
 
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class RoutingSession(Session):
+    """
+    Reads on the reader pool and writes on the writer.
+    Once a session wrote its reads go to the writer too, to see its own changes
+    """
+
+    def __init__(self, reader: Engine, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.reader = reader
+        self.writing = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):  # type: ignore
+        if self.writing or self._flushing or isinstance(clause, UpdateBase):
+            self.writing = True
+            return super().get_bind(mapper, clause, **kwargs)
+
+        return self.reader
+
+
+def use_writer(session: AsyncSession) -> None:
+    """
+    Reads of the session go to the writer from now on, for the reads of a write
+    transaction that mustn't wait for a reader while holding the writer
+    """
+    if isinstance(session.sync_session, RoutingSession):
+        session.sync_session.writing = True
+
+
+def start_session(
+    engine: AsyncEngine, reader: Optional[AsyncEngine] = None
+) -> sessionmaker:
+    routing: dict[str, Any] = {}
+    if reader is not None:
+        routing = dict(sync_session_class=RoutingSession, reader=reader.sync_engine)
 
-def start_session(engine: AsyncEngine) -> sessionmaker:
     return sessionmaker(
         expire_on_commit=False,
         autocommit=False,
         autoflush=False,
         bind=engine,
         class_=AsyncSession,
+        **routing,
     )
+
+
+def iter_event_ids(uri: str) -> Iterator[EventId]:
+    engine = create_engine(uri)
+    try:
+        with engine.connect() as connection:
+            yield from connection.execute(select(event_table.c.id)).scalars()
+    finally:
+        engine.dispose()
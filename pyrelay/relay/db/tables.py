@@ -3,10 +3,12 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     PickleType,
     String,
     Table,
+    text,
 )
 from sqlalchemy.orm import registry, relationship
 
@@ -18,23 +20,34 @@ event = Table(
     "event",
     mapper_registry.metadata,
     Column("db_id", Integer, primary_key=True, autoincrement=True),
-    Column("id", String),
-    Column("pubkey", String, nullable=False, index=True),
-    Column("kind", Enum(EventKind), nullable=False, index=True),
-    Column("created_at", Integer, index=True),
+    Column("id", String, unique=True, index=True),
+    Column("pubkey", String, nullable=False),
+    Column("kind", Enum(EventKind), nullable=False),
+    Column("created_at", Integer),
     Column("content", String, nullable=False),
     Column("sig", String, nullable=False),
     Column("deleted_at", DateTime, nullable=True),
+    # the event json sent to clients, replayed without loading the event
+    Column("raw", String, nullable=True),
+    Index("ix_event_pubkey_created_at", "pubkey", "created_at"),
+    Index("ix_event_kind_created_at", "kind", "created_at"),
+    Index(
+        "ix_event_created_at_not_deleted",
+        "created_at",
+        sqlite_where=text("deleted_at IS NULL"),
+        postgresql_where=text("deleted_at IS NULL"),
+    ),
 )
 
 tag = Table(
     "tag",
     mapper_registry.metadata,
     Column("id", Integer, primary_key=True),
-    Column("event_id", String, ForeignKey("event.id")),
+    Column("event_id", String, ForeignKey("event.id"), index=True),
     Column("type", String),
     Column("key", String),
     Column("extra", PickleType),
+    Index("ix_tag_type_key_event_id", "type", "key", "event_id"),
 )
 
 
@@ -0,0 +1,164 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, TypeAlias
+
+from pyrelay.nostr.event import NostrEvent, Validity, serialize_event_data, validate
+from pyrelay.relay.config import VerifierExecutor, settings
+
+# Picklable event data needed for validation:
+# id, pubkey, created_at, kind, tags, content, sig
+VerifyRequest: TypeAlias = tuple[str, str, int, int, list, str, str]
+
+# The validity and the canonical serialization of the event
+VerifyResult: TypeAlias = tuple[Validity, bytes]
+
+
+def _verify_request(event: NostrEvent) -> VerifyRequest:
+    return (
+        event.id,
+        event.pubkey,
+        event.created_at,
+        int(event.kind),
+        [tag.serialize() for tag in event.tags],
+        event.content,
+        event.sig,
+    )
+
+
+def _verify_batch(requests: list[VerifyRequest]) -> list[VerifyResult]:
+    """
+    Runs inside the executor workers
+    """
+    results: list[VerifyResult] = []
+    for event_id, pubkey, created_at, kind, tags, content, sig in requests:
+        canonical = b""
+        try:
+            canonical = serialize_event_data(pubkey, created_at, kind, tags, content)
+            validity = validate(canonical, event_id, pubkey, sig)
+        except Exception:
+            # a malformed event fails alone, not the other events of its batch
+            validity = Validity.BAD_SIGNATURE
+
+        results.append((validity, canonical))
+
+    return results
+
+
+class VerifiedEventsCache:
+    """
+    Bounded LRU of the (id, sig) pairs of events that were already verified
+    and saved, so copies of the same event skip the crypto work
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[tuple[str, str], None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, event: NostrEvent) -> bool:
+        key = (event.id, event.sig)
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    def add(self, event: NostrEvent) -> None:
+        if self.max_size <= 0:
+            return
+
+        self._data[(event.id, event.sig)] = None
+        self._data.move_to_end((event.id, event.sig))
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+class EventVerifier:
+    """
+    Validates events outside the event loop.
+    Events waiting for validation in the same loop iteration are sent to
+    the executor in batches, one round trip per batch.
+    Without an executor the validation runs inline
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        batch_size: int = 64,
+        cache_size: int = 0,
+    ) -> None:
+        self.executor = executor
+        self.batch_size = batch_size
+        self.verified = VerifiedEventsCache(cache_size)
+        self._pending: list[tuple[VerifyRequest, asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._batches: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls) -> "EventVerifier":
+        executor: Optional[Executor]
+        match settings.VERIFY_EXECUTOR:
+            case VerifierExecutor.THREAD:
+                executor = ThreadPoolExecutor(settings.VERIFY_WORKERS)
+            case VerifierExecutor.PROCESS:
+                executor = ProcessPoolExecutor(settings.VERIFY_WORKERS)
+            case _:
+                executor = None
+
+        return cls(executor, settings.VERIFY_BATCH_SIZE, settings.VERIFIED_CACHE_SIZE)
+
+    async def verify(self, event: NostrEvent) -> bool:
+        return await self.validate(event) is Validity.VALID
+
+    async def validate(self, event: NostrEvent) -> Validity:
+        """
+        On return the canonical serialization is attached to the event
+        """
+        if self.executor is None:
+            return event.validate()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((_verify_request(event), future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+
+        validity, canonical = await future
+        event.__dict__["canonical"] = canonical
+        return validity
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.batch_size):
+            end = start + self.batch_size
+            task = asyncio.create_task(self._run(pending[start:end]))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: list[tuple[VerifyRequest, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        requests = [request for request, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, _verify_batch, requests)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,8 +1,8 @@
-from pyrelay.nostr.event import EventKind, NostrEvent
+from pyrelay.nostr.event import EventKind, NostrEvent, Validity
 from pyrelay.nostr.msgs import NostrCommandResults
 from pyrelay.relay.client_session import ClientSession
 from pyrelay.relay.nip_config import nips_config
-from pyrelay.relay.relay_service import EventsRepository
+from pyrelay.relay.relay_service import DuplicateEventError, EventsRepository
 from pyrelay.relay.unit_of_work import UnitOfWork
 
 
@@ -10,30 +10,53 @@ async def send_event(uow: UnitOfWork, client: ClientSession, event: NostrEvent)
     """
     NIP-01
     NIP-09 event deletion todo: test + support reference events
-    NIP-20 command results
+    NIP-20 command results, sent once the event is committed like the broadcast
     """
-    async with uow:
-        msg = await _save_event(uow.events, event)
+    try:
+        async with uow:
+            msg = await _save_event(uow, event)
+    except DuplicateEventError:
+        # published concurrently, the other publish saved it, this one is undone
+        msg = _duplicate(event)
+
+    is_new = msg.saved and msg.reason != "duplicate"
+    if is_new:
+        # only once committed, an event that wasn't saved must not be taken
+        # for a duplicate when it is sent again
+        uow.verifier.verified.add(event)
+        uow.event_ids.add(event.id)
+
+    if nips_config.nip_20:
+        await client.send(msg)
 
-        if nips_config.nip_20:
-            await client.send(msg)
+    if is_new:
+        await uow.subscriptions.broadcast(event)
 
-        if msg.saved:
-            await uow.subscriptions.broadcast(event)
 
+async def _save_event(uow: UnitOfWork, event: NostrEvent) -> NostrCommandResults:
+    if await _is_duplicate(uow, event):
+        return _duplicate(event)
 
-async def _save_event(repo: EventsRepository, event: NostrEvent) -> NostrCommandResults:
-    if not event.verify():
+    if event in uow.verifier.verified:
+        # the (id, sig) pair was verified before, only the signature work is
+        # skipped, the content must still hash to the id
+        valid_id = event.calc_id() == event.id
+        validity = Validity.VALID if valid_id else Validity.ID_MISMATCH
+    else:
+        validity = await uow.verifier.validate(event)
+
+    if validity is not Validity.VALID:
         return NostrCommandResults(
-            event_id=event.id, saved=False, message="invalid: signature is wrong"
+            event_id=event.id, saved=False, message=f"invalid: {validity.value}"
         )
 
     if nips_config.nip_9 and event.kind == EventKind.EventDeletion:  # type: ignore
-        await _handle_delete_event(repo, event)
+        await _handle_delete_event(uow.events, event)
 
     try:
-        # todo: add duplicate validation
-        await repo.add(event)
+        await uow.events.add(event)
+    except DuplicateEventError:
+        raise
     except Exception:
         return NostrCommandResults(
             event_id=event.id, saved=False, message="error: failed to add event"
@@ -42,6 +65,20 @@ async def _save_event(repo: EventsRepository, event: NostrEvent) -> NostrCommand
         return NostrCommandResults(event_id=event.id, saved=True)
 
 
+async def _is_duplicate(uow: UnitOfWork, event: NostrEvent) -> bool:
+    """
+    Checked before any verification, the ids filter can only have false
+    positives so a hit is confirmed with the repository
+    """
+    return event.id in uow.event_ids and await uow.events.exists(event.id)
+
+
+def _duplicate(event: NostrEvent) -> NostrCommandResults:
+    return NostrCommandResults(
+        event_id=event.id, saved=True, message="duplicate: already have this event"
+    )
+
+
 async def _handle_delete_event(repo: EventsRepository, event: NostrEvent):
     keys_to_delete = event.e_tags
     await repo.delete(keys_to_delete)
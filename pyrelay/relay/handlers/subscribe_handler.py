@@ -1,7 +1,6 @@
-from typing import Collection
+from typing import AsyncIterable
 
-from pyrelay.nostr.event import NostrEvent
-from pyrelay.nostr.msgs import NostrEOSE, NostrEventUpdate, NostrRequest
+from pyrelay.nostr.msgs import NostrEOSE, NostrRawEventUpdate, NostrRequest
 from pyrelay.relay.client_session import ClientSession
 from pyrelay.relay.nip_config import nips_config
 from pyrelay.relay.unit_of_work import UnitOfWork
@@ -11,7 +10,7 @@ async def subscribe(
     uow: UnitOfWork, client: ClientSession, request: NostrRequest
 ) -> None:
     async with uow:
-        events = await uow.events.query(*request.filters)
+        events = uow.events.stream_json(*request.filters)
         await _send_stored_events(client, request.subscription_id, events)
 
         uow.subscriptions.subscribe(request, client)
@@ -20,14 +19,16 @@ async def subscribe(
 async def _send_stored_events(
     client: ClientSession,
     subscription_id: str,
-    events: Collection[NostrEvent],
+    events: AsyncIterable[str],
 ) -> None:
-    if not events:
-        return
-
-    for event in events:
-        event_update = NostrEventUpdate(subscription_id=subscription_id, event=event)
+    sent = False
+    async for event_json in events:
+        event_update = NostrRawEventUpdate(subscription_id, event_json)
         await client.send(event_update)
+        sent = True
+
+    if not sent:
+        return
 
     if nips_config.nip_15:
         endmsg = NostrEOSE(subscription_id)
@@ -1,12 +1,13 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from collections import UserDict
-from typing import Collection
+from collections import UserDict, defaultdict
+from typing import AsyncIterator, Collection, Hashable, Iterator, Optional
 
 import attr
 
 from pyrelay.nostr.event import EventId, NostrEvent
-from pyrelay.nostr.filters import NostrFilter, apply_many
+from pyrelay.nostr.filters import HEX32_LENGTH, FilterMatcher, NostrFilter, match_many
 from pyrelay.nostr.msgs import NostrEventUpdate, NostrRequest
 from pyrelay.relay.client_session import ClientSession
 
@@ -14,6 +15,12 @@ logging.basicConfig(format="%(name)s - %(levelname)s - %(message)s", level=loggi
 logger = logging.getLogger("RELAY")
 
 
+class DuplicateEventError(Exception):
+    """
+    Raised by `add` when the event was saved concurrently, after `exists`
+    """
+
+
 class EventsRepository(ABC):
     @abstractmethod
     async def add(self, event: NostrEvent) -> None:
@@ -27,6 +34,27 @@ class EventsRepository(ABC):
         Fetch stored events that match one of the filters
         """
 
+    async def stream(self, *filters: NostrFilter) -> AsyncIterator[NostrEvent]:
+        """
+        Stored events that match one of the filters, in the order of `query`,
+        produced as they are read instead of all at once
+        """
+        for event in await self.query(*filters):
+            yield event
+
+    async def stream_json(self, *filters: NostrFilter) -> AsyncIterator[str]:
+        """
+        The json of the events of `stream`, as sent to clients
+        """
+        async for event in self.stream(*filters):
+            yield event.json
+
+    @abstractmethod
+    async def exists(self, event_id: EventId) -> bool:
+        """
+        Whether an event with this id was already saved
+        """
+
     async def delete(self, event_ids: Collection[EventId]) -> None:
         """
         Mark event ids as deleted
@@ -41,16 +69,124 @@ class Subscription:
 
     request: NostrRequest
     client_session: ClientSession
+    matchers: tuple[FilterMatcher, ...] = attr.ib(init=False, eq=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.matchers = tuple(_filter.compile() for _filter in self.request.filters)
 
     async def update(self, event: NostrEvent) -> None:
-        if apply_many(event, *self.request.filters):
+        if match_many(event, *self.matchers):
             update = NostrEventUpdate(
                 subscription_id=self.request.subscription_id, event=event
             )
-            await self.client_session.send(update)
+            await self.client_session.send_broadcast(update)
+
+
+def _is_exact(values: list[str]) -> bool:
+    return all(len(value) == HEX32_LENGTH for value in values)
+
+
+def _filter_keys(_filter: NostrFilter) -> Optional[list[Hashable]]:
+    """
+    The index keys that an event must hit for the filter to possibly match,
+    picked from the most selective attribute of the filter.
+    None means the filter can't be indexed and should be checked on every event
+    """
+    if _filter.ids and _is_exact(_filter.ids):
+        return [("id", event_id) for event_id in _filter.ids]
+
+    if _filter.authors and _is_exact(_filter.authors):
+        return [("author", author) for author in _filter.authors]
+
+    if _filter.generic_tags:
+        tag_type, values = min(
+            _filter.generic_tags.items(), key=lambda item: len(item[1])
+        )
+        return [("tag", tag_type, value) for value in values]
+
+    if _filter.kinds:
+        return [("kind", kind) for kind in _filter.kinds]
+
+    return None
+
+
+def _event_keys(event: NostrEvent) -> Iterator[Hashable]:
+    yield "id", event.id
+    yield "author", event.pubkey
+    yield "kind", event.kind
+    for tag_type, keys in event.tags_index.items():
+        for key in keys:
+            yield "tag", tag_type, key
+
+
+class SubscriptionIndex:
+    """
+    Inverted index from event attributes (id, author, kind and tags) to the
+    subscriptions that might be interested in them, so broadcasting an event
+    only evaluates the filters of candidate subscriptions
+    """
+
+    def __init__(self) -> None:
+        self._index: defaultdict[Hashable, set[str]] = defaultdict(set)
+        self._match_all: set[str] = set()
+        self._keys: dict[str, list[Hashable]] = {}
+
+    def add(self, subscription_id: str, request: NostrRequest) -> None:
+        keys: list[Hashable] = []
+        for _filter in request.filters:
+            filter_keys = _filter_keys(_filter)
+            if filter_keys is None:
+                self._match_all.add(subscription_id)
+                return
+
+            keys.extend(filter_keys)
+
+        if not keys:
+            # no filters at all, matches everything
+            self._match_all.add(subscription_id)
+            return
+
+        for key in keys:
+            self._index[key].add(subscription_id)
+        self._keys[subscription_id] = keys
+
+    def remove(self, subscription_id: str) -> None:
+        self._match_all.discard(subscription_id)
+        for key in self._keys.pop(subscription_id, []):
+            subscription_ids = self._index.get(key)
+            if subscription_ids is None:
+                continue
+
+            subscription_ids.discard(subscription_id)
+            if not subscription_ids:
+                del self._index[key]
+
+    def candidates(self, event: NostrEvent) -> set[str]:
+        candidates = set(self._match_all)
+        for key in _event_keys(event):
+            subscription_ids = self._index.get(key)
+            if subscription_ids:
+                candidates |= subscription_ids
+
+        return candidates
 
 
 class Subscriptions(UserDict[str, Subscription]):
+    def __init__(self) -> None:
+        self.index = SubscriptionIndex()
+        super(Subscriptions, self).__init__()
+
+    def __setitem__(self, subscription_id: str, subscription: Subscription) -> None:
+        if subscription_id in self.data:
+            self.index.remove(subscription_id)
+
+        super(Subscriptions, self).__setitem__(subscription_id, subscription)
+        self.index.add(subscription_id, subscription.request)
+
+    def __delitem__(self, subscription_id: str) -> None:
+        super(Subscriptions, self).__delitem__(subscription_id)
+        self.index.remove(subscription_id)
+
     def subscribe(self, request: NostrRequest, client: ClientSession) -> None:
         self[request.subscription_id] = Subscription(request, client)
         client.on_close = lambda: self.pop(request.subscription_id, None)
@@ -64,5 +200,10 @@ class Subscriptions(UserDict[str, Subscription]):
             )
 
     async def broadcast(self, event: NostrEvent) -> None:
-        for subscription in self.values():
-            await subscription.update(event)
+        subscriptions = [
+            self.data[subscription_id]
+            for subscription_id in self.index.candidates(event)
+        ]
+        await asyncio.gather(
+            *(subscription.update(event) for subscription in subscriptions)
+        )
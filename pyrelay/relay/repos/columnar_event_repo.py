@@ -0,0 +1,149 @@
+from typing import Collection, Optional
+
+import numpy as np
+
+from pyrelay.nostr.event import EventId, NostrEvent, PubKey
+from pyrelay.nostr.filters import FilterMatcher, NostrFilter, PrefixSet
+from pyrelay.relay.relay_service import EventsRepository
+from pyrelay.relay.repos.compact_event import CompactEvent, RawEventId, raw_event_id
+
+
+class ColumnarEventsRepository(EventsRepository):
+    """
+    Events kept as numpy columns of created_at, kind and author number, with the
+    events themselves as `CompactEvent` in a list by row.
+    A filter's time range, kinds and authors are evaluated as vectorized masks
+    over all rows, only the surviving rows are checked for the rest of the
+    filter and built into events.
+    Requires numpy, which is an optional dependency
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.created_at = np.zeros(capacity, dtype=np.int64)
+        self.kind = np.zeros(capacity, dtype=np.int64)
+        self.author = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # deleted rows are masked out by `alive` and never reused
+        self.records: list[Optional[CompactEvent]] = []
+        self.rows: dict[RawEventId, int] = {}
+        self.authors: dict[PubKey, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    async def delete(self, event_ids: Collection[EventId]) -> None:
+        for event_id in event_ids:
+            row = self.rows.pop(raw_event_id(event_id), None)  # type: ignore
+            if row is not None:
+                self.alive[row] = False
+                self.records[row] = None
+
+    async def exists(self, event_id: EventId) -> bool:
+        return raw_event_id(event_id) in self.rows
+
+    async def add(self, event: NostrEvent) -> None:
+        record = CompactEvent.of(event)
+        if record.raw_id in self.rows:
+            return
+
+        row = len(self.records)
+        if row == len(self.alive):
+            self._grow()
+
+        self.created_at[row] = record.created_at
+        self.kind[row] = record.kind
+        self.author[row] = self.authors.setdefault(record.pubkey, len(self.authors))
+        self.alive[row] = True
+        self.records.append(record)
+        self.rows[record.raw_id] = row
+
+    def _grow(self) -> None:
+        for name in ("created_at", "kind", "author", "alive"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)]))
+
+    async def query(self, *filters: NostrFilter) -> Collection[NostrEvent]:
+        if not filters:
+            return [record.to_event() for record in self.records if record]
+
+        rows = np.unique(np.concatenate([self._match(_filter) for _filter in filters]))
+        # rows are in insertion order, which breaks created_at ties
+        rows = rows[np.argsort(self.created_at[rows], kind="stable")]
+        return [self.records[row].to_event() for row in rows.tolist()]  # type: ignore
+
+    def _match(self, _filter: NostrFilter) -> np.ndarray:
+        """
+        Rows matching the filter, oldest first and up to its limit
+        """
+        matcher = _filter.compile()
+        size = len(self.records)
+        created_at = self.created_at[:size]
+
+        mask = self.alive[:size].copy()
+        if matcher.since is not None:
+            mask &= created_at >= matcher.since
+        if matcher.until is not None:
+            mask &= created_at < matcher.until
+        if matcher.kinds is not None:
+            kinds = np.fromiter(matcher.kinds, dtype=np.int64)
+            mask &= np.isin(self.kind[:size], kinds)
+        if matcher.authors is not None:
+            authors = np.fromiter(self._authors(matcher.authors), dtype=np.int32)
+            mask &= np.isin(self.author[:size], authors)
+        if matcher.ids is not None and not matcher.ids.prefixes:
+            mask &= self._rows_mask(matcher.ids.exact, size)
+
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(created_at[rows], kind="stable")]
+        if _needs_records(matcher):
+            return self._check_records(rows, matcher, _filter.limit)
+
+        if _filter.limit:
+            start = max(rows.size - _filter.limit, 0)
+            rows = rows[start:]
+
+        return rows
+
+    def _authors(self, authors: PrefixSet) -> list[int]:
+        numbers = [
+            self.authors[pubkey] for pubkey in authors.exact & self.authors.keys()
+        ]
+        if authors.prefixes:
+            numbers.extend(
+                number
+                for pubkey, number in self.authors.items()
+                if pubkey not in authors.exact and authors.match(pubkey)
+            )
+
+        return numbers
+
+    def _rows_mask(self, event_ids: frozenset[EventId], size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        for event_id in event_ids:
+            row = self.rows.get(raw_event_id(event_id))  # type: ignore
+            if row is not None:
+                mask[row] = True
+
+        return mask
+
+    def _check_records(
+        self, rows: np.ndarray, matcher: FilterMatcher, limit: Optional[int]
+    ) -> np.ndarray:
+        matched = []
+        for row in rows[::-1]:
+            if matcher.match(self.records[row]):  # type: ignore
+                matched.append(row)
+                if len(matched) == limit:
+                    break
+
+        return np.array(matched[::-1], dtype=np.int64)
+
+
+def _needs_records(matcher: FilterMatcher) -> bool:
+    """
+    Whether the filter has conditions that can't be evaluated on the columns
+    """
+    return bool(matcher.generic_tags) or (
+        matcher.ids is not None and bool(matcher.ids.prefixes)
+    )
@@ -0,0 +1,95 @@
+import sys
+from typing import Any, Mapping, Optional
+
+import attr
+
+from pyrelay.nostr.event import EventId, EventKind, NostrEvent, NostrTag, PubKey
+
+RawEventId = bytes
+
+
+def raw_event_id(event_id: EventId) -> Optional[RawEventId]:
+    """
+    The 32 bytes of a hex event id, None if it can't be the id of a stored event
+    """
+    try:
+        raw = bytes.fromhex(event_id)
+    except ValueError:
+        return None
+
+    return raw if raw.hex() == event_id else None
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class EventKeys:
+    """
+    What filters and `EventIndex` look at in a stored event
+    """
+
+    raw_id: RawEventId
+    pubkey: PubKey
+    created_at: int
+    kind: EventKind
+    tags: tuple[tuple[str, ...], ...]  # serialized tags
+
+    @staticmethod
+    def fields_of(event: NostrEvent) -> dict[str, Any]:
+        return dict(
+            raw_id=bytes.fromhex(event.id),
+            pubkey=sys.intern(event.pubkey),
+            created_at=event.created_at,
+            kind=event.kind,
+            tags=tuple(
+                tuple(sys.intern(value) for value in tag.serialize())  # type: ignore
+                for tag in event.tags
+            ),
+        )
+
+    @property
+    def id(self) -> EventId:
+        return self.raw_id.hex()
+
+    @property
+    def tags_index(self) -> Mapping[str, frozenset[str]]:
+        index: dict[str, set[str]] = {}
+        for tag_type, key, *_ in self.tags:
+            index.setdefault(tag_type, set()).add(key)
+
+        return {tag_type: frozenset(keys) for tag_type, keys in index.items()}
+
+    def get_tags_keys(self, tag_type: str) -> frozenset[str]:
+        return frozenset(tag[1] for tag in self.tags if tag[0] == tag_type)
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class CompactEvent(EventKeys):
+    """
+    Stored form of a NostrEvent, about a third of its size: no instance dict,
+    raw bytes for the id and signature, interned pubkey and tag strings and
+    tuples instead of lists.
+    Has what filters match on, the NostrEvent is built only when returned
+    """
+
+    content: str
+    raw_sig: bytes
+
+    @classmethod
+    def of(cls, event: NostrEvent) -> "CompactEvent":
+        return cls(
+            **cls.fields_of(event),
+            content=event.content,
+            raw_sig=bytes.fromhex(event.sig),
+        )
+
+    def to_event(self) -> NostrEvent:
+        return NostrEvent(
+            id=self.id,
+            pubkey=self.pubkey,
+            created_at=self.created_at,
+            kind=self.kind,
+            tags=[
+                NostrTag(tag_type, key, extra) for tag_type, key, *extra in self.tags
+            ],
+            content=self.content,
+            sig=self.raw_sig.hex(),
+        )
@@ -0,0 +1,232 @@
+import heapq
+import itertools
+from bisect import bisect_left, insort
+from typing import Hashable, Iterable, Iterator, Mapping, Optional, TypeAlias
+
+from pyrelay.nostr.event import PubKey
+from pyrelay.nostr.filters import NostrFilter, PrefixSet
+from pyrelay.relay.repos.compact_event import EventKeys, RawEventId, raw_event_id
+
+# created_at, insertion sequence (breaks created_at ties), raw event id
+IndexEntry: TypeAlias = tuple[int, int, RawEventId]
+Bucket: TypeAlias = list[IndexEntry]
+
+
+def _next_prefix(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _time_range(
+    bucket: Bucket, since: Optional[int], until: Optional[int], newest_first: bool
+) -> Iterable[IndexEntry]:
+    start = bisect_left(bucket, (since,)) if since else 0
+    end = bisect_left(bucket, (until,)) if until else len(bucket)
+    if not newest_first:
+        return bucket[start:end]
+
+    # walked lazily, a limited query usually stops after a few entries
+    return (bucket[i] for i in range(end - 1, start - 1, -1))
+
+
+class EventIndex:
+    """
+    Secondary indexes over stored events by pubkey, kind and (tag type, tag key).
+    Every bucket, like the timeline of all events, is a list of entries sorted
+    by created_at so time ranges are found with bisect.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[RawEventId, IndexEntry] = {}
+        self.timeline: Bucket = []
+        self.by_pubkey: dict[PubKey, Bucket] = {}
+        self.by_kind: dict[int, Bucket] = {}
+        self.by_tag: dict[tuple[str, str], Bucket] = {}
+        # sorted distinct pubkeys, for author prefixes
+        self.pubkeys: list[PubKey] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _buckets(self, event: EventKeys) -> Iterator[Bucket]:
+        yield self.timeline
+
+        if event.pubkey not in self.by_pubkey:
+            insort(self.pubkeys, event.pubkey)
+        yield self.by_pubkey.setdefault(event.pubkey, [])
+
+        yield self.by_kind.setdefault(event.kind, [])
+        for tag_type, keys in event.tags_index.items():
+            for key in keys:
+                yield self.by_tag.setdefault((tag_type, key), [])
+
+    def add(self, event: EventKeys) -> None:
+        if event.raw_id in self.entries:
+            return
+
+        entry = (event.created_at, next(self._sequence), event.raw_id)
+        self.entries[event.raw_id] = entry
+        for bucket in self._buckets(event):
+            insort(bucket, entry)
+
+    def extend(self, events: Iterable[EventKeys]) -> None:
+        """
+        Adds many events at once, appending to the buckets and sorting them
+        afterwards instead of inserting every entry in place
+        """
+        for event in events:
+            if event.raw_id in self.entries:
+                continue
+
+            entry = (event.created_at, next(self._sequence), event.raw_id)
+            self.entries[event.raw_id] = entry
+            for bucket in self._buckets(event):
+                bucket.append(entry)
+
+        # mostly in order already, which sort handles in linear time
+        self.timeline.sort()
+        for bucket in itertools.chain(
+            self.by_pubkey.values(), self.by_kind.values(), self.by_tag.values()
+        ):
+            bucket.sort()
+
+    def remove(self, event: EventKeys) -> None:
+        entry = self.entries.pop(event.raw_id, None)
+        if entry is None:
+            return
+
+        for bucket in self._buckets(event):
+            del bucket[bisect_left(bucket, entry)]
+
+        self._drop_empty(self.by_kind, event.kind)
+        for tag_type, keys in event.tags_index.items():
+            for key in keys:
+                self._drop_empty(self.by_tag, (tag_type, key))
+
+        if self._drop_empty(self.by_pubkey, event.pubkey):
+            del self.pubkeys[bisect_left(self.pubkeys, event.pubkey)]
+
+    @staticmethod
+    def _drop_empty(index: dict, key: Hashable) -> bool:
+        if index[key]:
+            return False
+
+        del index[key]
+        return True
+
+    def plan(self, _filter: NostrFilter) -> tuple[list[Bucket], bool]:
+        """
+        The buckets of the most selective index for the filter, every event
+        matching the filter is in one of them.
+        Also tells whether the buckets match the filter exactly, i.e. there are
+        no other conditions to check besides since and until
+        """
+        # (buckets, whether the lookup is exact) per condition of the filter
+        options: list[tuple[list[Bucket], bool]] = []
+        conditions = 0
+        if _filter.ids:
+            conditions += 1
+            ids = PrefixSet.of(_filter.ids)
+            if not ids.prefixes:
+                raw_ids = map(raw_event_id, ids.exact)
+                entries = (self.entries.get(raw_id) for raw_id in raw_ids if raw_id)
+                options.append(([sorted(entry for entry in entries if entry)], True))
+
+        if _filter.authors:
+            conditions += 1
+            authors = PrefixSet.of(_filter.authors)
+            options.append((self._pubkey_buckets(authors), True))
+
+        if _filter.kinds:
+            conditions += 1
+            options.append((self._lookup(self.by_kind, set(_filter.kinds)), True))
+
+        for tag_type, values in (_filter.generic_tags or {}).items():
+            conditions += 1
+            keys = {(tag_type, value) for value in values}
+            options.append((self._lookup(self.by_tag, keys), True))
+
+        if not options:
+            return [self.timeline], conditions == 0
+
+        buckets, exact = min(options, key=lambda option: sum(map(len, option[0])))
+        return buckets, exact and conditions == 1
+
+    @staticmethod
+    def _lookup(index: dict, keys: Iterable) -> list[Bucket]:
+        return [index[key] for key in keys if key in index]
+
+    def _pubkey_buckets(self, authors: PrefixSet) -> list[Bucket]:
+        buckets = self._lookup(self.by_pubkey, authors.exact)
+        for prefix in authors.prefixes:
+            start = bisect_left(self.pubkeys, prefix)
+            end = len(self.pubkeys)
+            if prefix:  # the empty prefix matches every pubkey
+                end = bisect_left(self.pubkeys, _next_prefix(prefix))
+            buckets.extend(self.by_pubkey[pubkey] for pubkey in self.pubkeys[start:end])
+
+        return buckets
+
+    def scan(
+        self,
+        buckets: list[Bucket],
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        newest_first: bool = False,
+    ) -> Iterator[IndexEntry]:
+        """
+        Entries of the buckets with since <= created_at < until, in created_at
+        order and without repetitions
+        """
+        ranges = [_time_range(bucket, since, until, newest_first) for bucket in buckets]
+        if len(ranges) == 1:
+            yield from ranges[0]
+            return
+
+        yield from unique(heapq.merge(*ranges, reverse=newest_first))
+
+
+def unique(entries: Iterable[IndexEntry]) -> Iterator[IndexEntry]:
+    """
+    Drops repetitions from sorted entries
+    """
+    previous = None
+    for entry in entries:
+        if entry != previous:
+            yield entry
+        previous = entry
+
+
+def match_filters(
+    index: EventIndex, events: Mapping[RawEventId, EventKeys], *filters: NostrFilter
+) -> Iterator[RawEventId]:
+    """
+    Ids of the indexed events matching any of the filters, newest first and up
+    to each filter's limit.
+    Produced lazily so it must be consumed before the index changes
+    """
+    matched = [_match(index, events, _filter) for _filter in filters]
+    entries = matched[0] if len(matched) == 1 else heapq.merge(*matched, reverse=True)
+    for _, _, raw_id in unique(entries):
+        yield raw_id
+
+
+def _match(
+    index: EventIndex, events: Mapping[RawEventId, EventKeys], _filter: NostrFilter
+) -> Iterator[IndexEntry]:
+    # start from the most selective index, the matcher checks the rest
+    matcher = _filter.compile()
+    buckets, exact = index.plan(_filter)
+    entries = index.scan(buckets, matcher.since, matcher.until, newest_first=True)
+    if not exact:
+        entries = (
+            entry
+            for entry in entries
+            if matcher.match(events[entry[2]])  # type: ignore
+        )
+
+    if _filter.limit:
+        # walking newest first, the limit stops the scan early
+        entries = itertools.islice(entries, _filter.limit)
+
+    return entries
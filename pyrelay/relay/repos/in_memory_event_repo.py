@@ -1,44 +1,253 @@
-from typing import Collection
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Collection, Iterator, Mapping, Optional
 
 from pyrelay.nostr.event import EventId, NostrEvent
-from pyrelay.nostr.filters import NostrFilter, apply
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.config import EvictionPolicy, settings
 from pyrelay.relay.relay_service import EventsRepository
+from pyrelay.relay.repos.compact_event import CompactEvent, RawEventId, raw_event_id
+from pyrelay.relay.repos.event_index import EventIndex, match_filters
+from pyrelay.relay.repos.memory_snapshot import read_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# rough size of a stored event's objects and index entries besides its content and
+# tags, measured with benchmarks.bench_memory
+EVENT_OVERHEAD = 900
+
+
+def approximate_size(event: CompactEvent) -> int:
+    tags = sum(len(value) for tag in event.tags for value in tag)
+    return EVENT_OVERHEAD + len(event.content) + tags
 
 
 class InMemoryEventsRepository(EventsRepository):
-    def __init__(self) -> None:
-        self.data: dict[EventId, NostrEvent] = {}
+    """
+    Events kept in memory as `CompactEvent` and indexed by `EventIndex`.
+    Can be bounded by number of events, approximate bytes and events per kind,
+    once over a bound events are evicted according to the eviction policy
+    (kind quotas always evict the oldest events of the kind).
+    With a snapshot path the events are loaded from it on creation and saved to
+    it periodically in the background and on close
+    """
+
+    def __init__(
+        self,
+        max_events: int = 0,
+        max_bytes: int = 0,
+        eviction_policy: EvictionPolicy = EvictionPolicy.OLDEST,
+        kind_quotas: Optional[Mapping[int, int]] = None,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval: float = 0,
+    ) -> None:
+        self.data: dict[RawEventId, CompactEvent] = {}
+        self.index = EventIndex()
+
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.eviction_policy = eviction_policy
+        self.kind_quotas = dict(kind_quotas or {})
+        self.size = 0  # approximate bytes of the stored events
+
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.evicted_kinds: Counter[int] = Counter()
+
+        # ids from least to most recently returned by a query, for the lru policy
+        self._recency: OrderedDict[RawEventId, None] = OrderedDict()
+
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._snapshots: Optional[asyncio.Task] = None
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+    @classmethod
+    def from_settings(cls) -> "InMemoryEventsRepository":
+        return cls(
+            settings.MEMORY_MAX_EVENTS,
+            settings.MEMORY_MAX_BYTES,
+            settings.MEMORY_EVICTION_POLICY,
+            settings.MEMORY_KIND_QUOTAS,
+            settings.MEMORY_SNAPSHOT_PATH,
+            settings.MEMORY_SNAPSHOT_INTERVAL,
+        )
+
+    @property
+    def _lru(self) -> bool:
+        return self.eviction_policy is EvictionPolicy.LRU
 
     async def delete(self, event_ids: Collection[EventId]) -> None:
         for event_id in event_ids:
-            self.data.pop(event_id, None)
+            raw_id = raw_event_id(event_id)
+            if raw_id:
+                self._remove(raw_id)
+
+    async def exists(self, event_id: EventId) -> bool:
+        return raw_event_id(event_id) in self.data
 
     async def add(self, event: NostrEvent) -> None:
-        if event.id not in self.data:
-            self.data[event.id] = event
+        record = CompactEvent.of(event)
+        if record.raw_id in self.data:
+            return
+
+        self._store(record)
+        self.index.add(record)
+        self._evict(record.kind)
+        self._start_snapshots()
+
+    def _store(self, record: CompactEvent) -> None:
+        self.data[record.raw_id] = record
+        self.size += approximate_size(record)
+        if self._lru:
+            self._recency[record.raw_id] = None
+
+    def _remove(self, raw_id: RawEventId) -> Optional[CompactEvent]:
+        record = self.data.pop(raw_id, None)
+        if record is not None:
+            self.index.remove(record)
+            self.size -= approximate_size(record)
+            self._recency.pop(raw_id, None)
+
+        return record
+
+    def _evict(self, kind: int) -> None:
+        quota = self.kind_quotas.get(kind)
+        while quota is not None and len(self.index.by_kind.get(kind, ())) > quota:
+            _, _, raw_id = self.index.by_kind[kind][0]
+            self._evict_event(raw_id)
+
+        while self._is_full():
+            if self._lru:
+                raw_id = next(iter(self._recency))
+            else:
+                _, _, raw_id = self.index.timeline[0]
+
+            self._evict_event(raw_id)
+
+    def evict_older(self, created_at: int) -> None:
+        """
+        Evicts the events created before the time
+        """
+        while self.index.timeline and self.index.timeline[0][0] < created_at:
+            _, _, raw_id = self.index.timeline[0]
+            self._evict_event(raw_id)
+
+    def _is_full(self) -> bool:
+        return (0 < self.max_events < len(self.data)) or (
+            0 < self.max_bytes < self.size
+        )
+
+    def _evict_event(self, raw_id: RawEventId) -> None:
+        record = self._remove(raw_id)
+        if record is not None:
+            self.evicted += 1
+            self.evicted_bytes += approximate_size(record)
+            self.evicted_kinds[record.kind] += 1
 
     async def query(self, *filters: NostrFilter) -> Collection[NostrEvent]:
         if not filters:
-            return list(self.data.values())
-
-        matched: dict[EventId, NostrEvent] = {}
-        limits: list[int] = []
-        for _filter in filters:
-            events = {
-                event_id: event
-                for event_id, event in self.data.items()
-                if apply(_filter, event)
-            }
-            matched |= events
-
-            if _filter.limit:
-                limits.append(_filter.limit)
-
-        response: list[NostrEvent] = sorted(
-            matched.values(), key=lambda event: event.created_at
-        )
-        if limits:
-            limit = max(limits)
-            response = response[-limit:]
+            return [record.to_event() for record in self.data.values()]
 
+        response = [record.to_event() for record in self._stream(*filters)]
+        response.reverse()
         return response
+
+    async def stream(self, *filters: NostrFilter) -> AsyncIterator[NostrEvent]:
+        # the records are taken at once since the index may change while the
+        # caller awaits, only their events are built one at a time
+        if filters:
+            records = list(self._stream(*filters))
+            records.reverse()
+        else:
+            records = list(self.data.values())
+
+        for record in records:
+            yield record.to_event()
+
+    def _stream(self, *filters: NostrFilter) -> Iterator[CompactEvent]:
+        """
+        Events matching any of the filters, newest first, produced lazily so it
+        must be consumed before the repository changes
+        """
+        for raw_id in match_filters(self.index, self.data, *filters):
+            if self._lru:
+                self._recency.move_to_end(raw_id)
+
+            yield self.data[raw_id]
+
+    def load_snapshot(self) -> None:
+        """
+        Adds the events of the snapshot without verifying them again
+        """
+        start = time.perf_counter()
+        records = [
+            record
+            for record in read_snapshot(self.snapshot_path)  # type: ignore
+            if record.raw_id not in self.data
+        ]
+        for record in records:
+            self._store(record)
+        self.index.extend(records)
+
+        # the bounds may have been lowered since the snapshot
+        while self._is_full():
+            _, _, raw_id = self.index.timeline[0]
+            self._evict_event(raw_id)
+
+        logger.info(
+            "Loaded in-memory snapshot events=%s seconds=%.3f",
+            len(self.data),
+            time.perf_counter() - start,
+        )
+
+    async def save_snapshot(self) -> None:
+        """
+        Writes the events to the snapshot path from a thread, the events are
+        immutable so only listing them blocks the event loop
+        """
+        if self.snapshot_path is None:
+            return
+
+        start = time.perf_counter()
+        records = list(self.data.values())
+        size = await asyncio.to_thread(write_snapshot, self.snapshot_path, records)
+        logger.info(
+            "Saved in-memory snapshot events=%s bytes=%s seconds=%.3f",
+            len(records),
+            size,
+            time.perf_counter() - start,
+        )
+
+    def close(self) -> None:
+        """
+        Stops the periodic snapshots and saves a last one, so the events added
+        since the previous snapshot survive a restart
+        """
+        if self._snapshots is not None:
+            self._snapshots.cancel()
+            self._snapshots = None
+
+        if self.snapshot_path is not None:
+            write_snapshot(self.snapshot_path, list(self.data.values()))
+            logger.info("Saved in-memory snapshot on close events=%s", len(self.data))
+
+    def _start_snapshots(self) -> None:
+        if (
+            self._snapshots is None
+            and self.snapshot_path is not None
+            and self.snapshot_interval > 0
+        ):
+            self._snapshots = asyncio.create_task(self._snapshot_periodically())
+
+    async def _snapshot_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.save_snapshot()
+            except Exception:
+                logger.exception("In-memory snapshot failed")
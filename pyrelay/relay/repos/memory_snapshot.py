@@ -0,0 +1,73 @@
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Iterator, Sequence
+
+from pyrelay.nostr.event import EventKind
+from pyrelay.relay.repos.compact_event import CompactEvent
+
+SNAPSHOT_VERSION = 1
+
+# records pickled per chunk: the pickler holds the GIL for a whole call, chunks
+# let the event loop run while a snapshot is written from a thread
+CHUNK_SIZE = 10_000
+
+
+def write_snapshot(path: str, records: Sequence[CompactEvent]) -> int:
+    """
+    Writes the records to the file atomically and returns its size in bytes.
+    The indexes are derived from the records and rebuilt when read
+    """
+    temp = Path(f"{path}.tmp")
+    with open(temp, "wb") as file:
+        pickle.dump((SNAPSHOT_VERSION, len(records)), file)
+        for start in range(0, len(records), CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            chunk = [
+                (
+                    record.raw_id,
+                    record.pubkey,
+                    record.created_at,
+                    int(record.kind),
+                    record.tags,
+                    record.content,
+                    record.raw_sig,
+                )
+                for record in records[start:end]
+            ]
+            pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp, path)
+    return os.path.getsize(path)
+
+
+def read_snapshot(path: str) -> Iterator[CompactEvent]:
+    """
+    Records of the snapshot in the order they were written, their events are
+    trusted to have been verified before being saved
+    """
+    with open(path, "rb") as file:
+        version, count = pickle.load(file)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported in-memory snapshot version {version}")
+
+        while count > 0:
+            chunk = pickle.load(file)
+            count -= len(chunk)
+            for raw_id, pubkey, created_at, kind, tags, content, raw_sig in chunk:
+                # pickle keeps the strings shared within a chunk, so an interned
+                # string has at most a copy per chunk, only pubkeys are interned
+                # again being the index's keys
+                yield CompactEvent(
+                    raw_id,
+                    sys.intern(pubkey),
+                    created_at,
+                    EventKind(kind),
+                    tags,
+                    content,
+                    raw_sig,
+                )
@@ -0,0 +1,438 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+import pickle
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Collection, Optional
+
+import attr
+
+from pyrelay.nostr.event import EventId, EventKind, NostrEvent
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.config import settings
+from pyrelay.relay.relay_service import EventsRepository
+from pyrelay.relay.repos.compact_event import EventKeys, RawEventId, raw_event_id
+from pyrelay.relay.repos.event_index import EventIndex, match_filters
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".seg"
+TOMBSTONES = "tombstones.log"
+SNAPSHOT = "index.snapshot"
+SNAPSHOT_VERSION = 1
+
+# (raw event id, offset) of the deleted events of a segment
+Tombstones = set[tuple[RawEventId, int]]
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class LogRecord(EventKeys):
+    """
+    Indexed event of the log and where its json is
+    """
+
+    segment: int
+    offset: int
+    length: int
+
+    @classmethod
+    def of(
+        cls, event: NostrEvent, segment: int, offset: int, length: int
+    ) -> "LogRecord":
+        return cls(
+            **cls.fields_of(event), segment=segment, offset=offset, length=length
+        )
+
+
+class SegmentLogEventsRepository(EventsRepository):
+    """
+    Durable repository which appends the json of saved events to segment files,
+    one event per line, and keeps the indexes in memory.
+    Events are read back through mmap, deletes are appended to a tombstone log
+    and a background task moves the live events out of sealed segments with
+    many deleted ones.
+    The index is snapshot to disk on close and after compactions so a restart
+    only parses the events written after the snapshot. The tombstone log keeps
+    every delete of the remaining segments, a restart without a usable snapshot
+    still drops the deleted events
+    """
+
+    def __init__(
+        self,
+        path: str,
+        segment_size: int = 64 * 2**20,
+        fsync: bool = False,
+        compact_interval: float = 60.0,
+        compact_ratio: float = 0.5,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.compact_interval = compact_interval
+        self.compact_ratio = compact_ratio
+
+        self.records: dict[RawEventId, LogRecord] = {}
+        self.index = EventIndex()
+        self.segments: list[int] = []
+        self._live: Counter[int] = Counter()
+        self._dead: defaultdict[int, Tombstones] = defaultdict(set)
+        self._maps: dict[int, mmap.mmap] = {}
+        self._compactor: Optional[asyncio.Task] = None
+        self._changed = False  # since the last snapshot
+
+        self._load()
+        if not self.segments:
+            self.segments.append(1)
+
+        self._file = open(self._segment_path(self.segments[-1]), "ab")
+        self._tombstones = open(self.path / TOMBSTONES, "ab")
+
+    @classmethod
+    def from_settings(cls) -> "SegmentLogEventsRepository":
+        return cls(
+            settings.SEGMENT_LOG_PATH,  # type: ignore
+            settings.SEGMENT_LOG_SEGMENT_SIZE,
+            settings.SEGMENT_LOG_FSYNC,
+            settings.SEGMENT_LOG_COMPACT_INTERVAL,
+            settings.SEGMENT_LOG_COMPACT_RATIO,
+        )
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.path / f"{segment:08d}{SEGMENT_SUFFIX}"
+
+    async def exists(self, event_id: EventId) -> bool:
+        return raw_event_id(event_id) in self.records
+
+    async def add(self, event: NostrEvent) -> None:
+        if raw_event_id(event.id) in self.records:
+            return
+
+        data = event.json.encode()
+        segment, offset = self._append(data)
+        self._insert(LogRecord.of(event, segment, offset, len(data)))
+        self._changed = True
+        self._start_compactor()
+
+    async def delete(self, event_ids: Collection[EventId]) -> None:
+        for event_id in event_ids:
+            record = self.records.get(raw_event_id(event_id))  # type: ignore
+            if record is None:
+                continue
+
+            self._kill(record)
+            line = f"{event_id} {record.segment} {record.offset}\n"
+            self._write(self._tombstones, line.encode())
+            self._changed = True
+
+    async def query(self, *filters: NostrFilter) -> Collection[NostrEvent]:
+        return [self._read(self.records[raw_id]) for raw_id in self._match(*filters)]
+
+    async def stream_json(self, *filters: NostrFilter) -> AsyncIterator[str]:
+        # the stored lines are the events' json, sent without parsing them
+        for raw_id in self._match(*filters):
+            # looked up again, a compaction may have moved it since the match
+            record = self.records.get(raw_id)
+            if record is not None:
+                yield self._read_bytes(record).decode()
+
+    def _match(self, *filters: NostrFilter) -> list[RawEventId]:
+        if not filters:
+            return list(self.records)
+
+        raw_ids = list(match_filters(self.index, self.records, *filters))
+        raw_ids.reverse()
+        return raw_ids
+
+    def _insert(self, record: LogRecord) -> None:
+        self.records[record.raw_id] = record
+        self.index.add(record)
+        self._live[record.segment] += 1
+
+    def _kill(self, record: LogRecord) -> None:
+        del self.records[record.raw_id]
+        self.index.remove(record)
+        self._live[record.segment] -= 1
+        self._dead[record.segment].add((record.raw_id, record.offset))
+
+    def _write(self, file: Any, data: bytes) -> None:
+        file.write(data)
+        file.flush()
+        if self.fsync:
+            os.fsync(file.fileno())
+
+    def _append(self, data: bytes) -> tuple[int, int]:
+        offset = self._file.tell()
+        if offset and offset + len(data) > self.segment_size:
+            self._file.close()
+            self.segments.append(self.segments[-1] + 1)
+            self._file = open(self._segment_path(self.segments[-1]), "ab")
+            offset = 0
+
+        self._write(self._file, data + b"\n")
+        return self.segments[-1], offset
+
+    def _read_bytes(self, record: LogRecord) -> bytes:
+        start = record.offset
+        end = start + record.length
+        view = self._maps.get(record.segment)
+        if view is None or len(view) < end:
+            # first read of the segment, or the active one grew since mapped
+            if view is not None:
+                view.close()
+
+            with open(self._segment_path(record.segment), "rb") as file:
+                view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[record.segment] = view
+
+        return view[start:end]
+
+    def _read(self, record: LogRecord) -> NostrEvent:
+        text = self._read_bytes(record).decode()
+        event = NostrEvent.deserialize(event=json.loads(text))
+        # the stored line is the event's json, no need to dump it again
+        event.__dict__["json"] = text
+        return event
+
+    def _start_compactor(self) -> None:
+        if self._compactor is None and self.compact_interval > 0:
+            self._compactor = asyncio.create_task(self._compact_periodically())
+
+    async def _compact_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                if not await self.compact() and self._changed:
+                    self.snapshot()
+            except Exception:
+                logger.exception("Segment log compaction failed path=%s", self.path)
+
+    async def compact(self) -> int:
+        """
+        Moves the live events of the sealed segments where at least
+        `compact_ratio` of the events were deleted to the active segment and
+        removes them.
+        Returns the number of removed segments
+        """
+        compacted: list[int] = []
+        for segment in self.segments[:-1]:
+            dead = len(self._dead[segment])
+            total = dead + self._live[segment]
+            if total and dead / total < self.compact_ratio:
+                continue
+
+            moved = [r for r in self.records.values() if r.segment == segment]
+            for record in moved:
+                new_segment, offset = self._append(self._read_bytes(record))
+                self.records[record.raw_id] = attr.evolve(
+                    record, segment=new_segment, offset=offset
+                )
+                self._live[new_segment] += 1
+
+            self._drop_segment(segment)
+            compacted.append(segment)
+            logger.info("Compacted segment=%s moved=%s", segment, len(moved))
+            # let other work run between segments
+            await asyncio.sleep(0)
+
+        if compacted:
+            # the files are removed only once a snapshot without them is written,
+            # their tombstones only once the files are gone
+            self._write_snapshot()
+            for segment in compacted:
+                self._segment_path(segment).unlink()
+            self._rewrite_tombstones()
+
+        return len(compacted)
+
+    def _drop_segment(self, segment: int) -> None:
+        view = self._maps.pop(segment, None)
+        if view is not None:
+            view.close()
+
+        self.segments.remove(segment)
+        self._live.pop(segment, None)
+        self._dead.pop(segment, None)
+
+    def snapshot(self) -> None:
+        """
+        Persists the index and the deleted events, then rewrites the tombstone
+        log with only the deletes of the remaining segments
+        """
+        self._write_snapshot()
+        self._rewrite_tombstones()
+
+    def _write_snapshot(self) -> None:
+        start = time.perf_counter()
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "segments": {
+                segment: self._segment_path(segment).stat().st_size
+                for segment in self.segments
+            },
+            "records": [
+                (
+                    record.raw_id,
+                    record.pubkey,
+                    record.created_at,
+                    int(record.kind),
+                    record.tags,
+                    record.segment,
+                    record.offset,
+                    record.length,
+                )
+                for record in self.records.values()
+            ],
+            "dead": dict(self._dead),
+        }
+
+        temp = self.path / f"{SNAPSHOT}.tmp"
+        with open(temp, "wb") as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.path / SNAPSHOT)
+
+        self._changed = False
+        logger.info(
+            "Segment log snapshot events=%s seconds=%.3f",
+            len(self.records),
+            time.perf_counter() - start,
+        )
+
+    def _rewrite_tombstones(self) -> None:
+        # replaying tombstones is idempotent, crashing before the replace keeps
+        # the longer log which is as good
+        temp = self.path / f"{TOMBSTONES}.tmp"
+        with open(temp, "wb") as file:
+            for segment, tombstones in self._dead.items():
+                for raw_id, offset in tombstones:
+                    file.write(f"{raw_id.hex()} {segment} {offset}\n".encode())
+            file.flush()
+            os.fsync(file.fileno())
+
+        self._tombstones.close()
+        os.replace(temp, self.path / TOMBSTONES)
+        self._tombstones = open(self.path / TOMBSTONES, "ab")
+
+    def _load(self) -> None:
+        start = time.perf_counter()
+        self.segments = sorted(
+            int(path.stem) for path in self.path.glob(f"*{SEGMENT_SUFFIX}")
+        )
+        sizes = {
+            segment: self._segment_path(segment).stat().st_size
+            for segment in self.segments
+        }
+
+        covered: dict[int, int] = {}
+        snapshot = self._read_snapshot(sizes)
+        if snapshot is not None:
+            covered = snapshot["segments"]
+            self._remove_compacted(covered)
+            for raw_id, pubkey, created_at, kind, tags, *location in snapshot[
+                "records"
+            ]:
+                self._insert(
+                    LogRecord(
+                        raw_id, pubkey, created_at, EventKind(kind), tags, *location
+                    )
+                )
+            for segment, tombstones in snapshot["dead"].items():
+                self._dead[segment] |= tombstones
+
+        for segment in self.segments:
+            self._scan(segment, covered.get(segment, 0))
+
+        self._replay_tombstones()
+        logger.info(
+            "Segment log loaded events=%s from_snapshot=%s seconds=%.3f",
+            len(self.records),
+            snapshot is not None,
+            time.perf_counter() - start,
+        )
+
+    def _read_snapshot(self, sizes: dict[int, int]) -> Optional[dict]:
+        try:
+            with open(self.path / SNAPSHOT, "rb") as file:
+                snapshot = pickle.load(file)
+        except FileNotFoundError:
+            return None
+
+        if snapshot["version"] != SNAPSHOT_VERSION or any(
+            sizes.get(segment, -1) < size
+            for segment, size in snapshot["segments"].items()
+        ):
+            # the snapshot refers to segments which are gone, start from scratch
+            logger.warning("Ignoring stale segment log snapshot path=%s", self.path)
+            return None
+
+        return snapshot
+
+    def _remove_compacted(self, covered: dict[int, int]) -> None:
+        """
+        Segments older than the snapshot which it doesn't cover were compacted,
+        their files are left when crashing before they were removed
+        """
+        last = max(covered, default=0)
+        for segment in list(self.segments):
+            if segment < last and segment not in covered:
+                logger.info("Removing compacted segment=%s", segment)
+                self._segment_path(segment).unlink()
+                self.segments.remove(segment)
+
+    def _scan(self, segment: int, offset: int) -> None:
+        """
+        Indexes the events of the segment from the offset on
+        """
+        path = self._segment_path(segment)
+        with open(path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # partially written by a crash, never acknowledged
+                    break
+
+                event = NostrEvent.deserialize(event=json.loads(line))
+                record = LogRecord.of(event, segment, offset, len(line) - 1)
+                older = self.records.get(record.raw_id)
+                if older is not None:
+                    # re-added after a delete, or moved by an interrupted compaction
+                    self._kill(older)
+                self._insert(record)
+
+                offset += len(line)
+
+        os.truncate(path, offset)
+
+    def _replay_tombstones(self) -> None:
+        try:
+            with open(self.path / TOMBSTONES, "rb") as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return
+
+        for line in lines:
+            event_id, segment, offset = line.decode().split()
+            raw_id, location = bytes.fromhex(event_id), (int(segment), int(offset))
+            record = self.records.get(raw_id)
+            if record is not None and (record.segment, record.offset) == location:
+                self._kill(record)
+            elif location[0] in self.segments:
+                self._dead[location[0]].add((raw_id, location[1]))
+
+    def close(self) -> None:
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+
+        self.snapshot()
+        self._file.close()
+        self._tombstones.close()
+        for view in self._maps.values():
+            view.close()
+        self._maps.clear()
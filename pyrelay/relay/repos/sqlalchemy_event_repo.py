@@ -1,22 +1,35 @@
 from datetime import datetime, timezone
-from typing import Collection, Optional, Self
+from typing import AsyncIterator, Collection, Optional, Self
 
-from sqlalchemy import and_, column, or_, select, update
+from sqlalchemy import Column, and_, column, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import Select
 from sqlalchemy.sql.elements import BinaryExpression, BooleanClauseList
 
 from pyrelay.nostr.event import EventId, EventKind, NostrEvent, NostrTag
-from pyrelay.nostr.filters import NostrFilter
-from pyrelay.relay.relay_service import EventsRepository
+from pyrelay.nostr.filters import NostrFilter, PrefixSet
+from pyrelay.relay.db.batch_writer import BatchWriter
+from pyrelay.relay.relay_service import DuplicateEventError, EventsRepository
+
+# events fetched from the cursor at a time by `stream`, each with a query for tags
+STREAM_CHUNK = 500
 
 
 class SqlAlchemyEventRepository(EventsRepository):
-    def __init__(self, session: AsyncSession) -> None:
+    def __init__(
+        self, session: AsyncSession, writer: Optional[BatchWriter] = None
+    ) -> None:
         self.session = session
+        self.writer = writer  # saves added events in batches instead of the session
 
     async def delete(self, event_ids: Collection[EventId]) -> None:
+        if self.writer is not None:
+            await self._release()
+            await self.writer.delete(event_ids)
+            return
+
         # async with self.session.begin():
         query = (
             update(NostrEvent)
@@ -27,45 +40,106 @@ class SqlAlchemyEventRepository(EventsRepository):
 
         await self.session.execute(query)
 
+    async def exists(self, event_id: EventId) -> bool:
+        query = select(NostrEvent.id).where(NostrEvent.id == event_id)  # type: ignore
+        result = await self.session.execute(query.limit(1))
+        return result.first() is not None
+
     async def add(self, event: NostrEvent) -> None:
         # async with self.session.begin():
-        self.session.add(event)
+        if await self.exists(event.id):
+            # event id is unique
+            return
+
+        if self.writer is not None:
+            await self._release()
+            await self.writer.write(event)
+        else:
+            event.raw = event.json  # type: ignore
+            self.session.add(event)
+            try:
+                # the same event saved by another session since `exists` fails
+                # on the unique id here rather than at commit
+                await self.session.flush()
+            except IntegrityError as e:
+                raise DuplicateEventError(event.id) from e
+
+    async def _release(self) -> None:
+        """
+        Ends the read transaction of the session before waiting for the writer,
+        which commits with its own connection: the session mustn't hold a pooled
+        connection meanwhile, with no readers it is the writer's only one
+        """
+        await self.session.commit()
 
     async def query(self, *filters: NostrFilter) -> Collection[NostrEvent]:
-        query = (
-            select(NostrEvent)
-            .outerjoin(NostrTag)
-            .options(contains_eager(NostrEvent.tags))
-            .filter(column("deleted_at").is_(None))
-            # todo: filter deleted event with references
-        )
+        result = await self.session.execute(select_events(*filters))
+        return result.scalars().all()
 
-        query_builder = EventQueryBuilder(query)
-        limits = []
+    async def stream(self, *filters: NostrFilter) -> AsyncIterator[NostrEvent]:
+        query = select_events(*filters).execution_options(yield_per=STREAM_CHUNK)
+        result = await self.session.stream(query)
+        async for event in result.scalars():
+            yield event
 
-        for _filter in filters:
-            query_builder = query_builder.apply_filter(_filter)
-            if _filter.limit:
-                limits.append(_filter.limit)
+    async def stream_json(self, *filters: NostrFilter) -> AsyncIterator[str]:
+        query = select_events_json(*filters).execution_options(yield_per=STREAM_CHUNK)
+        result = await self.session.stream(query)
+        async for raw in result.scalars():
+            yield raw
 
-        query = query_builder.build()
 
-        if limits:
-            limit = max(limits)
-            query = query.order_by(NostrEvent.created_at.desc()).limit(  # type: ignore
-                limit
-            )
-        else:
-            query = query.order_by(NostrEvent.created_at)
+def select_event_keys(*filters: NostrFilter) -> Select:
+    """
+    First phase of a query: the primary keys of the events matching one of the
+    filters, each filter newest first up to its own limit
+    """
+    query = select(NostrEvent.db_id).filter(  # type: ignore
+        column("deleted_at").is_(None)
+        # todo: filter deleted event with references
+    )
+
+    query_builder = EventQueryBuilder(query)
+    for _filter in filters:
+        query_builder = query_builder.apply_filter(_filter)
+
+    return query_builder.build()
+
+
+def select_events(*filters: NostrFilter) -> Select:
+    """
+    Second phase of a query: the events of the matching keys, oldest first, with
+    their tags loaded by a separate query instead of joined, so neither the
+    limit nor the tag conditions apply to tag rows
+    """
+    query = select(NostrEvent).options(selectinload(NostrEvent.tags))
+    return _of_keys(query, *filters)
+
 
-        x = await self.session.execute(query)
-        return [event for (event,) in x.unique()]
+def select_events_json(*filters: NostrFilter) -> Select:
+    """
+    Second phase of a query selecting only the stored json of the events
+    """
+    return _of_keys(select(NostrEvent.raw), *filters)  # type: ignore
+
+
+def _of_keys(query: Select, *filters: NostrFilter) -> Select:
+    keys = select_event_keys(*filters)
+    # ties broken by insertion, the events and their json come in the same order
+    return query.where(NostrEvent.db_id.in_(keys)).order_by(  # type: ignore
+        NostrEvent.created_at, NostrEvent.db_id  # type: ignore
+    )
 
 
 class EventQueryBuilder:
+    """
+    A query per filter, limited on its own and searching its own index,
+    combined with UNION ALL
+    """
+
     def __init__(self, query: Select) -> None:
         self.query = query
-        self.filters: list[BooleanClauseList] = []
+        self.queries: list[Select] = []
 
     def apply_filter(self, _filter: NostrFilter) -> Self:  # type: ignore
         filter_builder = (
@@ -81,21 +155,27 @@ class EventQueryBuilder:
             for key, values in _filter.generic_tags.items():
                 filter_builder = filter_builder.filter_tags(key, values)
 
-        f = filter_builder.build()
-        self.filters.append(f)
+        query = self.query.filter(filter_builder.build())
+        if _filter.limit:
+            query = query.order_by(NostrEvent.created_at.desc()).limit(  # type: ignore
+                _filter.limit
+            )
 
+        self.queries.append(query)
         return self
 
     def build(self) -> Select:
-        match len(self.filters):
+        match len(self.queries):
             case 0:
                 return self.query
             case 1:
-                [filters] = self.filters
-            case _:
-                filters = or_(*self.filters)
+                [query] = self.queries
+                return query
 
-        return self.query.filter(filters)
+        # sqlite allows no ORDER BY or LIMIT on a member of a compound select
+        members = [select(query.subquery()) for query in self.queries]
+        # an event matching several filters is listed once by the IN of the caller
+        return select(union_all(*members).subquery())
 
 
 class EventFiltersBuilder:
@@ -103,8 +183,14 @@ class EventFiltersBuilder:
         self.filters: list[BinaryExpression] = []
 
     def filter_tags(self, tag_type: str, tags: list[str]) -> Self:  # type: ignore
-        self.filters.append(NostrTag.type == tag_type)
-        self.filters.append(NostrTag.key.in_(tags))  # type: ignore
+        # each tag type may be matched by a different tag of the event.
+        # a semi-join on the tag index, unlike a correlated EXISTS sqlite does
+        # not probe it for every event of a created_at ordered scan
+        tagged = select(NostrTag.event_id).where(  # type: ignore
+            NostrTag.type == tag_type,
+            NostrTag.key.in_(tags),  # type: ignore
+        )
+        self.filters.append(NostrEvent.id.in_(tagged))  # type: ignore
         return self
 
     def filter_since(self, since: Optional[int]) -> Self:  # type: ignore
@@ -121,20 +207,13 @@ class EventFiltersBuilder:
 
     def filter_ids(self, ids: Optional[list[str]]) -> Self:  # type: ignore
         if ids:
-            prefix = [
-                NostrEvent.id.ilike(f"{event_id}%") for event_id in ids  # type: ignore
-            ]
-            self.filters.append(or_(*prefix))
+            self.filters.append(_match_prefixes(NostrEvent.id, ids))
 
         return self
 
     def filter_authors(self, authors: Optional[list[str]]) -> Self:  # type: ignore
         if authors:
-            prefix = [
-                NostrEvent.pubkey.ilike(f"{author}%")  # type: ignore
-                for author in authors
-            ]
-            self.filters.append(or_(*prefix))
+            self.filters.append(_match_prefixes(NostrEvent.pubkey, authors))
 
         return self
 
@@ -147,3 +226,30 @@ class EventFiltersBuilder:
 
     def build(self) -> BooleanClauseList:
         return and_(*self.filters)
+
+
+def _match_prefixes(column: Column, values: list[str]) -> BooleanClauseList:
+    """
+    Full values are matched with a single IN and each prefix with a range,
+    both can be answered by the column index
+    """
+    prefixes = PrefixSet.of(values)
+    clauses = []
+    if prefixes.exact:
+        clauses.append(column.in_(prefixes.exact))
+
+    for prefix in prefixes.prefixes:
+        if not prefix:
+            # the empty prefix matches every value and has no upper bound
+            clauses.append(column >= prefix)
+        else:
+            clauses.append(and_(column >= prefix, column < _next_prefix(prefix)))
+
+    return or_(*clauses)
+
+
+def _next_prefix(prefix: str) -> str:
+    """
+    The smallest string that is greater than all the strings starting with prefix
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
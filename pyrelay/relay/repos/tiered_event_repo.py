@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Collection, Optional
+
+import attr
+
+from pyrelay.nostr.event import EventId, NostrEvent
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.relay_service import EventsRepository
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+
+logger = logging.getLogger(__name__)
+
+# queries between reports of the fraction served from memory
+REPORT_EVERY = 1000
+
+
+class HotTier:
+    """
+    Recent events kept in memory and shared by all the tiered repositories.
+    It has every event created since the boundary: the start of its window, or
+    when it started if that is later. It starts once it loaded the events of
+    its window from the cold tier, saved before a restart, see `warm_up`
+    """
+
+    def __init__(self, window: float, repo: Optional[InMemoryEventsRepository] = None):
+        self.window = window
+        self.repo = repo if repo is not None else InMemoryEventsRepository()
+        self.started = int(time.time())
+        self.warm = False
+        self._warming = asyncio.Lock()
+
+        self.queries = 0
+        self.memory_queries = 0  # answered without the cold tier
+
+    @property
+    def boundary(self) -> int:
+        return max(int(time.time() - self.window), self.started)
+
+    @property
+    def memory_ratio(self) -> float:
+        return self.memory_queries / self.queries if self.queries else 0.0
+
+    def count(self, from_memory: bool) -> None:
+        self.queries += 1
+        self.memory_queries += from_memory
+        if self.queries % REPORT_EVERY == 0:
+            logger.info(
+                "Tiered queries=%s served from memory=%.1f%%",
+                self.queries,
+                self.memory_ratio * 100,
+            )
+
+    async def warm_up(self, cold: EventsRepository) -> None:
+        """
+        Loads the events of the window from the cold tier, once, then the hot
+        tier has them since the start of the window, not only since it was
+        created. Changes applied meanwhile wait for it, so a delete isn't undone
+        by an event read before it
+        """
+        if self.warm:
+            return
+
+        async with self._warming:
+            if self.warm:
+                return
+
+            since = int(time.time() - self.window)
+            events = await cold.query(NostrFilter(since=since))
+            for event in events:
+                await self.repo.add(event)
+            self.started = min(self.started, since)
+            self.warm = True
+            logger.info("Hot tier warmed events=%s since=%s", len(events), since)
+
+    def trim(self) -> None:
+        self.repo.evict_older(int(time.time() - self.window))
+
+
+class TieredEventsRepository(EventsRepository):
+    """
+    Writes through to the cold repository, usually sql, and keeps the recent
+    events in the hot tier too.
+    A filter is split at the hot tier's boundary: newer events come from memory
+    and the cold tier is only asked for older ones, unless the filter's since is
+    past the boundary or its limit is already filled from memory.
+    Changes reach the hot tier when `apply` is called after the cold tier commits
+    """
+
+    def __init__(self, hot: HotTier, cold: EventsRepository) -> None:
+        self.hot = hot
+        self.cold = cold
+        self.added: list[NostrEvent] = []
+        self.deleted: list[EventId] = []
+
+    async def add(self, event: NostrEvent) -> None:
+        await self.cold.add(event)
+        self.added.append(event)
+
+    async def delete(self, event_ids: Collection[EventId]) -> None:
+        await self.cold.delete(event_ids)
+        self.deleted.extend(event_ids)
+
+    async def exists(self, event_id: EventId) -> bool:
+        return await self.hot.repo.exists(event_id) or await self.cold.exists(event_id)
+
+    async def apply(self) -> None:
+        """
+        Brings the hot tier up to date with the committed changes
+        """
+        await self.hot.warm_up(self.cold)
+        boundary = self.hot.boundary
+        for event in self.added:
+            if event.created_at >= boundary:
+                await self.hot.repo.add(event)
+        await self.hot.repo.delete(self.deleted)
+        self.discard()
+        self.hot.trim()
+
+    def discard(self) -> None:
+        self.added.clear()
+        self.deleted.clear()
+
+    async def query(self, *filters: NostrFilter) -> Collection[NostrEvent]:
+        if not filters:
+            self.hot.count(False)
+            return await self.cold.query()
+
+        await self.hot.warm_up(self.cold)
+        boundary = self.hot.boundary
+        from_memory = True
+        events: dict[EventId, NostrEvent] = {}
+        for _filter in filters:
+            matched, hot_only = await self._query(_filter, boundary)
+            for event in matched:
+                events.setdefault(event.id, event)
+            from_memory &= hot_only
+
+        self.hot.count(from_memory)
+        return sorted(events.values(), key=lambda event: event.created_at)
+
+    async def _query(
+        self, _filter: NostrFilter, boundary: int
+    ) -> tuple[list[NostrEvent], bool]:
+        """
+        Events matching the filter and whether the hot tier was enough
+        """
+        if _filter.until is not None and _filter.until <= boundary:
+            return list(await self.cold.query(_filter)), False
+
+        since = max(_filter.since or 0, boundary)
+        events = list(await self.hot.repo.query(attr.evolve(_filter, since=since)))
+        if _filter.since is not None and _filter.since >= boundary:
+            return events, True
+
+        limit = _filter.limit
+        if limit:
+            if len(events) >= limit:
+                # the hot events are the newest
+                return events, True
+            limit -= len(events)
+
+        cold = attr.evolve(_filter, until=boundary, limit=limit)
+        return [*await self.cold.query(cold), *events], False
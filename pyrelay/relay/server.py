@@ -1,10 +1,11 @@
 import asyncio
 import logging
+import signal
 
 import websockets
 
 from pyrelay.nostr.serialize import loads
-from pyrelay.relay.bootstrap import get_uow_factory
+from pyrelay.relay.bootstrap import get_uow_factory, shutdown
 from pyrelay.relay.client_session import ClientSession
 from pyrelay.relay.dispatcher import RelayDispatcher
 
@@ -35,4 +36,9 @@ if __name__ == "__main__":
     start_websocket_server = websockets.serve(handler, "", 8001)
     event_loop.run_until_complete(start_websocket_server)
 
-    event_loop.run_forever()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        event_loop.add_signal_handler(signum, event_loop.stop)
+    try:
+        event_loop.run_forever()
+    finally:
+        shutdown()
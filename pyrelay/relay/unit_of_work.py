@@ -2,9 +2,21 @@ import abc
 from typing import Optional, Self
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
 
+from pyrelay.relay.bloom_filter import BloomFilter
+from pyrelay.relay.config import settings
+from pyrelay.relay.db.batch_writer import BatchWriter
+from pyrelay.relay.event_verifier import EventVerifier
 from pyrelay.relay.relay_service import EventsRepository, Subscriptions
 from pyrelay.relay.repos.sqlalchemy_event_repo import SqlAlchemyEventRepository
+from pyrelay.relay.repos.tiered_event_repo import HotTier, TieredEventsRepository
+
+
+def new_event_ids_filter() -> BloomFilter:
+    return BloomFilter(
+        settings.DUPLICATE_FILTER_CAPACITY, settings.DUPLICATE_FILTER_ERROR_RATE
+    )
 
 
 class UnitOfWork:
@@ -15,6 +27,8 @@ class UnitOfWork:
 
     events: EventsRepository
     subscriptions: Subscriptions
+    verifier: EventVerifier
+    event_ids: BloomFilter  # ids of the saved events
 
     async def __aenter__(self) -> Self:
         return self
@@ -41,20 +55,32 @@ class UnitOfWork:
 
 
 class SqlAlchemyUOW(UnitOfWork):
-    def __init__(self, session_factory, subscriptions):
+    def __init__(
+        self,
+        session_factory,
+        subscriptions,
+        verifier=None,
+        event_ids=None,
+        writer: Optional[BatchWriter] = None,
+    ):
         self.session_factory = session_factory
         self.subscriptions = subscriptions
+        self.verifier = verifier or EventVerifier()
+        self.event_ids = event_ids if event_ids is not None else new_event_ids_filter()
+        self.writer = writer
         self.session: Optional[AsyncSession] = None
 
     async def __aenter__(self):
         self.session = self.session_factory()
         await self.session.begin()
-        self.events = SqlAlchemyEventRepository(self.session)
+        self.events = SqlAlchemyEventRepository(self.session, self.writer)
         return await super().__aenter__()
 
     async def __aexit__(self, exn_type, exn_value, traceback):
-        await super().__aexit__(exn_type, exn_value, traceback)
-        await self.session.close()
+        try:
+            await super().__aexit__(exn_type, exn_value, traceback)
+        finally:
+            await self.session.close()
 
     async def commit(self) -> None:
         await self.session.commit()
@@ -64,12 +90,48 @@ class SqlAlchemyUOW(UnitOfWork):
 
 
 class InMemoryUOW(UnitOfWork):
-    def __init__(self, subscriptions, repo):
+    def __init__(self, subscriptions, repo, verifier=None, event_ids=None):
         self.subscriptions = subscriptions
         self.events = repo
+        self.verifier = verifier or EventVerifier()
+        self.event_ids = event_ids if event_ids is not None else new_event_ids_filter()
 
     async def commit(self) -> None:
         return
 
     async def rollback(self) -> None:
         return
+
+
+class TieredUOW(SqlAlchemyUOW):
+    """
+    Sql unit of work which also serves the recent events from the hot tier,
+    the hot tier is updated only once the session commits
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        subscriptions: Subscriptions,
+        hot: HotTier,
+        verifier: Optional[EventVerifier] = None,
+        event_ids: Optional[BloomFilter] = None,
+        writer: Optional[BatchWriter] = None,
+    ) -> None:
+        super().__init__(session_factory, subscriptions, verifier, event_ids, writer)
+        self.hot = hot
+        self.tiered: Optional[TieredEventsRepository] = None
+
+    async def __aenter__(self) -> "TieredUOW":
+        await super().__aenter__()
+        self.tiered = TieredEventsRepository(self.hot, self.events)
+        self.events = self.tiered
+        return self
+
+    async def commit(self) -> None:
+        await super().commit()
+        await self.tiered.apply()  # type: ignore
+
+    async def rollback(self) -> None:
+        await super().rollback()
+        self.tiered.discard()  # type: ignore
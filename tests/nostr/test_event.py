@@ -0,0 +1,76 @@
+import attr
+import pytest
+
+from pyrelay.nostr.event import NostrTag, Validity
+from pyrelay.nostr.event_builder import EventBuilder
+
+
+@pytest.fixture(scope="module")
+def event_builder():
+    return EventBuilder.from_generated()
+
+
+@pytest.fixture(scope="module")
+def event(event_builder):
+    return event_builder.create_event("content")
+
+
+class TestValidate:
+    def test_valid(self, event):
+        assert event.validate() is Validity.VALID
+        assert event.verify()
+
+    def test_id_mismatch(self, event, event_builder):
+        other = event_builder.create_event("other content")
+        tampered = attr.evolve(event, id=other.id, sig=other.sig)
+        assert tampered.validate() is Validity.ID_MISMATCH
+        assert not tampered.verify()
+
+    def test_content_mismatch(self, event):
+        tampered = attr.evolve(event, content="tampered")
+        assert tampered.validate() is Validity.ID_MISMATCH
+
+    def test_bad_signature(self, event, event_builder):
+        other = event_builder.create_event("other content")
+        tampered = attr.evolve(event, sig=other.sig)
+        assert tampered.validate() is Validity.BAD_SIGNATURE
+
+    def test_malformed_signature(self, event):
+        tampered = attr.evolve(event, sig="not hex")
+        assert tampered.validate() is Validity.BAD_SIGNATURE
+
+    def test_pubkey_not_on_curve(self, event):
+        tampered = attr.evolve(event, pubkey="ff" * 32)
+        tampered = attr.evolve(tampered, id=tampered.calc_id())
+        assert tampered.validate() is Validity.BAD_SIGNATURE
+
+    def test_canonical_is_reused(self, event):
+        assert event.calc_id() == event.id
+        assert event.__dict__["canonical"] is event.canonical
+
+
+class TestTagsIndex:
+    @pytest.fixture(scope="class")
+    def event(self, event_builder):
+        return event_builder.create_event("content", tags=[
+            NostrTag("e", "event1", []),
+            NostrTag("e", "event2", ["wss://relay"]),
+            NostrTag("p", "pubkey1", []),
+            NostrTag("e", "event1", []),
+        ])
+
+    def test_index(self, event):
+        assert dict(event.tags_index) == {
+            "e": frozenset({"event1", "event2"}),
+            "p": frozenset({"pubkey1"}),
+        }
+        assert event.e_tags == {"event1", "event2"}
+        assert event.p_tags == {"pubkey1"}
+        assert event.get_tags_keys("d") == frozenset()
+
+    def test_built_once(self, event):
+        assert event.tags_index is event.tags_index
+
+    def test_read_only(self, event):
+        with pytest.raises(TypeError):
+            event.tags_index["d"] = frozenset()  # type: ignore
@@ -1,8 +1,12 @@
+import secrets
+
 import pytest
+from hypothesis import given, strategies as s
 
 from pyrelay.nostr.event import EventKind, NostrTag
 from pyrelay.nostr.event_builder import EventBuilder
-from pyrelay.nostr.filters import apply, NostrFilter, apply_many
+from pyrelay.nostr.filters import apply, NostrFilter, apply_many, match_many, PrefixSet
+from tests.strategies import hex32, partial_hex32, msg_kind
 
 
 @pytest.fixture(scope="module")
@@ -186,3 +190,80 @@ class TestApplyFilter:
         )
         assert apply_many(event, filt_match, filt_no_match)
         assert apply_many(event, filt_no_match, filt_match)
+
+
+class TestPrefixSet:
+    def test_exact(self):
+        prefixes = PrefixSet.of(["abcd", "1234"])
+        assert prefixes.match("abcd")
+        assert not prefixes.match("abc")
+        assert not prefixes.match("abce")
+
+    def test_prefix(self):
+        prefixes = PrefixSet.of(["ab", "1234", "abcdef"])
+        assert prefixes.match("abcd")
+        assert prefixes.match("12345")
+        assert not prefixes.match("123")
+        assert not prefixes.match("a")
+
+    def test_longer_than_value(self):
+        prefixes = PrefixSet.of(["abcd"])
+        assert not prefixes.match("abc")
+
+    def test_exact_and_prefixes(self):
+        full = "a" * 64
+        prefixes = PrefixSet.of([full, "b" * 64, "ab", "abc", "c"])
+        assert prefixes.exact == {full, "b" * 64}
+        # "abc" is already covered by "ab"
+        assert prefixes.prefixes == ("ab", "c")
+
+        assert prefixes.match(full)
+        assert prefixes.match("abd" + "0" * 61)
+        assert prefixes.match("c" * 64)
+        assert not prefixes.match("0" * 64)
+        assert not prefixes.match("b" * 63 + "c")
+
+    def test_many(self, event):
+        follows = [secrets.token_hex(32) for _ in range(2000)]
+        assert not PrefixSet.of(follows).match(event.pubkey)
+        assert PrefixSet.of(follows + [event.pubkey]).match(event.pubkey)
+        assert PrefixSet.of(follows + [event.pubkey[:5]]).match(event.pubkey)
+
+
+class TestFilterMatcher:
+    @given(
+        ids=s.none() | s.lists(partial_hex32 | hex32),
+        authors=s.none() | s.lists(partial_hex32 | hex32),
+        kinds=s.none() | s.lists(msg_kind),
+        since=s.none() | s.integers(min_value=0),
+        until=s.none() | s.integers(min_value=0),
+        tags=s.none() | s.dictionaries(
+            s.sampled_from("ep"), s.lists(s.sampled_from(["1234567123456712345671234", "x"]))
+        ),
+        use_event_values=s.booleans(),
+    )
+    def test_same_as_apply(
+        self, event, ids, authors, kinds, since, until, tags, use_event_values
+    ):
+        if use_event_values:
+            ids = (ids or []) + [event.id[:len(event.id) // 2]]
+            authors = (authors or []) + [event.pubkey]
+            kinds = (kinds or []) + [event.kind]
+
+        filt = NostrFilter(
+            ids=ids,
+            authors=authors,
+            kinds=kinds,
+            since=since,
+            until=until,
+            generic_tags=tags,
+        )
+        assert filt.compile().match(event) == apply(filt, event)
+
+    def test_match_many(self, event):
+        match = NostrFilter(authors=[event.pubkey]).compile()
+        no_match = NostrFilter(authors=["x" + event.pubkey]).compile()
+
+        assert match_many(event)
+        assert match_many(event, no_match, match)
+        assert not match_many(event, no_match)
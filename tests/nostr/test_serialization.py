@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from hypothesis import strategies as s, given
 
@@ -5,6 +7,7 @@ from pyrelay.nostr.event_builder import EventBuilder
 from pyrelay.nostr.filters import NostrFilter
 from pyrelay.nostr.msgs import (
     NostrEventUpdate,
+    NostrRawEventUpdate,
     NostrRequest,
     NostrClose,
     NostrNoticeUpdate, NostrEOSE, NostrCommandResults,
@@ -138,3 +141,23 @@ def test_loads_failed_json():
 def test_loads_failed():
     with pytest.raises(ValueError):
         loads('["asdasd"]')
+
+
+def test_event_update_reuses_event_json(event_builder):
+    event = event_builder.create_event("content")
+    first = dumps(NostrEventUpdate(subscription_id="a", event=event))
+    second = dumps(NostrEventUpdate(subscription_id='"b"', event=event))
+
+    assert "json" in event.__dict__
+    assert json.loads(first) == ["EVENT", "a", event.dict()]
+    assert json.loads(second) == ["EVENT", '"b"', event.dict()]
+
+
+def test_raw_event_update_same_as_event_update(event_builder):
+    event = event_builder.create_event("content")
+    raw = NostrRawEventUpdate(subscription_id="a", event_json=event.json)
+
+    assert dumps(raw) == dumps(NostrEventUpdate(subscription_id="a", event=event))
+    assert json.dumps(raw.serialize()) == json.dumps(
+        NostrEventUpdate(subscription_id="a", event=event).serialize()
+    )
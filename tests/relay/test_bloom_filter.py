@@ -0,0 +1,24 @@
+import secrets
+
+from pyrelay.relay.bloom_filter import BloomFilter
+
+
+class TestBloomFilter:
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000)
+        keys = [secrets.token_hex(32) for _ in range(1000)]
+        bloom.update(keys)
+
+        assert all(key in bloom for key in keys)
+        assert bloom.count == 1000
+
+    def test_empty(self):
+        bloom = BloomFilter(capacity=1000)
+        assert secrets.token_hex(32) not in bloom
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        bloom.update(secrets.token_hex(32) for _ in range(1000))
+
+        false_positives = sum(secrets.token_hex(32) in bloom for _ in range(10000))
+        assert false_positives < 300
@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import pytest
+
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.nostr.msgs import NostrNoticeUpdate, NostrRequest
+from pyrelay.relay.client_session import ClientSession
+from pyrelay.relay.config import OverflowPolicy
+from pyrelay.relay.dispatcher import RelayDispatcher
+from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+from pyrelay.relay.unit_of_work import InMemoryUOW
+
+
+class MockWebsocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.unblock = asyncio.Event()
+
+    async def send(self, data):
+        await self.unblock.wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        self.closed = True
+
+
+def notice(i):
+    return NostrNoticeUpdate(f"{i}")
+
+
+async def drain(client_session):
+    client_session.websocket.unblock.set()
+    while client_session.queue_depth:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+class TestClientSession:
+    @pytest.mark.asyncio
+    async def test_send_in_order(self):
+        client_session = ClientSession(MockWebsocket(), queue_size=10)
+        for i in range(5):
+            await client_session.send(notice(i))
+
+        await drain(client_session)
+        assert client_session.websocket.sent == [["NOTICE", f"{i}"] for i in range(5)]
+        client_session.close()
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest(self):
+        client_session = ClientSession(
+            MockWebsocket(), queue_size=2, overflow_policy=OverflowPolicy.DROP_OLDEST
+        )
+        await client_session.send_broadcast(notice(0))
+        await asyncio.sleep(0)  # writer takes the first message and blocks
+
+        for i in range(1, 5):
+            await client_session.send_broadcast(notice(i))
+
+        assert client_session.queue_depth == 2
+        assert client_session.dropped == 2
+
+        await drain(client_session)
+        assert client_session.websocket.sent == [
+            ["NOTICE", "0"],
+            ["NOTICE", "3"],
+            ["NOTICE", "4"],
+        ]
+        client_session.close()
+
+    @pytest.mark.asyncio
+    async def test_disconnect(self):
+        closed = []
+        client_session = ClientSession(
+            MockWebsocket(), queue_size=1, overflow_policy=OverflowPolicy.DISCONNECT
+        )
+        client_session.on_close = lambda: closed.append(True)
+        await client_session.send_broadcast(notice(0))
+        await asyncio.sleep(0)
+        await client_session.send_broadcast(notice(1))
+        await client_session.send_broadcast(notice(2))
+        await asyncio.sleep(0)
+
+        assert client_session.dropped == 1
+        assert closed == [True]
+        assert client_session.websocket.closed
+
+        # closed sessions ignore new messages
+        await client_session.send_broadcast(notice(3))
+        assert client_session.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_block_with_timeout(self):
+        client_session = ClientSession(
+            MockWebsocket(),
+            queue_size=1,
+            overflow_policy=OverflowPolicy.BLOCK,
+            block_timeout=0.01,
+        )
+        await client_session.send_broadcast(notice(0))
+        await asyncio.sleep(0)
+        await client_session.send_broadcast(notice(1))
+        await client_session.send_broadcast(notice(2))
+
+        assert client_session.dropped == 1
+
+        await drain(client_session)
+        assert client_session.websocket.sent == [["NOTICE", "0"], ["NOTICE", "1"]]
+        client_session.close()
+
+    @pytest.mark.asyncio
+    async def test_replies_wait_for_room(self):
+        client_session = ClientSession(
+            MockWebsocket(), queue_size=2, overflow_policy=OverflowPolicy.DROP_OLDEST
+        )
+        client_session.websocket.unblock.set()
+        for i in range(5):
+            await client_session.send(notice(i))
+
+        await drain(client_session)
+        assert client_session.dropped == 0
+        assert client_session.websocket.sent == [["NOTICE", f"{i}"] for i in range(5)]
+        client_session.close()
+
+    @pytest.mark.asyncio
+    async def test_stored_events_beyond_queue_size(self):
+        repo = InMemoryEventsRepository()
+        event_builder = EventBuilder.from_generated()
+        for i in range(25):
+            await repo.add(event_builder.create_event(f"{i}"))
+        dispatcher = RelayDispatcher(lambda: InMemoryUOW(Subscriptions(), repo))
+
+        client_session = ClientSession(
+            MockWebsocket(), queue_size=10, overflow_policy=OverflowPolicy.DROP_OLDEST
+        )
+        client_session.websocket.unblock.set()
+        await dispatcher.handle(client_session, NostrRequest("sub", [NostrFilter()]))
+
+        await drain(client_session)
+        assert client_session.dropped == 0
+        assert len(client_session.websocket.sent) == 26
+        assert client_session.websocket.sent[-1] == ["EOSE", "sub"]
+        client_session.close()
@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import attr
+import pytest
+
+from pyrelay.nostr.event import Validity
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.relay.event_verifier import EventVerifier, VerifiedEventsCache
+
+
+@pytest.fixture(scope="module")
+def event_builder():
+    return EventBuilder.from_generated()
+
+
+@pytest.fixture(scope="module", params=["inline", "thread", "process"])
+def verifier(request):
+    match request.param:
+        case "thread":
+            verifier = EventVerifier(ThreadPoolExecutor(2), batch_size=4)
+        case "process":
+            verifier = EventVerifier(ProcessPoolExecutor(2), batch_size=4)
+        case _:
+            verifier = EventVerifier()
+
+    yield verifier
+    verifier.shutdown()
+
+
+class TestEventVerifier:
+    @pytest.mark.asyncio
+    async def test_valid_event(self, verifier, event_builder):
+        event = event_builder.create_event("content")
+        assert await verifier.verify(event)
+
+    @pytest.mark.asyncio
+    async def test_invalid_signature(self, verifier, event_builder):
+        event = event_builder.create_event("content")
+        other = event_builder.create_event("other content")
+        assert not await verifier.verify(attr.evolve(event, sig=other.sig))
+
+    @pytest.mark.asyncio
+    async def test_id_mismatch(self, verifier, event_builder):
+        event = event_builder.create_event("content")
+        other = event_builder.create_event("other content")
+        tampered = attr.evolve(event, id=other.id, sig=other.sig)
+        assert await verifier.validate(tampered) is Validity.ID_MISMATCH
+
+    @pytest.mark.asyncio
+    async def test_canonical_attached(self, verifier, event_builder):
+        event = event_builder.create_event("content")
+        await verifier.validate(event)
+        assert "canonical" in event.__dict__
+        assert event.calc_id() == event.id
+
+    @pytest.mark.asyncio
+    async def test_batch(self, verifier, event_builder):
+        events = [event_builder.create_event(f"{i}") for i in range(10)]
+        events[3] = attr.evolve(events[3], content="tampered")
+
+        results = await asyncio.gather(*(verifier.verify(e) for e in events))
+
+        assert results == [i != 3 for i in range(10)]
+
+
+@pytest.mark.parametrize("executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+@pytest.mark.asyncio
+async def test_malformed_event_fails_alone(executor, event_builder):
+    verifier = EventVerifier(executor(1), batch_size=4)
+    good = event_builder.create_event("content")
+    # not a point on the curve, secp256k1 raises a bare Exception for it
+    bad = attr.evolve(good, pubkey="ff" * 32, sig=good.sig)
+    bad = attr.evolve(bad, id=bad.calc_id())
+
+    try:
+        results = await asyncio.gather(verifier.validate(good), verifier.validate(bad))
+    finally:
+        verifier.shutdown()
+
+    assert results == [Validity.VALID, Validity.BAD_SIGNATURE]
+
+
+class TestVerifiedEventsCache:
+    def test_hit_and_miss(self, event_builder):
+        cache = VerifiedEventsCache(max_size=10)
+        event = event_builder.create_event("content")
+
+        assert event not in cache
+        cache.add(event)
+        assert event in cache
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_keyed_by_signature(self, event_builder):
+        cache = VerifiedEventsCache(max_size=10)
+        event = event_builder.create_event("content")
+        cache.add(event)
+
+        assert attr.evolve(event, sig="00" * 64) not in cache
+
+    def test_evicts_least_recently_used(self, event_builder):
+        cache = VerifiedEventsCache(max_size=2)
+        first, second, third = [event_builder.create_event(f"{i}") for i in range(3)]
+        cache.add(first)
+        cache.add(second)
+        assert first in cache  # first is now the most recently used
+
+        cache.add(third)
+
+        assert len(cache) == 2
+        assert second not in cache
+        assert first in cache
+        assert third in cache
+
+    def test_disabled(self, event_builder):
+        cache = VerifiedEventsCache(max_size=0)
+        event = event_builder.create_event("content")
+        cache.add(event)
+        assert event not in cache
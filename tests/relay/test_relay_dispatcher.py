@@ -1,15 +1,28 @@
 import uuid
 from collections import defaultdict
+from functools import partial
 
+import attr
 import pytest
 
 from pyrelay.nostr.event import EventKind, NostrTag, NostrDataType
 from pyrelay.nostr.event_builder import EventBuilder
 from pyrelay.nostr.filters import NostrFilter
-from pyrelay.nostr.msgs import NostrEventUpdate, NostrRequest, NostrClose, NostrEOSE
+from pyrelay.nostr.msgs import (
+    NostrClose,
+    NostrCommandResults,
+    NostrEOSE,
+    NostrEventUpdate,
+    NostrRawEventUpdate,
+    NostrRequest,
+)
 from pyrelay.relay.bootstrap import get_uow_factory
 from pyrelay.relay.client_session import BaseClientSession
 from pyrelay.relay.dispatcher import RelayDispatcher
+from pyrelay.relay.event_verifier import EventVerifier
+from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+from pyrelay.relay.unit_of_work import InMemoryUOW, new_event_ids_filter
 
 
 @pytest.fixture(scope="module")
@@ -81,14 +94,14 @@ class TestRelayDispatcher:
         for j, client in enumerate(clients):
             calls = client.calls["send_event"]
             expected = [
-                NostrEventUpdate(f"{j}", events[j]),
+                NostrRawEventUpdate(f"{j}", events[j].json),
                 NostrEOSE(f"{j}")
             ]
             assert calls == expected
 
         # Report events and broadcast to subscribers
         for i, event_builder in enumerate(event_builders):
-            event = event_builder.create_event(f"{i * 2}")
+            event = event_builder.create_event(f"broadcast {i}")
             events.append(event)
             client_session = MockClientSession()
             await dispatcher.handle(client_session, event)
@@ -96,7 +109,7 @@ class TestRelayDispatcher:
         for j, client in enumerate(clients):
             calls = client.calls["send_event"]
             expected = [
-                NostrEventUpdate(f"{j}", events[j]),
+                NostrRawEventUpdate(f"{j}", events[j].json),
                 NostrEOSE(f"{j}"),
                 NostrEventUpdate(f"{j}", events[j + 10]),
 
@@ -109,7 +122,7 @@ class TestRelayDispatcher:
             await dispatcher.handle(client, NostrClose(f"{j}"))
 
         for i, event_builder in enumerate(event_builders):
-            event = event_builder.create_event(f"{i * 3}")
+            event = event_builder.create_event(f"after close {i}")
             events.append(event)
             client_session = MockClientSession()
             await dispatcher.handle(client_session, event)
@@ -117,7 +130,7 @@ class TestRelayDispatcher:
         for j, client in enumerate(clients):
             calls = client.calls["send_event"]
             expected = [
-                NostrEventUpdate(f"{j}", events[j]),
+                NostrRawEventUpdate(f"{j}", events[j].json),
                 NostrEOSE(f"{j}"),
                 NostrEventUpdate(f"{j}", events[j + 10]),
 
@@ -144,3 +157,91 @@ class TestRelayDispatcher:
             ]
         )
         await dispatcher.handle(client_session, event)
+
+    @pytest.mark.parametrize("dispatcher", [
+        get_dispatcher(),
+        # without the verified events cache, caught by the event ids filter
+        RelayDispatcher(partial(
+            InMemoryUOW,
+            Subscriptions(),
+            InMemoryEventsRepository(),
+            EventVerifier(),
+            new_event_ids_filter(),
+        )),
+    ])
+    @pytest.mark.asyncio
+    async def test_duplicate_event(self, dispatcher, event_builder):
+        event = event_builder.create_event("duplicate")
+
+        subscriber = MockClientSession()
+        await dispatcher.handle(subscriber, NostrRequest("sub", [NostrFilter()]))
+
+        client_session = MockClientSession()
+        await dispatcher.handle(client_session, event)
+        await dispatcher.handle(client_session, event)
+
+        first, second = client_session.calls["send_event"]
+        assert first == NostrCommandResults(event.id, True)
+        assert second.saved
+        assert second.reason == "duplicate"
+
+        # only the first copy is broadcast
+        assert subscriber.calls["send_event"] == [NostrEventUpdate("sub", event)]
+
+    @pytest.mark.asyncio
+    async def test_resend_after_delete(self, event_builder):
+        dispatcher = get_dispatcher()
+        event = event_builder.create_event("deleted")
+
+        client_session = MockClientSession()
+        await dispatcher.handle(client_session, event)
+        async with dispatcher.uow_factory() as uow:
+            await uow.events.delete([event.id])
+        await dispatcher.handle(client_session, event)
+
+        first, second = client_session.calls["send_event"]
+        assert first == second == NostrCommandResults(event.id, True)
+        async with dispatcher.uow_factory() as uow:
+            assert await uow.events.exists(event.id)
+
+    @pytest.mark.asyncio
+    async def test_tampered_resend_after_delete(self, event_builder):
+        dispatcher = get_dispatcher()
+        event = event_builder.create_event("original")
+        deletion = event_builder.create_event(
+            "", kind=EventKind.EventDeletion, tags=[NostrTag("e", event.id, [])]
+        )
+        tampered = attr.evolve(event, content="forged")
+
+        client_session = MockClientSession()
+        for message in [event, deletion, tampered]:
+            await dispatcher.handle(client_session, message)
+
+        *_, result = client_session.calls["send_event"]
+        assert not result.saved
+        assert result.reason == "invalid"
+        async with dispatcher.uow_factory() as uow:
+            assert await uow.events.query() == [deletion]
+
+    @pytest.mark.asyncio
+    async def test_failed_commit_not_cached(self, event_builder):
+        class FailingUOW(InMemoryUOW):
+            async def commit(self) -> None:
+                raise RuntimeError("commit failed")
+
+        verifier = EventVerifier(cache_size=10)
+        event_ids = new_event_ids_filter()
+        dispatcher = RelayDispatcher(partial(
+            FailingUOW,
+            Subscriptions(),
+            InMemoryEventsRepository(),
+            verifier,
+            event_ids,
+        ))
+        event = event_builder.create_event("not committed")
+
+        with pytest.raises(RuntimeError):
+            await dispatcher.handle(MockClientSession(), event)
+
+        assert event not in verifier.verified
+        assert event.id not in event_ids
@@ -1,5 +1,8 @@
+import secrets
+
 import pytest
 from hypothesis import given, assume, settings, HealthCheck
+from hypothesis import strategies as s
 
 from pyrelay.nostr.event import EventKind, NostrTag
 from pyrelay.nostr.filters import NostrFilter
@@ -53,6 +56,16 @@ class EventRepoIdsFilters(EventRepoTestBase):
         filt = NostrFilter(ids=[event.id[:-10]])
         assert await self.assert_apply([filt], event, uow)
 
+    @pytest.mark.asyncio
+    # matches every event saved by the earlier examples, the time grows with them
+    @given(event=event)
+    @settings(
+        suppress_health_check=[HealthCheck.function_scoped_fixture, ], deadline=None
+    )
+    async def test_empty_ids_prefix_filter(self, event, uow):
+        filt = NostrFilter(ids=[""])
+        assert await self.assert_apply([filt], event, uow)
+
     @pytest.mark.asyncio
     @given(event=event)
     @settings(suppress_health_check=[HealthCheck.function_scoped_fixture, ])
@@ -85,6 +98,16 @@ class EventRepoAuthorsFilters(EventRepoTestBase):
         filt = NostrFilter(authors=[event.pubkey[:-10]])
         assert await self.assert_apply([filt], event, uow)
 
+    @pytest.mark.asyncio
+    # matches every event saved by the earlier examples, the time grows with them
+    @given(event=event)
+    @settings(
+        suppress_health_check=[HealthCheck.function_scoped_fixture, ], deadline=None
+    )
+    async def test_empty_author_prefix_filter(self, event, uow):
+        filt = NostrFilter(authors=[""])
+        assert await self.assert_apply([filt], event, uow)
+
     @pytest.mark.asyncio
     @given(event=event)
     @settings(suppress_health_check=[HealthCheck.function_scoped_fixture, ])
@@ -102,6 +125,24 @@ class EventRepoAuthorsFilters(EventRepoTestBase):
         assert await self.assert_apply([filt], event, uow)
 
 
+    @pytest.mark.asyncio
+    @given(event=event)
+    @settings(suppress_health_check=[HealthCheck.function_scoped_fixture, ])
+    async def test_follow_list_filter(self, event, uow):
+        follows = [secrets.token_hex(32) for _ in range(1000)]
+        filt = NostrFilter(authors=follows + [event.pubkey[:-10]] + follows[:10])
+        assert await self.assert_apply([filt], event, uow)
+
+    @pytest.mark.asyncio
+    @given(event=event)
+    @settings(suppress_health_check=[HealthCheck.function_scoped_fixture, ])
+    async def test_no_match_follow_list_filter(self, event, uow):
+        follows = [secrets.token_hex(32) for _ in range(1000)]
+        follows += [author[:10] for author in follows[:10]]
+        filt = NostrFilter(authors=follows)
+        assert not await self.assert_apply([filt], event, uow)
+
+
 class EventRepoKindsFilters(EventRepoTestBase):
     @pytest.mark.asyncio
     @given(event=event)
@@ -199,6 +240,16 @@ class EventRepoTagsFilters(EventRepoTestBase):
         filt = NostrFilter(generic_tags={"e": [tag*2]},)
         assert not await self.assert_apply([filt], event, uow)
 
+    @pytest.mark.asyncio
+    @given(event=event_with_tags)
+    @settings(suppress_health_check=[HealthCheck.function_scoped_fixture, ])
+    async def test_e_and_p_tags_filter(self, event, uow):
+        assume(len(event.p_tags) > 0)
+        e_tag, *_ = event.e_tags
+        p_tag, *_ = event.p_tags
+        filt = NostrFilter(generic_tags={"e": [e_tag], "p": [p_tag]},)
+        assert await self.assert_apply([filt], event, uow)
+
 
 class EventRepoAllFilters(EventRepoTestBase):
     @pytest.mark.asyncio
@@ -312,3 +363,54 @@ class EventRepoEventSave(EventRepoTestBase):
 
         async with uow:
             await uow.events.delete(event_ids)
+
+    @pytest.mark.asyncio
+    async def test_exists(self, event_builder, uow):
+        event = event_builder.create_event("exists")
+        async with uow:
+            assert not await uow.events.exists(event.id)
+            await uow.events.add(event)
+
+        async with uow:
+            assert await uow.events.exists(event.id)
+
+    @pytest.mark.asyncio
+    async def test_add_duplicate(self, event_builder, uow):
+        event = event_builder.create_event("duplicate")
+        async with uow:
+            await uow.events.add(event)
+
+        async with uow:
+            await uow.events.add(event)
+
+        async with uow:
+            results = await uow.events.query()
+
+        assert [e.id for e in results].count(event.id) == 1
+
+
+class EventRepoStream(EventRepoTestBase):
+    @pytest.mark.asyncio
+    # few events per example, each is signed and saved then queried three times
+    @given(events=s.lists(event, min_size=2, max_size=10))
+    @settings(
+        suppress_health_check=[HealthCheck.function_scoped_fixture, HealthCheck.too_slow],
+        deadline=None,
+    )
+    async def test_stream_same_as_query(self, events, uow):
+        async with uow:
+            for event in events:
+                await uow.events.add(event)
+
+        filt = NostrFilter(generic_tags={"p": [events[0].pubkey]}, limit=5)
+        async with uow:
+            for filters in [(), (NostrFilter(limit=3),), (filt,)]:
+                streamed = [event async for event in uow.events.stream(*filters)]
+                assert streamed == list(await uow.events.query(*filters))
+                assert [event.json for event in streamed] == [
+                    raw async for raw in uow.events.stream_json(*filters)
+                ]
+
+        async with uow:
+            await uow.events.delete([event.id for event in events])
+
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import defaultdict
+
+import pytest
+from sqlalchemy.orm import clear_mappers
+
+from pyrelay.nostr.event import EventKind, NostrDataType, NostrEvent, NostrTag
+from pyrelay.nostr.msgs import NostrCommandResults
+from pyrelay.relay.bootstrap import set_up_session_maker
+from pyrelay.relay.client_session import BaseClientSession
+from pyrelay.relay.config import settings
+from pyrelay.relay.db.batch_writer import BatchWriter
+from pyrelay.relay.dispatcher import RelayDispatcher
+from pyrelay.relay.relay_service import DuplicateEventError, Subscriptions
+from pyrelay.relay.unit_of_work import SqlAlchemyUOW
+from tests.relay.test_repos.test_sqlalchemy_event_repo import SqlalchemyTestMixin
+
+
+class MockClientSession(BaseClientSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = defaultdict(list)
+        self.uid = uuid.uuid4()
+
+    async def send(self, event_update: NostrDataType):
+        self.calls["send_event"].append(event_update)
+
+
+class TestBatchWriter(SqlalchemyTestMixin):
+    @pytest.fixture(scope="class")
+    def event_loop(self):
+        # the pools of the class' engines are bound to the first loop waiting on them
+        loop = asyncio.new_event_loop()
+        yield loop
+        loop.close()
+
+    @pytest.fixture
+    def writer(self, session_maker, event_loop):
+        writer = BatchWriter(session_maker, max_batch=4, max_delay=0.05)
+        yield writer
+
+        writer.close()
+        event_loop.run_until_complete(asyncio.sleep(0))
+
+    @pytest.fixture
+    def events(self, event_builder):
+        return [
+            event_builder.create_event(
+                str(i),
+                tags=[NostrTag("p", event_builder.pub_key, ["wss://relay"])],
+                created_at=1_600_000_000 + i,
+            )
+            for i in range(10)
+        ]
+
+    async def saved(self, session_maker):
+        async with SqlAlchemyUOW(session_maker, None) as uow:
+            events = await uow.events.query()
+
+        await self.tables_cleanup(session_maker)
+        return events
+
+    @pytest.mark.asyncio
+    async def test_batches(self, session_maker, writer, events):
+        await asyncio.gather(*(writer.write(event) for event in events))
+
+        assert writer.batches == 3
+        assert writer.written == 10
+        async with SqlAlchemyUOW(session_maker, None) as uow:
+            raw = [event async for event in uow.events.stream_json()]
+        assert raw == [event.json for event in events]
+        assert await self.saved(session_maker) == events
+
+    @pytest.mark.asyncio
+    async def test_write_waits_for_delay(self, session_maker, writer, events):
+        await writer.write(events[0])
+
+        assert writer.batches == 1
+        assert await self.saved(session_maker) == events[:1]
+
+    @pytest.mark.asyncio
+    async def test_duplicates_written_once(self, session_maker, writer, events):
+        await writer.write(events[0])
+        results = await asyncio.gather(
+            *(writer.write(event) for event in events[:2] * 2), return_exceptions=True
+        )
+
+        # only the first write of events[1] saves it
+        duplicates = [isinstance(r, DuplicateEventError) for r in results]
+        assert duplicates == [True, False, True, True]
+        assert writer.written == 2
+        assert await self.saved(session_maker) == events[:2]
+
+    @pytest.mark.asyncio
+    async def test_ok_after_commit(self, session_maker, writer, events):
+        subscriptions = Subscriptions()
+        dispatcher = RelayDispatcher(
+            lambda: SqlAlchemyUOW(session_maker, subscriptions, writer=writer)
+        )
+        clients = [MockClientSession() for _ in events]
+        await asyncio.gather(*map(dispatcher.handle, clients, events))
+
+        for client, event in zip(clients, events):
+            [result] = client.calls["send_event"]
+            assert result == NostrCommandResults(event_id=event.id, saved=True)
+        assert writer.batches == 3
+        assert await self.saved(session_maker) == events
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicate(self, session_maker, writer, events):
+        dispatcher = RelayDispatcher(
+            lambda: SqlAlchemyUOW(session_maker, Subscriptions(), writer=writer)
+        )
+        client = MockClientSession()
+        # each publish parses its own copy of the event
+        raw = json.loads(events[0].json)
+        copies = [NostrEvent.deserialize(event=raw) for _ in range(2)]
+        await asyncio.gather(*(dispatcher.handle(client, copy) for copy in copies))
+
+        results = client.calls["send_event"]
+        assert all(result.saved for result in results)
+        assert sorted(result.reason for result in results) == ["", "duplicate"]
+        assert await self.saved(session_maker) == events[:1]
+
+    @pytest.mark.asyncio
+    async def test_publishers_share_batches(self, session_maker, event_builder):
+        # more publishers than pooled connections, all in the same batch
+        writer = BatchWriter(session_maker, max_batch=100, max_delay=0.5)
+        subscriptions = Subscriptions()
+        dispatcher = RelayDispatcher(
+            lambda: SqlAlchemyUOW(session_maker, subscriptions, writer=writer)
+        )
+        events = [event_builder.create_event(f"{i}") for i in range(20)]
+        clients = [MockClientSession() for _ in events]
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*map(dispatcher.handle, clients, events)), timeout=5
+            )
+        finally:
+            writer.close()
+
+        for client, event in zip(clients, events):
+            [result] = client.calls["send_event"]
+            assert result == NostrCommandResults(event_id=event.id, saved=True)
+        assert writer.batches == 1
+        assert len(await self.saved(session_maker)) == 20
+
+    @pytest.mark.asyncio
+    async def test_deletion_event(self, session_maker, writer, events, event_builder):
+        subscriptions = Subscriptions()
+        dispatcher = RelayDispatcher(
+            lambda: SqlAlchemyUOW(session_maker, subscriptions, writer=writer)
+        )
+        deletion = event_builder.create_event(
+            "", kind=EventKind.EventDeletion, tags=[NostrTag("e", events[0].id, [])]
+        )
+        client = MockClientSession()
+        await dispatcher.handle(client, events[0])
+        await asyncio.wait_for(dispatcher.handle(client, deletion), timeout=2)
+
+        assert client.calls["send_event"] == [
+            NostrCommandResults(event_id=events[0].id, saved=True),
+            NostrCommandResults(event_id=deletion.id, saved=True),
+        ]
+        assert await self.saved(session_maker) == [deletion]
+
+
+class TestBatchWriterWithoutReaders(TestBatchWriter):
+    """
+    Reads share the single writer connection with the batch writer
+    """
+
+    @pytest.fixture(scope="class")
+    def session_maker(self):
+        filename = "test_no_readers.db"
+        readers = settings.SQLITE_READERS
+        settings.SQLITE_READERS = 0
+        try:
+            yield set_up_session_maker(
+                f"sqlite:///{filename}", f"sqlite+aiosqlite:///{filename}"
+            )
+        finally:
+            settings.SQLITE_READERS = readers
+            for suffix in ["", "-wal", "-shm"]:
+                if os.path.exists(f"{filename}{suffix}"):
+                    os.remove(f"{filename}{suffix}")
+            clear_mappers()
@@ -0,0 +1,99 @@
+import pytest
+from hypothesis import given
+from hypothesis import strategies as s
+
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+from pyrelay.relay.unit_of_work import InMemoryUOW
+from tests.relay.test_repos.base_test_repo import (
+    EventRepoAllFilters,
+    EventRepoAuthorsFilters,
+    EventRepoEventSave,
+    EventRepoIdsFilters,
+    EventRepoKindsFilters,
+    EventRepoNoFilters,
+    EventRepoTagsFilters,
+    EventRepoTestBase,
+    EventRepoTimesFilters,
+)
+from tests.relay.test_repos.test_event_index import EVENTS, filters
+
+pytest.importorskip("numpy")
+
+from pyrelay.relay.repos.columnar_event_repo import (  # noqa: E402
+    ColumnarEventsRepository,
+)
+
+
+class TestColumnar(EventRepoTestBase):
+    @pytest.fixture(scope="module")
+    def uow(self):
+        # a small capacity so the columns grow during the tests
+        return InMemoryUOW(Subscriptions(), ColumnarEventsRepository(capacity=2))
+
+
+class TestColumnarEventRepoNoFilters(TestColumnar, EventRepoNoFilters):
+    ...
+
+
+class TestColumnarEventRepoIdsFilters(TestColumnar, EventRepoIdsFilters):
+    ...
+
+
+class TestColumnarEventRepoAuthorsFilters(TestColumnar, EventRepoAuthorsFilters):
+    ...
+
+
+class TestColumnarEventRepoKindsFilters(TestColumnar, EventRepoKindsFilters):
+    ...
+
+
+class TestColumnarEventRepoTimesFilters(TestColumnar, EventRepoTimesFilters):
+    ...
+
+
+class TestColumnarEventRepoTagsFilters(TestColumnar, EventRepoTagsFilters):
+    ...
+
+
+class TestColumnarEventRepoAllFilters(TestColumnar, EventRepoAllFilters):
+    ...
+
+
+class TestColumnarEventRepoEventSave(TestColumnar, EventRepoEventSave):
+    ...
+
+
+async def build(repo, removed=()):
+    for event in EVENTS:
+        await repo.add(event)
+    await repo.delete([EVENTS[i].id for i in removed])
+    return repo
+
+
+class TestColumnarSameAsIndexed:
+    @pytest.mark.asyncio
+    @given(
+        filts=s.lists(
+            s.tuples(filters, s.none() | s.integers(1, 10)), min_size=1, max_size=3
+        ),
+        removed=s.sets(s.integers(0, len(EVENTS) - 1), max_size=10),
+    )
+    async def test_query(self, filts, removed):
+        for filt, limit in filts:
+            filt.limit = limit
+        filts = [filt for filt, _ in filts]
+
+        columnar = await build(ColumnarEventsRepository(), removed)
+        indexed = await build(InMemoryEventsRepository(), removed)
+        assert await columnar.query(*filts) == await indexed.query(*filts)
+
+    @pytest.mark.asyncio
+    async def test_delete(self):
+        repo = await build(ColumnarEventsRepository(), removed=[0])
+
+        assert not await repo.exists(EVENTS[0].id)
+        assert await repo.exists(EVENTS[1].id)
+        assert await repo.query() == EVENTS[1:]
+        assert EVENTS[0] not in await repo.query(NostrFilter())
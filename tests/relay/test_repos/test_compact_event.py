@@ -0,0 +1,49 @@
+from hypothesis import given
+from hypothesis import strategies as s
+
+from pyrelay.nostr.event import NostrTag
+from pyrelay.relay.repos.compact_event import CompactEvent, raw_event_id
+from tests.strategies import event
+
+
+class TestCompactEvent:
+    @given(event=event)
+    def test_round_trip(self, event):
+        record = CompactEvent.of(event)
+
+        assert record.to_event() == event
+        assert record.id == event.id
+        assert record.to_event().json == event.json
+
+    @given(event=event, tag_type=s.sampled_from(["e", "p", "x"]))
+    def test_tags_keys(self, event, tag_type):
+        record = CompactEvent.of(event)
+
+        assert record.get_tags_keys(tag_type) == event.get_tags_keys(tag_type)
+        assert record.tags_index == event.tags_index
+
+    def test_interned_strings(self, event_builder):
+        key = "".join(["1234", "5678"])
+        first = event_builder.create_event("1", tags=[NostrTag("p", key, [])])
+        second = event_builder.create_event("2", tags=[NostrTag("p", key[:], [])])
+        first_record, second_record = map(CompactEvent.of, [first, second])
+
+        assert first_record.pubkey is second_record.pubkey
+        assert first_record.tags[0][1] is second_record.tags[0][1]
+
+    def test_no_instance_dict(self, event_builder):
+        record = CompactEvent.of(event_builder.create_event(""))
+
+        assert not hasattr(record, "__dict__")
+        assert len(record.raw_id) == 32
+        assert len(record.raw_sig) == 64
+
+
+class TestRawEventId:
+    def test_valid(self, event_builder):
+        event_id = event_builder.create_event("").id
+        assert raw_event_id(event_id) == bytes.fromhex(event_id)
+
+    def test_invalid(self):
+        assert raw_event_id("not hex") is None
+        assert raw_event_id("AB" * 32) is None
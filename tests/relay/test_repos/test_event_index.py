@@ -0,0 +1,154 @@
+import random
+
+from hypothesis import given
+from hypothesis import strategies as s
+
+from pyrelay.nostr.event import EventKind, NostrTag
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.nostr.filters import NostrFilter, apply
+from pyrelay.relay.repos.compact_event import CompactEvent
+from pyrelay.relay.repos.event_index import EventIndex
+
+
+def build_events(count=60):
+    rand = random.Random(0)
+    builders = [EventBuilder.from_generated() for _ in range(3)]
+    return [
+        rand.choice(builders).create_event(
+            str(i),
+            kind=rand.choice([EventKind.TextNote, EventKind.Metadata]),
+            tags=[
+                NostrTag(type=rand.choice("ep"), key=rand.choice("abc"), extra=[])
+                for _ in range(rand.randint(0, 2))
+            ],
+            created_at=rand.randint(1, 20),
+        )
+        for i in range(count)
+    ]
+
+
+EVENTS = build_events()
+RECORDS = [CompactEvent.of(event) for event in EVENTS]
+PUBKEYS = sorted({event.pubkey for event in EVENTS})
+
+
+def query(index, records, filt):
+    matcher = filt.compile()
+    buckets, exact = index.plan(filt)
+    return [
+        raw_id.hex()
+        for _, _, raw_id in index.scan(buckets, matcher.since, matcher.until)
+        if exact or matcher.match(records[raw_id])
+    ]
+
+
+def brute_force(events, filt):
+    matched = [event for event in events if apply(filt, event)]
+    return [event.id for event in sorted(matched, key=lambda e: e.created_at)]
+
+
+filters = s.builds(
+    NostrFilter,
+    ids=s.none() | s.lists(s.sampled_from([e.id for e in EVENTS]), max_size=3),
+    authors=s.none()
+    | s.lists(
+        s.sampled_from(PUBKEYS).flatmap(
+            lambda pubkey: s.sampled_from([pubkey, pubkey[:2]])
+        ),
+        max_size=2,
+    ),
+    kinds=s.none() | s.lists(s.sampled_from([0, 1, 2]), max_size=2),
+    since=s.none() | s.integers(0, 21),
+    until=s.none() | s.integers(0, 21),
+    generic_tags=s.none()
+    | s.dictionaries(s.sampled_from("ep"), s.lists(s.sampled_from("abcd"))),
+)
+
+
+class TestEventIndex:
+    @given(filt=filters)
+    def test_same_as_brute_force(self, filt):
+        index = EventIndex()
+        for record in RECORDS:
+            index.add(record)
+
+        records = {record.raw_id: record for record in RECORDS}
+        assert query(index, records, filt) == brute_force(EVENTS, filt)
+
+    @given(filt=filters, removed=s.sets(s.integers(0, len(EVENTS) - 1)))
+    def test_same_as_brute_force_after_remove(self, filt, removed):
+        index = EventIndex()
+        for record in RECORDS:
+            index.add(record)
+        for i in removed:
+            index.remove(RECORDS[i])
+
+        kept = [event for i, event in enumerate(EVENTS) if i not in removed]
+        records = {record.raw_id: record for record in RECORDS}
+        assert query(index, records, filt) == brute_force(kept, filt)
+
+    @given(filt=filters)
+    def test_newest_first(self, filt):
+        index = EventIndex()
+        for record in RECORDS:
+            index.add(record)
+
+        buckets, _ = index.plan(filt)
+        oldest_first = list(index.scan(buckets, filt.since, filt.until))
+        newest_first = index.scan(buckets, filt.since, filt.until, newest_first=True)
+        assert list(newest_first) == oldest_first[::-1]
+
+    def test_remove_drops_empty_buckets(self):
+        index = EventIndex()
+        for record in RECORDS:
+            index.add(record)
+        for record in RECORDS:
+            index.remove(record)
+
+        assert len(index) == 0
+        assert not index.timeline
+        assert not index.by_pubkey
+        assert not index.by_kind
+        assert not index.by_tag
+        assert not index.pubkeys
+
+    def test_add_twice(self):
+        index = EventIndex()
+        index.add(RECORDS[0])
+        index.add(RECORDS[0])
+
+        assert len(index) == 1
+        assert len(index.timeline) == 1
+
+    def test_extend_same_as_add(self):
+        added, extended = EventIndex(), EventIndex()
+        for record in RECORDS:
+            added.add(record)
+        extended.extend(RECORDS[:30])
+        extended.extend(RECORDS)
+
+        assert extended.entries == added.entries
+        assert extended.timeline == added.timeline
+        assert extended.by_pubkey == added.by_pubkey
+        assert extended.by_kind == added.by_kind
+        assert extended.by_tag == added.by_tag
+        assert extended.pubkeys == added.pubkeys
+
+    def test_plan_picks_smallest_index(self):
+        index = EventIndex()
+        for record in RECORDS:
+            index.add(record)
+
+        filt = NostrFilter(ids=[EVENTS[0].id], kinds=[EVENTS[0].kind])
+        assert index.plan(filt) == ([[index.entries[RECORDS[0].raw_id]]], False)
+
+    def test_plan_exact(self):
+        index = EventIndex()
+        for record in RECORDS:
+            index.add(record)
+
+        _, exact = index.plan(NostrFilter(kinds=[1], since=5))
+        assert exact
+
+        _, exact = index.plan(NostrFilter(authors=[PUBKEYS[0][:2]]))
+        assert exact
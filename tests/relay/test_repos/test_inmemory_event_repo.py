@@ -1,6 +1,15 @@
 import pytest
 
-from pyrelay.relay.bootstrap import get_uow_factory
+from pyrelay.nostr.event import EventKind
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.bootstrap import get_uow_factory, shutdown
+from pyrelay.relay.config import EvictionPolicy, settings
+from pyrelay.relay.repos import memory_snapshot
+from pyrelay.relay.repos.compact_event import CompactEvent
+from pyrelay.relay.repos.in_memory_event_repo import (
+    InMemoryEventsRepository,
+    approximate_size,
+)
 from tests.relay.test_repos.base_test_repo import (
     EventRepoTestBase,
     EventRepoNoFilters,
@@ -11,6 +20,7 @@ from tests.relay.test_repos.base_test_repo import (
     EventRepoTagsFilters,
     EventRepoAllFilters,
     EventRepoEventSave,
+    EventRepoStream,
 )
 
 
@@ -52,3 +62,186 @@ class TestInMemoryEventRepoAllFilters(TestInMemory, EventRepoAllFilters):
 
 class TestInMemoryEventRepoEventSave(TestInMemory, EventRepoEventSave):
     ...
+
+
+class TestInMemoryEventRepoStream(TestInMemory, EventRepoStream):
+    ...
+
+
+class TestInMemoryEventRepoLimits:
+    @pytest.fixture
+    def uow(self):
+        return get_uow_factory(in_memory=True)()
+
+    @pytest.fixture
+    def events(self, event_builder):
+        return [
+            event_builder.create_event(str(i), kind=kind, created_at=100 + i)
+            for i, kind in enumerate([EventKind.TextNote, EventKind.Metadata] * 5)
+        ]
+
+    async def query(self, uow, events, *filters):
+        async with uow:
+            for event in events:
+                await uow.events.add(event)
+
+            return await uow.events.query(*filters)
+
+    @pytest.mark.asyncio
+    async def test_newest_within_limit(self, uow, events):
+        result = await self.query(uow, events, NostrFilter(limit=3))
+
+        assert result == events[-3:]
+
+    @pytest.mark.asyncio
+    async def test_limit_per_filter(self, uow, events):
+        notes = NostrFilter(kinds=[EventKind.TextNote], limit=1)
+        metadata = NostrFilter(kinds=[EventKind.Metadata], limit=3)
+        result = await self.query(uow, events, notes, metadata)
+
+        assert result == [events[5], events[7], events[8], events[9]]
+
+    @pytest.mark.asyncio
+    async def test_overlapping_filters(self, uow, events):
+        result = await self.query(
+            uow, events, NostrFilter(limit=2), NostrFilter(until=110, limit=4)
+        )
+
+        assert result == events[-4:]
+
+
+class TestInMemoryEventRepoEviction:
+    @pytest.fixture
+    def events(self, event_builder):
+        return [
+            event_builder.create_event(str(i), kind=kind, created_at=100 + i)
+            for i, kind in enumerate([EventKind.TextNote, EventKind.Metadata] * 5)
+        ]
+
+    async def add(self, repo, events):
+        for event in events:
+            await repo.add(event)
+
+    def size(self, events):
+        return sum(approximate_size(CompactEvent.of(event)) for event in events)
+
+    @pytest.mark.asyncio
+    async def test_max_events_evicts_oldest(self, events):
+        repo = InMemoryEventsRepository(max_events=4)
+        await self.add(repo, reversed(events))
+
+        assert await repo.query(NostrFilter()) == events[-4:]
+        assert len(repo.index) == 4
+        assert repo.evicted == 6
+        assert repo.evicted_kinds == {EventKind.TextNote: 3, EventKind.Metadata: 3}
+
+    @pytest.mark.asyncio
+    async def test_max_bytes(self, events):
+        max_bytes = self.size(events[-3:])
+        repo = InMemoryEventsRepository(max_bytes=max_bytes)
+        await self.add(repo, events)
+
+        assert await repo.query(NostrFilter()) == events[-3:]
+        assert repo.size == max_bytes
+        assert repo.evicted_bytes == self.size(events[:-3])
+
+    @pytest.mark.asyncio
+    async def test_lru_keeps_queried_events(self, events):
+        repo = InMemoryEventsRepository(
+            max_events=5, eviction_policy=EvictionPolicy.LRU
+        )
+        await self.add(repo, events[:5])
+        await repo.query(NostrFilter(ids=[events[0].id]))
+        await self.add(repo, events[5:7])
+
+        assert await repo.query(NostrFilter()) == [events[0], *events[3:7]]
+
+    @pytest.mark.asyncio
+    async def test_kind_quotas(self, events):
+        repo = InMemoryEventsRepository(kind_quotas={EventKind.Metadata: 2})
+        await self.add(repo, events)
+
+        notes = await repo.query(NostrFilter(kinds=[EventKind.TextNote]))
+        metadata = await repo.query(NostrFilter(kinds=[EventKind.Metadata]))
+        assert notes == events[::2]
+        assert metadata == events[-3::2]
+        assert repo.evicted_kinds == {EventKind.Metadata: 3}
+
+    @pytest.mark.asyncio
+    async def test_delete_is_not_eviction(self, events):
+        repo = InMemoryEventsRepository(max_events=10)
+        await self.add(repo, events)
+        await repo.delete([events[0].id])
+
+        assert repo.evicted == 0
+        assert repo.size == self.size(events[1:])
+
+
+class TestInMemoryEventRepoSnapshot:
+    @pytest.fixture
+    def events(self, event_builder):
+        return [
+            event_builder.create_event(str(i), kind=kind, created_at=100 + i)
+            for i, kind in enumerate([EventKind.TextNote, EventKind.Metadata] * 5)
+        ]
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "events.snapshot")
+
+    async def saved(self, path, events, **kwargs):
+        repo = InMemoryEventsRepository(snapshot_path=path, **kwargs)
+        for event in events:
+            await repo.add(event)
+        await repo.save_snapshot()
+        return repo
+
+    @pytest.mark.asyncio
+    async def test_restart(self, path, events):
+        saved = await self.saved(path, events)
+        repo = InMemoryEventsRepository(snapshot_path=path)
+
+        assert await repo.query() == events
+        assert repo.size == saved.size
+        _filter = NostrFilter(kinds=[EventKind.Metadata], limit=2)
+        assert await repo.query(_filter) == await saved.query(_filter)
+
+    @pytest.mark.asyncio
+    async def test_chunks(self, path, events, monkeypatch):
+        monkeypatch.setattr(memory_snapshot, "CHUNK_SIZE", 3)
+        await self.saved(path, events)
+
+        assert await InMemoryEventsRepository(snapshot_path=path).query() == events
+
+    @pytest.mark.asyncio
+    async def test_lowered_bound(self, path, events):
+        await self.saved(path, events)
+        repo = InMemoryEventsRepository(max_events=4, snapshot_path=path)
+
+        assert await repo.query() == events[-4:]
+
+    @pytest.mark.asyncio
+    async def test_missing_snapshot(self, path):
+        repo = InMemoryEventsRepository(snapshot_path=path)
+
+        assert await repo.query() == []
+
+    @pytest.mark.asyncio
+    async def test_warm_duplicate_filter(self, path, events, monkeypatch):
+        await self.saved(path, events)
+        monkeypatch.setattr(settings, "MEMORY_SNAPSHOT_PATH", path)
+        uow = get_uow_factory(in_memory=True)()
+
+        assert all(event.id in uow.event_ids for event in events)
+
+    @pytest.mark.asyncio
+    async def test_saved_on_shutdown(self, path, events, monkeypatch):
+        monkeypatch.setattr(settings, "MEMORY_SNAPSHOT_PATH", path)
+        monkeypatch.setattr(settings, "MEMORY_SNAPSHOT_INTERVAL", 3600)
+        uow = get_uow_factory(in_memory=True)()
+        for event in events:
+            await uow.events.add(event)
+
+        shutdown()
+        assert await InMemoryEventsRepository(snapshot_path=path).query() == events
+        assert uow.events._snapshots is None
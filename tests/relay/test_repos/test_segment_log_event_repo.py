@@ -0,0 +1,239 @@
+import pytest
+
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.bootstrap import get_uow_factory, shutdown
+from pyrelay.relay.config import settings
+from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+from pyrelay.relay.repos.segment_log_repo import (
+    SNAPSHOT,
+    TOMBSTONES,
+    SegmentLogEventsRepository,
+)
+from pyrelay.relay.unit_of_work import InMemoryUOW
+from tests.relay.test_repos.base_test_repo import (
+    EventRepoAllFilters,
+    EventRepoAuthorsFilters,
+    EventRepoEventSave,
+    EventRepoIdsFilters,
+    EventRepoKindsFilters,
+    EventRepoNoFilters,
+    EventRepoTagsFilters,
+    EventRepoTestBase,
+    EventRepoTimesFilters,
+)
+from tests.relay.test_repos.test_event_index import EVENTS
+
+EVENT_SIZE = max(len(event.json) for event in EVENTS) + 1
+
+
+class TestSegmentLog(EventRepoTestBase):
+    @pytest.fixture(scope="module")
+    def uow(self, tmp_path_factory):
+        # small segments so the tests write several
+        repo = SegmentLogEventsRepository(
+            str(tmp_path_factory.mktemp("log")),
+            segment_size=4 * EVENT_SIZE,
+            compact_interval=0,
+        )
+        return InMemoryUOW(Subscriptions(), repo)
+
+
+class TestSegmentLogEventRepoNoFilters(TestSegmentLog, EventRepoNoFilters):
+    ...
+
+
+class TestSegmentLogEventRepoIdsFilters(TestSegmentLog, EventRepoIdsFilters):
+    ...
+
+
+class TestSegmentLogEventRepoAuthorsFilters(TestSegmentLog, EventRepoAuthorsFilters):
+    ...
+
+
+class TestSegmentLogEventRepoKindsFilters(TestSegmentLog, EventRepoKindsFilters):
+    ...
+
+
+class TestSegmentLogEventRepoTimesFilters(TestSegmentLog, EventRepoTimesFilters):
+    ...
+
+
+class TestSegmentLogEventRepoTagsFilters(TestSegmentLog, EventRepoTagsFilters):
+    ...
+
+
+class TestSegmentLogEventRepoAllFilters(TestSegmentLog, EventRepoAllFilters):
+    ...
+
+
+class TestSegmentLogEventRepoEventSave(TestSegmentLog, EventRepoEventSave):
+    ...
+
+
+def open_log(path):
+    return SegmentLogEventsRepository(
+        str(path), segment_size=4 * EVENT_SIZE, compact_interval=0
+    )
+
+
+async def build(repo, removed=()):
+    for event in EVENTS:
+        await repo.add(event)
+    await repo.delete([EVENTS[i].id for i in removed])
+    return repo
+
+
+FILTERS = [
+    NostrFilter(kinds=[EVENTS[0].kind], limit=5),
+    NostrFilter(authors=[EVENTS[1].pubkey[:6]]),
+    NostrFilter(since=EVENTS[10].created_at, until=EVENTS[30].created_at),
+]
+
+
+class TestSegmentLogDurability:
+    @pytest.mark.asyncio
+    async def test_same_as_indexed(self, tmp_path):
+        removed = [0, 5, 17]
+        log = await build(open_log(tmp_path), removed)
+        indexed = await build(InMemoryEventsRepository(), removed)
+
+        assert await log.query() == await indexed.query()
+        for _filter in FILTERS:
+            assert await log.query(_filter) == await indexed.query(_filter)
+
+    @pytest.mark.asyncio
+    async def test_replayed_json_is_stored_line(self, tmp_path):
+        log = await build(open_log(tmp_path))
+
+        events = await log.query(NostrFilter(ids=[EVENTS[3].id]))
+        assert [event.json for event in events] == [EVENTS[3].json]
+
+    @pytest.mark.asyncio
+    async def test_stream_json_without_parsing(self, tmp_path, monkeypatch):
+        log = await build(open_log(tmp_path), removed=[0, 5])
+        filters = [(), *((_filter,) for _filter in FILTERS)]
+        expected = [await log.query(*filts) for filts in filters]
+        monkeypatch.setattr(log, "_read", None)
+
+        for filts, events in zip(filters, expected):
+            raw = [line async for line in log.stream_json(*filts)]
+            assert raw == [event.json for event in events]
+
+    @pytest.mark.asyncio
+    async def test_restart_from_snapshot(self, tmp_path):
+        log = await build(open_log(tmp_path), removed=[2])
+        expected = await log.query()
+        log.close()
+
+        assert (tmp_path / SNAPSHOT).exists()
+        # only the deletes of the remaining segments are kept
+        assert len((tmp_path / TOMBSTONES).read_bytes().splitlines()) == 1
+        restarted = open_log(tmp_path)
+        assert await restarted.query() == expected
+        assert await restarted.query(*FILTERS) == await log.query(*FILTERS)
+
+    @pytest.mark.asyncio
+    async def test_restart_parses_tail_and_tombstones(self, tmp_path):
+        log = open_log(tmp_path)
+        for event in EVENTS[:20]:
+            await log.add(event)
+        log.snapshot()
+        for event in EVENTS[20:]:
+            await log.add(event)
+        await log.delete([EVENTS[3].id, EVENTS[40].id])
+
+        # crashed, no snapshot on close
+        restarted = open_log(tmp_path)
+        assert await restarted.query() == await log.query()
+        assert not await restarted.exists(EVENTS[3].id)
+        assert not await restarted.exists(EVENTS[40].id)
+
+    @pytest.mark.asyncio
+    async def test_restart_without_usable_snapshot(self, tmp_path):
+        log = await build(open_log(tmp_path), removed=[2, 30])
+        expected = await log.query()
+        log.close()
+
+        (tmp_path / SNAPSHOT).unlink()
+        restarted = open_log(tmp_path)
+        assert await restarted.query() == expected
+
+    @pytest.mark.asyncio
+    async def test_restart_without_snapshot(self, tmp_path):
+        log = await build(open_log(tmp_path), removed=[7])
+        restarted = open_log(tmp_path)
+
+        assert await restarted.query() == await log.query()
+
+    @pytest.mark.asyncio
+    async def test_closed_on_shutdown(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "SEGMENT_LOG_PATH", str(tmp_path))
+        uow = get_uow_factory()()
+        await uow.events.add(EVENTS[0])
+
+        shutdown()
+        assert (tmp_path / SNAPSHOT).exists()
+        assert uow.events._file.closed
+
+    @pytest.mark.asyncio
+    async def test_torn_write_is_dropped(self, tmp_path):
+        log = await build(open_log(tmp_path))
+        with open(log._segment_path(log.segments[-1]), "ab") as file:
+            file.write(b'{"id": "abc')
+
+        restarted = open_log(tmp_path)
+        assert await restarted.query() == EVENTS
+        await restarted.add(EVENTS[0])
+        assert await open_log(tmp_path).query() == EVENTS
+
+    @pytest.mark.asyncio
+    async def test_readd_after_delete(self, tmp_path):
+        log = await build(open_log(tmp_path), removed=[4])
+        await log.add(EVENTS[4])
+
+        restarted = open_log(tmp_path)
+        assert await restarted.exists(EVENTS[4].id)
+
+    @pytest.mark.asyncio
+    async def test_compaction(self, tmp_path):
+        log = await build(open_log(tmp_path))
+        first = log.segments[0]
+        first_ids = [r.id for r in log.records.values() if r.segment == first]
+        await log.delete(first_ids[:-1])
+        expected = await log.query()
+
+        assert await log.compact() == 1
+        assert first not in log.segments
+        assert not log._segment_path(first).exists()
+        assert await log.query() == expected
+        assert await log.query(*FILTERS) == await open_log(tmp_path).query(*FILTERS)
+        assert await open_log(tmp_path).query() == expected
+
+    @pytest.mark.asyncio
+    async def test_compaction_crash_before_removing_segment(self, tmp_path):
+        log = await build(open_log(tmp_path))
+        first = log.segments[0]
+        first_ids = [r.id for r in log.records.values() if r.segment == first]
+        await log.delete(first_ids[:-1])
+        expected = await log.query()
+        data = log._segment_path(first).read_bytes()
+
+        await log.compact()
+        # crashed before the compacted segment was removed
+        log._segment_path(first).write_bytes(data)
+
+        restarted = open_log(tmp_path)
+        assert first not in restarted.segments
+        assert not log._segment_path(first).exists()
+        assert await restarted.query() == expected
+
+    @pytest.mark.asyncio
+    async def test_no_compaction_below_ratio(self, tmp_path):
+        log = await build(open_log(tmp_path))
+        first = log.segments[0]
+        first_ids = [r.id for r in log.records.values() if r.segment == first]
+        await log.delete(first_ids[:1])
+
+        assert await log.compact() == 0
+        assert first in log.segments
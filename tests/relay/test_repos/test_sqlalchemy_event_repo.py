@@ -1,12 +1,21 @@
+import asyncio
+import json
 import os
+import uuid
+from collections import defaultdict
 
 import pytest
 import pytest_asyncio
 from sqlalchemy.orm import clear_mappers
 
+from pyrelay.nostr.event import EventKind, NostrDataType, NostrEvent, NostrTag
+from pyrelay.nostr.filters import NostrFilter
 from pyrelay.relay.bootstrap import set_up_session_maker
+from pyrelay.relay.client_session import BaseClientSession
 from pyrelay.relay.db.tables import mapper_registry
-from pyrelay.relay.unit_of_work import SqlAlchemyUOW
+from pyrelay.relay.handlers.send_event_handler import send_event
+from pyrelay.relay.relay_service import Subscriptions
+from pyrelay.relay.unit_of_work import SqlAlchemyUOW, new_event_ids_filter
 from tests.relay.test_repos.base_test_repo import (
     EventRepoTestBase,
     EventRepoNoFilters,
@@ -17,9 +26,20 @@ from tests.relay.test_repos.base_test_repo import (
     EventRepoTagsFilters,
     EventRepoAllFilters,
     EventRepoEventSave,
+    EventRepoStream,
 )
 
 
+class MockClientSession(BaseClientSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = defaultdict(list)
+        self.uid = uuid.uuid4()
+
+    async def send(self, event_update: NostrDataType):
+        self.calls["send_event"].append(event_update)
+
+
 class SqlalchemyTestMixin(EventRepoTestBase):
     @pytest.fixture(scope="class")
     def session_maker(
@@ -29,7 +49,9 @@ class SqlalchemyTestMixin(EventRepoTestBase):
         yield set_up_session_maker(
             f"sqlite:///{filename}", f"sqlite+aiosqlite:///{filename}"
         )
-        os.remove(f"{filename}")
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(f"{filename}{suffix}"):
+                os.remove(f"{filename}{suffix}")
         clear_mappers()
 
     @pytest_asyncio.fixture()
@@ -77,3 +99,109 @@ class TestSqlAlchemyEventRepoAllFilters(SqlalchemyTestMixin, EventRepoAllFilters
 
 class TestSqlAlchemyEventRepoEventSave(SqlalchemyTestMixin, EventRepoEventSave):
     ...
+
+
+class TestSqlAlchemyEventRepoStream(SqlalchemyTestMixin, EventRepoStream):
+    ...
+
+
+class TestSqlAlchemyEventRepoLimit(SqlalchemyTestMixin):
+    @pytest.mark.asyncio
+    async def test_limit_counts_events_not_tags(self, event_builder, uow):
+        events = [
+            event_builder.create_event(
+                str(i),
+                tags=[
+                    NostrTag("p", event_builder.pub_key, []),
+                    NostrTag("p", "b" * 64, []),
+                    NostrTag("e", "c" * 64, []),
+                ],
+                created_at=1_600_000_000 + i,
+            )
+            for i in range(3)
+        ]
+        async with uow:
+            for event in events:
+                await uow.events.add(event)
+
+        async with uow:
+            filt = NostrFilter(generic_tags={"p": [event_builder.pub_key]}, limit=2)
+            result = await uow.events.query(filt)
+
+        # the newest events, oldest first, with all of their tags
+        assert result == events[1:]
+        assert [len(event.tags) for event in result] == [3, 3]
+
+        async with uow:
+            streamed = [event async for event in uow.events.stream(filt)]
+
+        assert streamed == events[1:]
+        assert [len(event.tags) for event in streamed] == [3, 3]
+
+        async with uow:
+            raw = [event async for event in uow.events.stream_json(filt)]
+
+        assert raw == [event.json for event in events[1:]]
+
+    @pytest.fixture
+    def events(self, event_builder):
+        return [
+            event_builder.create_event(str(i), kind=kind, created_at=100 + i)
+            for i, kind in enumerate([EventKind.TextNote, EventKind.Metadata] * 5)
+        ]
+
+    async def query(self, uow, events, *filters):
+        async with uow:
+            for event in events:
+                await uow.events.add(event)
+
+        async with uow:
+            return await uow.events.query(*filters)
+
+    @pytest.mark.asyncio
+    async def test_limit_per_filter(self, uow, events):
+        notes = NostrFilter(kinds=[EventKind.TextNote], limit=1)
+        metadata = NostrFilter(kinds=[EventKind.Metadata], limit=3)
+        result = await self.query(uow, events, notes, metadata)
+
+        assert result == [events[5], events[7], events[8], events[9]]
+
+    @pytest.mark.asyncio
+    async def test_overlapping_filters(self, uow, events):
+        result = await self.query(
+            uow, events, NostrFilter(limit=2), NostrFilter(until=110, limit=4)
+        )
+
+        assert result == events[-4:]
+
+    @pytest.mark.asyncio
+    async def test_limited_and_unlimited_filters(self, uow, events):
+        notes = NostrFilter(kinds=[EventKind.TextNote])
+        result = await self.query(uow, events, notes, NostrFilter(limit=1))
+
+        assert result == events[0:10:2] + [events[9]]
+
+
+class TestSqlAlchemyConcurrentPublish(SqlalchemyTestMixin):
+    @pytest.mark.asyncio
+    async def test_same_event_published_concurrently(self, session_maker, event_builder):
+        event = event_builder.create_event("concurrent")
+        client = MockClientSession()
+        event_ids = new_event_ids_filter()
+
+        def publish():
+            # each publish parses its own copy of the event
+            uow = SqlAlchemyUOW(session_maker, Subscriptions(), event_ids=event_ids)
+            copy = NostrEvent.deserialize(event=json.loads(event.json))
+            return send_event(uow, client, copy)
+
+        await asyncio.gather(publish(), publish())
+
+        results = client.calls["send_event"]
+        assert all(result.saved for result in results)
+        assert sorted(result.reason for result in results) == ["", "duplicate"]
+
+        async with SqlAlchemyUOW(session_maker, None) as uow:
+            assert await uow.events.query() == [event]
+
+        await self.tables_cleanup(session_maker)
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+from pyrelay.nostr.event import EventKind
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.repos.sqlalchemy_event_repo import select_events
+from tests.relay.test_repos.test_sqlalchemy_event_repo import SqlalchemyTestMixin
+
+ID = "a" * 64
+
+# filters and the index their query must search
+SHAPES = {
+    "no filters": ([], "ix_event_created_at_not_deleted"),
+    "ids": ([NostrFilter(ids=[ID])], "ix_event_id"),
+    "authors": ([NostrFilter(authors=[ID], limit=10)], "ix_event_pubkey_created_at"),
+    "kinds": (
+        [NostrFilter(kinds=[EventKind.TextNote], limit=10)],  # type: ignore
+        "ix_event_kind_created_at",
+    ),
+    "time range": (
+        [NostrFilter(since=10, until=20)],
+        "ix_event_created_at_not_deleted",
+    ),
+    "limit": ([NostrFilter(limit=10)], "ix_event_created_at_not_deleted"),
+    "tags": ([NostrFilter(generic_tags={"e": [ID]})], "ix_tag_type_key_event_id"),
+}
+
+
+class TestSqlAlchemyQueryPlan(SqlalchemyTestMixin):
+    async def plan(self, session_maker, *filters):
+        query = select_events(*filters).compile(
+            dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        async with session_maker() as session:
+            rows = await session.execute(text(f"EXPLAIN QUERY PLAN {query}"))
+
+        return [row.detail for row in rows]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("shape", SHAPES)
+    async def test_uses_index(self, session_maker, shape):
+        filters, index = SHAPES[shape]
+        plan = await self.plan(session_maker, *filters)
+
+        assert any(index in step.split() for step in plan), plan
+        # no table is read without an index
+        assert not [s for s in plan if s.startswith("SCAN") and "INDEX" not in s]
+
+    @pytest.mark.asyncio
+    async def test_filter_uses_own_index(self, session_maker):
+        plan = await self.plan(
+            session_maker,
+            NostrFilter(authors=[ID], limit=10),
+            NostrFilter(kinds=[EventKind.TextNote], limit=500),  # type: ignore
+        )
+        steps = " ".join(plan).split()
+
+        assert "ix_event_pubkey_created_at" in steps, plan
+        assert "ix_event_kind_created_at" in steps, plan
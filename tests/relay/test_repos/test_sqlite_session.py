@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import text
+
+from pyrelay.relay.db.session import use_writer
+from pyrelay.relay.db.tables import event
+from tests.relay.test_repos.test_sqlalchemy_event_repo import SqlalchemyTestMixin
+
+
+async def pragma(session, name):
+    return (await session.execute(text(f"PRAGMA {name}"))).scalar()
+
+
+class TestSqliteSession(SqlalchemyTestMixin):
+    @pytest.mark.asyncio
+    async def test_writer_pragmas(self, session_maker):
+        async with session_maker() as session:
+            use_writer(session)
+            assert await pragma(session, "journal_mode") == "wal"
+            assert await pragma(session, "synchronous") == 1  # NORMAL
+            assert await pragma(session, "temp_store") == 2  # MEMORY
+            assert await pragma(session, "query_only") == 0
+
+    @pytest.mark.asyncio
+    async def test_reads_on_reader(self, session_maker):
+        async with session_maker() as session:
+            assert await pragma(session, "query_only") == 1
+            assert await pragma(session, "temp_store") == 2
+
+    @pytest.mark.asyncio
+    async def test_reads_on_writer_after_write(self, session_maker):
+        async with session_maker() as session:
+            await session.execute(event.delete())
+            assert await pragma(session, "query_only") == 0
+
+    @pytest.mark.asyncio
+    async def test_read_while_writing(self, session_maker, event_builder):
+        async with session_maker() as writer, session_maker() as reader:
+            use_writer(writer)
+            writer.add(event_builder.create_event("uncommitted"))
+            await writer.flush()
+
+            # not blocked by the open write transaction, nor seeing it
+            count = await reader.execute(text("SELECT count(*) FROM event"))
+            assert count.scalar() == 0
+
+            await writer.rollback()
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as s
+
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.relay.repos.in_memory_event_repo import InMemoryEventsRepository
+from pyrelay.relay.repos.tiered_event_repo import HotTier, TieredEventsRepository
+from tests.relay.test_repos.test_event_index import EVENTS, filters
+
+# the corpus' events are created at 1 to 20, the hot tier has 10 and later
+BOUNDARY = 10
+
+
+def hot_tier(warm=True):
+    # a window back to the boundary
+    hot = HotTier(window=time.time() - BOUNDARY)
+    if warm:
+        # running since the boundary, nothing was saved before it started
+        hot.started = BOUNDARY
+        hot.warm = True
+    return hot
+
+
+async def build(repo, removed=()):
+    for event in EVENTS:
+        await repo.add(event)
+    await repo.delete([EVENTS[i].id for i in removed])
+    return repo
+
+
+async def tiered(removed=()):
+    repo = TieredEventsRepository(hot_tier(), InMemoryEventsRepository())
+    await build(repo, removed)
+    await repo.apply()
+    return repo
+
+
+class TestTieredEventRepo:
+    @pytest.mark.asyncio
+    @given(
+        filts=s.lists(
+            s.tuples(filters, s.none() | s.integers(1, 10)), min_size=1, max_size=3
+        ),
+        removed=s.sets(s.integers(0, len(EVENTS) - 1), max_size=10),
+    )
+    async def test_same_as_single_tier(self, filts, removed):
+        for filt, limit in filts:
+            filt.limit = limit
+        filts = [filt for filt, _ in filts]
+
+        repo = await tiered(removed)
+        expected = await build(InMemoryEventsRepository(), removed)
+        result = await repo.query(*filts)
+
+        assert {e.id for e in result} == {e.id for e in await expected.query(*filts)}
+        assert [e.created_at for e in result] == sorted(e.created_at for e in result)
+
+    @pytest.mark.asyncio
+    async def test_hot_tier_has_recent_events(self):
+        repo = await tiered()
+
+        assert await repo.hot.repo.query() == [
+            event for event in EVENTS if event.created_at >= BOUNDARY
+        ]
+
+    @pytest.mark.asyncio
+    async def test_served_from_memory(self):
+        repo = await tiered()
+        await repo.query(NostrFilter(since=BOUNDARY))
+        await repo.query(NostrFilter(limit=1))
+        await repo.query(NostrFilter(since=BOUNDARY - 1))
+        await repo.query(NostrFilter(until=BOUNDARY))
+
+        assert repo.hot.queries == 4
+        assert repo.hot.memory_queries == 2
+        assert repo.hot.memory_ratio == 0.5
+
+    @pytest.mark.asyncio
+    async def test_changes_reach_hot_tier_once_applied(self):
+        repo = TieredEventsRepository(hot_tier(), InMemoryEventsRepository())
+        recent = next(event for event in EVENTS if event.created_at >= BOUNDARY)
+        await repo.add(recent)
+
+        assert not await repo.hot.repo.exists(recent.id)
+        assert await repo.exists(recent.id)
+
+        await repo.apply()
+        await repo.delete([recent.id])
+        assert await repo.hot.repo.exists(recent.id)
+
+        await repo.apply()
+        assert not await repo.hot.repo.exists(recent.id)
+
+    @pytest.mark.asyncio
+    async def test_discarded_changes(self):
+        repo = TieredEventsRepository(hot_tier(), InMemoryEventsRepository())
+        await repo.add(EVENTS[0])
+        repo.discard()
+        await repo.apply()
+
+        assert not await repo.hot.repo.exists(EVENTS[0].id)
+
+    @pytest.mark.asyncio
+    async def test_trim(self):
+        repo = await tiered()
+        repo.hot.window = 0
+        repo.hot.trim()
+
+        assert await repo.hot.repo.query() == []
+
+    @pytest.mark.asyncio
+    async def test_restart(self):
+        cold = await build(InMemoryEventsRepository(), removed=[0])
+        # the hot tier starts empty after a restart, with events already in cold
+        repo = TieredEventsRepository(hot_tier(warm=False), cold)
+
+        assert await repo.query(NostrFilter(since=BOUNDARY)) == await cold.query(
+            NostrFilter(since=BOUNDARY)
+        )
+        assert await repo.hot.repo.query() == await cold.query(
+            NostrFilter(since=BOUNDARY)
+        )
+        # the window is served from memory right away
+        assert repo.hot.boundary == BOUNDARY
+        assert repo.hot.memory_queries == 1
@@ -0,0 +1,110 @@
+import uuid
+from collections import defaultdict
+
+import pytest
+
+from pyrelay.nostr.event import EventKind, NostrDataType, NostrTag
+from pyrelay.nostr.event_builder import EventBuilder
+from pyrelay.nostr.filters import NostrFilter
+from pyrelay.nostr.msgs import NostrEventUpdate, NostrRequest
+from pyrelay.relay.client_session import BaseClientSession
+from pyrelay.relay.relay_service import Subscriptions
+
+
+@pytest.fixture(scope="module")
+def event_builder():
+    return EventBuilder.from_generated()
+
+
+@pytest.fixture(scope="module")
+def event(event_builder):
+    return event_builder.create_event("content", tags=[
+        NostrTag(type="p", key="1234567123456712345671234", extra=[]),
+    ])
+
+
+class MockClientSession(BaseClientSession):
+    def __init__(self):
+        super(MockClientSession, self).__init__()
+        self.calls = defaultdict(list)
+        self.uid = uuid.uuid4()
+
+    async def send(self, event_update: NostrDataType):
+        self.calls["send_event"].append(event_update)
+
+
+def subscribe(subscriptions, subscription_id, *filters):
+    client = MockClientSession()
+    request = NostrRequest(subscription_id=subscription_id, filters=filters)
+    subscriptions.subscribe(request, client)
+    return client
+
+
+class TestSubscriptionIndex:
+    @pytest.mark.parametrize("filters", [
+        (),
+        (NostrFilter.empty(),),
+        (NostrFilter(since=0),),
+    ])
+    def test_match_all(self, event, filters):
+        subscriptions = Subscriptions()
+        subscribe(subscriptions, "sub", *filters)
+        assert subscriptions.index.candidates(event) == {"sub"}
+
+    def test_candidates_by_attribute(self, event):
+        subscriptions = Subscriptions()
+        subscribe(subscriptions, "id", NostrFilter(ids=[event.id]))
+        subscribe(subscriptions, "author", NostrFilter(authors=[event.pubkey]))
+        subscribe(subscriptions, "kind", NostrFilter(kinds=[event.kind]))
+        subscribe(subscriptions, "tag", NostrFilter(
+            generic_tags={"p": ["1234567123456712345671234"]}
+        ))
+        subscribe(subscriptions, "other_author", NostrFilter(authors=["a" * 64]))
+        subscribe(subscriptions, "other_kind", NostrFilter(
+            kinds=[EventKind.Reaction]  # type: ignore
+        ))
+
+        assert subscriptions.index.candidates(event) == {"id", "author", "kind", "tag"}
+
+    def test_prefix_is_match_all(self, event):
+        subscriptions = Subscriptions()
+        subscribe(subscriptions, "sub", NostrFilter(authors=["abc"]))
+        assert subscriptions.index.candidates(event) == {"sub"}
+
+    def test_unsubscribe_cleans_index(self, event):
+        subscriptions = Subscriptions()
+        subscribe(subscriptions, "author", NostrFilter(authors=[event.pubkey]))
+        subscribe(subscriptions, "all")
+        subscriptions.unsubscribe("author")
+        subscriptions.unsubscribe("all")
+
+        assert subscriptions.index.candidates(event) == set()
+
+    def test_close_cleans_index(self, event):
+        subscriptions = Subscriptions()
+        client = subscribe(subscriptions, "sub", NostrFilter(authors=[event.pubkey]))
+        client.close()
+
+        assert subscriptions.index.candidates(event) == set()
+
+    def test_resubscribe_replaces_filters(self, event):
+        subscriptions = Subscriptions()
+        subscribe(subscriptions, "sub", NostrFilter(authors=[event.pubkey]))
+        subscribe(subscriptions, "sub", NostrFilter(authors=["a" * 64]))
+
+        assert subscriptions.index.candidates(event) == set()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_checks_filters(self, event):
+        subscriptions = Subscriptions()
+        match = subscribe(subscriptions, "match", NostrFilter(
+            kinds=[event.kind], authors=[event.pubkey]
+        ))
+        no_match = subscribe(subscriptions, "no_match", NostrFilter(
+            kinds=[event.kind], since=event.created_at + 10
+        ))
+
+        await subscriptions.broadcast(event)
+
+        assert match.calls["send_event"] == [NostrEventUpdate("match", event)]
+        assert no_match.calls["send_event"] == []